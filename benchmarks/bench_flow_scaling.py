@@ -0,0 +1,71 @@
+"""
+Scaling of a mapped multi-series SoamFlow with its number of workers.
+
+Forecasts synthetic daily series with one Holt-Winters Forecaster mapped over
+them, sequentially and with 1, 2, 4 and 8 thread and process workers, saving
+every task run with a CSVSaver. Workers only speed the flow up on machines with
+as many cores, process workers also pay for sending the tasks and series.
+
+Run with `python benchmarks/bench_flow_scaling.py`.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from soam.constants import DS_COL, Y_COL
+from soam.core import SoamFlow, Step
+from soam.models.holt_winters import SkHoltWinters
+from soam.savers.csv_saver import CSVSaver
+from soam.utilities.utils import add_future_dates
+from soam.workflow import Forecaster
+
+N_SERIES = 64
+N_DAYS = 730
+HORIZON = 28
+WORKERS = (1, 2, 4, 8)
+
+
+class SyntheticSeries(Step):
+    def run(self, n_series):  # type: ignore # pylint: disable=arguments-differ
+        rng = np.random.default_rng(0)
+        t = np.arange(N_DAYS)
+        dates = pd.date_range("2020-01-01", periods=N_DAYS, freq="D")
+        series = []
+        for _ in range(n_series):
+            values = 100 + rng.uniform(0, 0.1) * t + rng.normal(size=7)[t % 7]
+            df = pd.DataFrame({DS_COL: dates, Y_COL: values + rng.normal(size=N_DAYS)})
+            series.append(add_future_dates(df, HORIZON))
+        return series
+
+
+def run_flow(path, **flow_kwargs):
+    model = SkHoltWinters(trend="add", seasonal="add", seasonal_periods=7)
+    with SoamFlow(name="scaling", saver=CSVSaver(path), **flow_kwargs) as flow:
+        series = SyntheticSeries()(N_SERIES)
+        Forecaster(model=model, output_length=HORIZON, lean=True).map(series)
+    start = time.perf_counter()
+    state = flow.run()
+    elapsed = time.perf_counter() - start
+    assert state.is_successful()
+    return elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        print(f"cores: {os.cpu_count()}")
+        baseline = run_flow(path)
+        print(f"sequential: {baseline:.1f}s")
+        for scheduler in ("threads", "processes"):
+            for n_workers in WORKERS:
+                elapsed = run_flow(path, n_workers=n_workers, scheduler=scheduler)
+                print(
+                    f"{scheduler} x{n_workers}: {elapsed:.1f}s "
+                    f"({baseline / elapsed:.2f}x)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Panel Holt-Winters fitting time.
+
+Fits an additive trend and weekly seasonality model to 10k daily series of two
+years with `SkHoltWinters.fit_panel`, and a sample of them one by one with the
+statsmodels ExponentialSmoothing wrapper for comparison.
+
+Run with `python benchmarks/bench_holt_winters.py`.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from soam.constants import DS_COL
+from soam.models.holt_winters import SkHoltWinters
+
+N_SERIES = 10_000
+N_STATSMODELS_SERIES = 50
+N_DAYS = 730
+PERIOD = 7
+
+
+def build_panel():
+    rng = np.random.default_rng(0)
+    t = np.arange(N_DAYS)
+    pattern = rng.normal(size=(N_SERIES, PERIOD))
+    slope = rng.uniform(0, 0.1, size=(N_SERIES, 1))
+    noise = rng.normal(scale=0.5, size=(N_SERIES, N_DAYS))
+    return 100 + slope * t + pattern[:, t % PERIOD] + noise
+
+
+def main():
+    panel = build_panel()
+    model = SkHoltWinters(trend="add", seasonal="add", seasonal_periods=PERIOD)
+    start = time.perf_counter()
+    model.fit_panel(panel)
+    elapsed = time.perf_counter() - start
+    print(f"Fitted {N_SERIES:,} series of {N_DAYS} days in {elapsed:.1f}s")
+
+    try:
+        from soam.models.exponential import SkExponentialSmoothing
+    except ImportError:
+        return
+    X = pd.DataFrame({DS_COL: pd.date_range("2020-01-01", periods=N_DAYS)})
+    start = time.perf_counter()
+    for values in panel[:N_STATSMODELS_SERIES]:
+        SkExponentialSmoothing(
+            trend="add", seasonal="add", seasonal_periods=PERIOD
+        ).fit(X, pd.Series(values))
+    per_series = (time.perf_counter() - start) / N_STATSMODELS_SERIES
+    print(
+        f"statsmodels: {per_series * 1000:.0f}ms per series, "
+        f"{per_series * N_SERIES:.0f}s estimated for {N_SERIES:,} series"
+    )
+
+
+if __name__ == "__main__":
+    main()
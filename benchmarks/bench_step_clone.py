@@ -0,0 +1,73 @@
+"""
+Per fold copy overhead of Forecaster and Transformer.
+
+Compares `prefect.Task.copy` with `Step.clone` on steps that already ran,
+so they carry data from previous runs as they do inside the Backtester.
+
+Run with `python benchmarks/bench_step_clone.py`.
+
+Results with one CPU, averaged over 1,000 copies:
+
+    Step          copy per fold   clone per fold
+    Forecaster    16.6 us         693.9 us
+    Transformer   16.0 us         78.0 us
+
+`Step.clone` costs more than `Task.copy` because it rebuilds the estimators
+unfitted, which a shallow copy doesn't. It buys folds that don't share a fitted
+model or keep the frames of previous runs, and it stays well below the cost
+of fitting a model per fold.
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from soam.constants import DS_COL, Y_COL
+from soam.models.prophet import SkProphet
+from soam.utilities.utils import add_future_dates
+from soam.workflow import BaseDataFrameTransformer, Forecaster, Transformer
+
+N_ROWS = 10_000
+N_REGRESSORS = 50
+REPEAT = 1_000
+
+
+class ScaleResponse(BaseDataFrameTransformer):
+    def __init__(self):
+        self.scaler = StandardScaler()
+
+    def fit(self, X):
+        self.scaler.fit(X[[Y_COL]])
+        return self
+
+    def transform(self, X):
+        return X.assign(**{Y_COL: self.scaler.transform(X[[Y_COL]])[:, 0]})
+
+
+def build_steps():
+    df = pd.DataFrame(
+        np.random.default_rng(0).normal(size=(N_ROWS, N_REGRESSORS)),
+        columns=[f"x_{i}" for i in range(N_REGRESSORS)],
+    )
+    df[DS_COL] = pd.date_range("2000-01-01", periods=N_ROWS, freq="H")
+    df[Y_COL] = df["x_0"].cumsum()
+
+    preprocessor = Transformer(ScaleResponse())
+    df, _ = preprocessor.run(df)
+    forecaster = Forecaster(model=SkProphet(), output_length=24)
+    forecaster.time_series = add_future_dates(df, 24)
+    forecaster.prediction = forecaster.time_series.tail(24)
+    return forecaster, preprocessor
+
+
+def main():
+    forecaster, preprocessor = build_steps()
+    for name, step in (("Forecaster", forecaster), ("Transformer", preprocessor)):
+        for method in ("copy", "clone"):
+            seconds = timeit.timeit(getattr(step, method), number=REPEAT) / REPEAT
+            print(f"{name}.{method}: {seconds * 1e6:,.1f} us per fold")
+
+
+if __name__ == "__main__":
+    main()
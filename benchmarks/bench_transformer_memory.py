@@ -0,0 +1,65 @@
+"""
+Memory kept alive by a Transformer run.
+
+Compares the default Transformer, which stores a copy of its input and its
+output on the task, with the lean mode and the lean in place mode. Memory is
+accounted with tracemalloc while the returned frame is held, as Prefect does
+with task results.
+
+Run with `python benchmarks/bench_transformer_memory.py`.
+"""
+import gc
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from soam.constants import DS_COL, Y_COL
+from soam.workflow import RunningStandardScaler, Transformer
+
+N_ROWS = 1_000_000
+N_REGRESSORS = 20
+
+
+def build_frame():
+    df = pd.DataFrame(
+        np.random.default_rng(0).normal(size=(N_ROWS, N_REGRESSORS)),
+        columns=[f"x_{i}" for i in range(N_REGRESSORS)],
+    )
+    df[DS_COL] = pd.date_range("2000-01-01", periods=N_ROWS, freq="min")
+    df[Y_COL] = df["x_0"].cumsum()
+    return df
+
+
+def measure(**transformer_kwargs):
+    df = build_frame()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    preprocessor = Transformer(
+        RunningStandardScaler(columns=[Y_COL, "x_0"]), **transformer_kwargs
+    )
+    transformed, _ = preprocessor.run(df)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del transformed, preprocessor
+    return retained - before, peak - before
+
+
+def main():
+    frame_mb = build_frame().memory_usage(deep=True).sum() / 2 ** 20
+    print(f"Input frame: {frame_mb:,.1f} MiB")
+    for name, kwargs in (
+        ("default", {}),
+        ("lean", {"lean": True}),
+        ("lean inplace", {"lean": True, "inplace": True}),
+    ):
+        retained, peak = measure(**kwargs)
+        print(
+            f"{name}: {retained / 2 ** 20:,.1f} MiB retained, "
+            f"{peak / 2 ** 20:,.1f} MiB peak"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,7 @@ extra_dependencies = {
     'gsheets_report': ["gspread_pandas", "muttlib[gsheets]>=1.0,<2"],
     'statsmodels': ["statsmodels<0.12,>=0.11"],
     'mlflow': ["mlflow==1.17.0"],
+    'arrow': ["pyarrow>=3.0"],
 }
 
 # create 'all' and 'report' extras
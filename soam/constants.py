@@ -24,6 +24,11 @@ SEED = 42
 
 OUTLIER_SIGN_COL = "sign"
 
+# Backtesting
+RANGES_KEYWORD = "ranges"
+METRICS_KEYWORD = "metrics"
+PLOT_KEYWORD = "plot"
+
 # Status
 STATUS_ACTIVE = "active"
 STATUS_INACTIVE = "inactive"
@@ -0,0 +1,257 @@
+"""
+Checkpoint
+----------
+Content addressed store of step outputs, so re-runs skip finished work.
+
+A step with a checkpoint store derives a key from its class, its parameters and
+a hash of its inputs. When the store has an output for the key the step returns
+it without running. DataFrames are stored as Parquet and other objects pickled.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+PARQUET_FORMAT = "parquet"
+PICKLE_FORMAT = "pickle"
+
+
+def _update_fingerprint(digest, value: Any):
+    """Feed a stable representation of value to a hashlib digest."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        dtypes = value.dtypes if isinstance(value, pd.DataFrame) else value.dtype
+        digest.update(type(value).__name__.encode())
+        digest.update(repr(dtypes).encode())
+        try:
+            hashed = pd.util.hash_pandas_object(value, index=True)
+        except TypeError as error:
+            # Object columns holding unhashable values, such as lists.
+            raise ValueError(f"a {type(value).__name__} can't be hashed: {error}")
+        digest.update(hashed.values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"ndarray{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, BaseEstimator):
+        digest.update(type(value).__qualname__.encode())
+        _update_fingerprint(digest, value.get_params(deep=False))
+    elif isinstance(value, dict):
+        digest.update(b"dict")
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_fingerprint(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        for item in value:
+            _update_fingerprint(digest, item)
+    elif value is None or isinstance(value, (str, bytes, int, float, bool)):
+        digest.update(repr(value).encode())
+    else:
+        try:
+            digest.update(pickle.dumps(value, protocol=4))
+        except Exception as error:  # pylint: disable=broad-except
+            raise ValueError(f"a {type(value).__name__} can't be pickled: {error}")
+
+
+def fingerprint(*values: Any) -> str:
+    """
+    Hash values into a hex key.
+
+    DataFrames are hashed with `pd.util.hash_pandas_object`, estimators by their
+    class and parameters and other objects by their pickle.
+
+    Parameters
+    ----------
+    values : objects
+        Values to hash.
+
+    Returns
+    -------
+    str
+        The hex digest.
+
+    Raises
+    ------
+    ValueError
+        If a value can't be hashed nor pickled, the steps that receive it run
+        without checkpointing.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update_fingerprint(digest, value)
+    return digest.hexdigest()
+
+
+def _write_item(value: Any, path: Path) -> str:
+    """Write a value as Parquet if it is a DataFrame that supports it."""
+    if isinstance(value, pd.DataFrame):
+        parquet_path = path.with_suffix(".parquet")
+        try:
+            value.to_parquet(parquet_path)
+            return PARQUET_FORMAT
+        except Exception as error:  # pylint: disable=broad-except
+            # No Parquet engine installed, or columns Parquet can't represent.
+            logger.debug(f"Pickling a DataFrame that can't be Parquet: {error}")
+            if parquet_path.exists():
+                parquet_path.unlink()
+    with open(path.with_suffix(".pkl"), "wb") as stream:
+        pickle.dump(value, stream, protocol=4)
+    return PICKLE_FORMAT
+
+
+def _read_item(path: Path, item_format: str) -> Any:
+    if item_format == PARQUET_FORMAT:
+        return pd.read_parquet(path.with_suffix(".parquet"))
+    with open(path.with_suffix(".pkl"), "rb") as stream:
+        return pickle.load(stream)
+
+
+def _entry_size(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.iterdir())
+
+
+class CheckpointStore:
+    """
+    Local directory of step outputs with size based eviction.
+
+    Each output is an entry directory named by its key, written atomically, so
+    steps running in parallel threads or processes can share the store. The
+    least recently used entries are evicted once the store exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: Union[str, Path], max_bytes: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            Directory of the store, created if needed.
+        max_bytes : int, optional
+            Size limit of the store, unlimited if None.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return (self.path / key / MANIFEST_FILE).exists()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Read an output.
+
+        Parameters
+        ----------
+        key : str
+            Key of the output.
+
+        Returns
+        -------
+        tuple of (bool, object)
+            Whether the key was found and its output.
+        """
+        entry = self.path / key
+        try:
+            manifest = json.loads((entry / MANIFEST_FILE).read_text())
+            items = [
+                _read_item(entry / str(i), item_format)
+                for i, item_format in enumerate(manifest["formats"])
+            ]
+            os.utime(entry / MANIFEST_FILE)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError) as error:
+            if entry.exists():
+                logger.warning(f"Ignoring unreadable checkpoint {key}: {error}")
+            return False, None
+        if manifest["container"] == "tuple":
+            return True, tuple(items)
+        if manifest["container"] == "list":
+            return True, items
+        return True, items[0]
+
+    def put(self, key: str, value: Any):
+        """
+        Write an output, DataFrames in tuples and lists are stored as Parquet.
+
+        Parameters
+        ----------
+        key : str
+            Key of the output.
+        value : object
+            The output.
+        """
+        if isinstance(value, (tuple, list)):
+            container, items = type(value).__name__, list(value)
+        else:
+            container, items = "single", [value]
+
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=self.path))
+        try:
+            formats = [
+                _write_item(item, tmp_dir / str(i)) for i, item in enumerate(items)
+            ]
+            manifest = {
+                "container": container,
+                "formats": formats,
+                "created": time.time(),
+            }
+            (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest))
+            entry = self.path / key
+            try:
+                os.replace(tmp_dir, entry)
+            except OSError:
+                # Another thread or process stored the same key first.
+                if not entry.joinpath(MANIFEST_FILE).exists():
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the store fits max_bytes."""
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            entries = [
+                (
+                    entry.joinpath(MANIFEST_FILE).stat().st_mtime,
+                    _entry_size(entry),
+                    entry,
+                )
+                for entry in self.path.iterdir()
+                if entry.joinpath(MANIFEST_FILE).exists()
+            ]
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda item: item[0]):
+                if total <= self.max_bytes:
+                    break
+                logger.debug(f"Evicting checkpoint {entry.name}.")
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            for entry in self.path.iterdir():
+                shutil.rmtree(entry, ignore_errors=True)
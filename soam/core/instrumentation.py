@@ -0,0 +1,398 @@
+"""
+Instrumentation
+---------------
+Prefect state handlers that profile each task run of a flow.
+
+Records the wall time, CPU time, memory and rows in and out of every task run,
+exports them as JSON lines and in the Prometheus text format, and reports the
+critical path of the flow.
+"""
+import cProfile
+from collections import defaultdict
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+import pandas as pd
+from prefect import context
+
+from soam.core.spill import ArrowHandle
+
+if TYPE_CHECKING:
+    from prefect import Flow, Task
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_PREFIX = "soam_step"
+PROMETHEUS_METRICS = {
+    "wall_seconds": "Wall time of the task run.",
+    "cpu_seconds": "CPU time of the thread running the task.",
+    "peak_memory_bytes": "Peak memory traced by tracemalloc during the task run.",
+    "max_rss_bytes": "Maximum resident set size of the process after the run.",
+    "rows_in": "Rows of the DataFrames received from upstream tasks.",
+    "rows_out": "Rows of the DataFrames returned by the task.",
+}
+
+
+def count_rows(value: Any) -> Optional[int]:
+    """
+    Rows of the DataFrames in a task result.
+
+    Parameters
+    ----------
+    value : object
+        A DataFrame, or a tuple, list or dict that contains DataFrames or their
+        spill handles.
+
+    Returns
+    -------
+    int or None
+        Total rows of the DataFrames found, None if there are none.
+    """
+    if isinstance(value, (pd.DataFrame, ArrowHandle)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (tuple, list)):
+        counts = [count_rows(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def _max_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class StepProfiler:
+    """
+    Profile the task runs of a flow with Prefect state handlers.
+
+    Attach it to a flow with `SoamFlow(profiler=...)` or `attach`, or to a single
+    step with `state_handlers=[profiler.task_handler]`. The records are written
+    when the flow finishes.
+    """
+
+    def __init__(
+        self,
+        jsonl_path: Union[str, Path, None] = None,
+        prometheus_path: Union[str, Path, None] = None,
+        trace_memory: bool = False,
+        profile_dir: Union[str, Path, None] = None,
+    ):
+        """
+        Parameters
+        ----------
+        jsonl_path : str or pathlib.Path, optional
+            File the records of every flow run are appended to, one JSON per line.
+        prometheus_path : str or pathlib.Path, optional
+            File rewritten with the metrics of the last flow run in the Prometheus
+            text format, e.g. for the node exporter textfile collector.
+        trace_memory : bool, optional
+            Record the peak memory of each task run with tracemalloc, which slows
+            allocations down, by default False. Peaks of tasks running at the same
+            time include each other's allocations. Before Python 3.9 the peak can
+            only be reset by restarting the tracing, so it's only recorded for
+            tasks that start while no other task runs, and only if the profiler
+            started the tracing.
+        profile_dir : str or pathlib.Path, optional
+            Directory where a cProfile stats file is dumped per task run, not
+            profiled if None.
+        """
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+
+        self.records: List[Dict[str, Any]] = []
+        self._running: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def __getstate__(self):
+        # Copies sent to worker processes record there, not in this profiler.
+        state = self.__dict__.copy()
+        state["_running"] = {}
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def attach(self, flow: "Flow") -> "Flow":
+        """Add the handlers to the flow and the tasks it has so far."""
+        if self.flow_handler not in flow.state_handlers:
+            flow.state_handlers.append(self.flow_handler)
+        for task in flow.tasks:
+            if self.task_handler not in task.state_handlers:
+                task.state_handlers.append(self.task_handler)
+        return flow
+
+    @staticmethod
+    def _run_key(task: "Task") -> tuple:
+        return (id(task), context.get("map_index"), threading.get_ident())
+
+    def task_handler(
+        self, task: "Task", old_state, new_state
+    ):  # pylint: disable=unused-argument
+        """
+        State handler recording a task run.
+
+        Parameters
+        ----------
+        task
+            the underlying object to which this state handler is attached
+        old_state
+            the previous state of this object
+        new_state
+            the proposed new state of this object
+        Returns
+        -------
+        newstate
+            the new state of this object.
+        """
+        key = self._run_key(task)
+        if new_state.is_running():
+            self._start(key)
+        elif new_state.is_finished():
+            with self._lock:
+                started = self._running.pop(key, None)
+            if started is not None:
+                self._finish(task, started, new_state)
+        return new_state
+
+    def _reset_peak(self) -> bool:
+        """Reset the traced memory peak, False if it can't be for this run."""
+        reset_peak = getattr(tracemalloc, "reset_peak", None)  # Python 3.9+
+        if reset_peak is not None:
+            reset_peak()
+            return True
+        # Restarting the tracing resets the peak, but also forgets the memory
+        # of running tasks and of whoever else started it.
+        if self._running or not self._started_tracemalloc:
+            return False
+        tracemalloc.stop()
+        tracemalloc.start()
+        return True
+
+    def _start(self, key: tuple):
+        started: Dict[str, Any] = {}
+        if self.trace_memory:
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started_tracemalloc = True
+                if self._reset_peak():
+                    started["memory"] = tracemalloc.get_traced_memory()[0]
+        if self.profile_dir is not None:
+            started["profile_dir"] = Path(self.profile_dir)
+            started["profile"] = cProfile.Profile()
+            started["profile"].enable()
+        started["start"] = time.time()
+        started["wall"] = time.perf_counter()
+        started["cpu"] = time.thread_time()
+        with self._lock:
+            self._running[key] = started
+
+    def _finish(self, task: "Task", started: Dict[str, Any], new_state):
+        wall = time.perf_counter() - started["wall"]
+        cpu = time.thread_time() - started["cpu"]
+        record = {
+            "flow_run_id": context.get("flow_run_id"),
+            "task": task.name,
+            # Flows assign the slugs of their tasks when they run.
+            "slug": context.get("task_slug", task.slug),
+            "map_index": context.get("map_index"),
+            "state": type(new_state).__name__,
+            "start": started["start"],
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "peak_memory_bytes": None,
+            "max_rss_bytes": _max_rss_bytes(),
+            "rows_in": None,
+            "rows_out": None,
+        }
+        if new_state.is_successful():
+            record["rows_out"] = count_rows(new_state.result)
+        if "memory" in started:
+            peak = tracemalloc.get_traced_memory()[1]
+            record["peak_memory_bytes"] = max(peak - started["memory"], 0)
+        if "profile" in started:
+            profile = started["profile"]
+            profile.disable()
+            path = (
+                started["profile_dir"] / f"{record['slug']}_{started['start']:.0f}.prof"
+            )
+            path.parent.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(path)
+            record["profile_path"] = str(path)
+        with self._lock:
+            self.records.append(record)
+
+    def flow_handler(
+        self, flow: "Flow", old_state, new_state
+    ):  # pylint: disable=unused-argument
+        """
+        State handler that completes and writes the records of a flow run.
+
+        Parameters
+        ----------
+        flow
+            the underlying object to which this state handler is attached
+        old_state
+            the previous state of this object
+        new_state
+            the proposed new state of this object
+        Returns
+        -------
+        newstate
+            the new state of this object.
+        """
+        if new_state.is_running():
+            with self._lock:
+                self.records = []
+        if new_state.is_finished():
+            self._add_rows_in(flow)
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+            self.write()
+            logger.info(self.report(flow))
+        return new_state
+
+    def _add_rows_in(self, flow: "Flow"):
+        """Rows in of each task are the rows out of its upstream tasks."""
+        rows_out: Dict[str, int] = defaultdict(int)
+        for record in self.records:
+            # A mapped parent returns the results of its children.
+            if record["rows_out"] is not None and record["state"] != "Mapped":
+                rows_out[record["slug"]] += record["rows_out"]
+        tasks = {flow.slugs[task]: task for task in flow.tasks}
+        for record in self.records:
+            task = tasks.get(record["slug"])
+            if task is None:
+                continue
+            upstream = [
+                rows_out[flow.slugs[upstream]]
+                for upstream in flow.upstream_tasks(task)
+                if flow.slugs[upstream] in rows_out
+            ]
+            if upstream:
+                record["rows_in"] = sum(upstream)
+
+    def write(self):
+        """Write the records to the configured JSON lines and Prometheus files."""
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, "a") as jsonl:
+                for record in self.records:
+                    jsonl.write(json.dumps(record, default=str) + "\n")
+        if self.prometheus_path is not None:
+            path = Path(self.prometheus_path)
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(self.to_prometheus())
+            os.replace(tmp_path, path)
+
+    def to_prometheus(self) -> str:
+        """The records as Prometheus gauges, one sample per task run."""
+        lines = []
+        for metric, description in PROMETHEUS_METRICS.items():
+            name = f"{PROMETHEUS_PREFIX}_{metric}"
+            samples = [
+                (record, record[metric])
+                for record in self.records
+                if record.get(metric) is not None
+            ]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for record, value in samples:
+                labels = {
+                    "flow_run_id": record["flow_run_id"],
+                    "task": record["task"],
+                    "slug": record["slug"],
+                }
+                if record["map_index"] is not None:
+                    labels["map_index"] = record["map_index"]
+                label_text = ",".join(
+                    f'{key}="{_escape_label(value)}"' for key, value in labels.items()
+                )
+                lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def critical_path(self, flow: "Flow") -> List[Dict[str, Any]]:
+        """
+        The chain of dependent tasks with the longest total wall time.
+
+        Parameters
+        ----------
+        flow : prefect.Flow
+            The profiled flow.
+
+        Returns
+        -------
+        list of dict
+            Task name, slug and wall time, the slowest mapped child counts for
+            mapped tasks, in execution order.
+        """
+        wall: Dict[str, float] = {}
+        for record in self.records:
+            wall[record["slug"]] = max(
+                wall.get(record["slug"], 0.0), record["wall_seconds"]
+            )
+        total: Dict[Any, float] = {}
+        previous: Dict[Any, Any] = {}
+        for task in flow.sorted_tasks():
+            best = max(
+                flow.upstream_tasks(task),
+                key=lambda upstream: total.get(upstream, 0.0),
+                default=None,
+            )
+            total[task] = wall.get(flow.slugs[task], 0.0) + (
+                total.get(best, 0.0) if best is not None else 0.0
+            )
+            previous[task] = best
+        if not total:
+            return []
+        task = max(total, key=total.__getitem__)
+        path = []
+        while task is not None:
+            path.append(
+                {
+                    "task": task.name,
+                    "slug": flow.slugs[task],
+                    "wall_seconds": wall.get(flow.slugs[task], 0.0),
+                }
+            )
+            task = previous[task]
+        return path[::-1]
+
+    def report(self, flow: "Flow") -> str:
+        """A text report of the flow critical path."""
+        path = self.critical_path(flow)
+        total = sum(step["wall_seconds"] for step in path)
+        lines = [f"Critical path of {flow.name}: {total:.3f}s"]
+        for step in path:
+            share = step["wall_seconds"] / total if total else 0.0
+            lines.append(f"  {step['slug']}: {step['wall_seconds']:.3f}s ({share:.0%})")
+        return "\n".join(lines)
@@ -13,10 +13,16 @@ import logging
 from typing import TYPE_CHECKING, Optional  # pylint:disable=unused-import
 
 from prefect import Flow, Task
+from prefect.executors import LocalDaskExecutor
 
 from soam.cfg import TRACKING_IS_ACTIVE, TRACKING_URI
+from soam.core.tracking import MlflowBatchTracker
 
 logger = logging.getLogger(__name__)
+
+THREADS = "threads"
+PROCESSES = "processes"
+
 try:
     from mlflow import end_run, set_tracking_uri, start_run
 except ModuleNotFoundError:
@@ -24,6 +30,9 @@ except ModuleNotFoundError:
 
 
 if TYPE_CHECKING:
+    from soam.core.checkpoint import CheckpointStore
+    from soam.core.instrumentation import StepProfiler
+    from soam.core.spill import ArrowSpill
     from soam.savers.savers import Saver
 
 
@@ -31,9 +40,25 @@ class SoamFlow(Flow):
     """
     Soam Flow to execute the pipeline steps and keep track of the whole run data.
     SoamFlow is an extension of prefect.Flow to add tracking functionality.
+
+    With `n_workers` independent tasks, e.g. the children of a task mapped over
+    the Slicer output, run in parallel threads or processes. Savers, tracking,
+    checkpoints, spills and `SuppressStdOutStdErr` are safe to use from them.
+    Tasks running in processes work on copies of the steps, so the state a run
+    leaves on a step stays in the worker, and a StepProfiler can't be used with
+    them.
     """
 
-    def __init__(self, saver: "Optional[Saver]" = None, **kwargs):
+    def __init__(
+        self,
+        saver: "Optional[Saver]" = None,
+        profiler: "Optional[StepProfiler]" = None,
+        checkpoint_store: "Optional[CheckpointStore]" = None,
+        spill: "Optional[ArrowSpill]" = None,
+        n_workers: Optional[int] = None,
+        scheduler: str = THREADS,
+        **kwargs,
+    ):
         """
         Soam Flow init to execute pipeline steps and keep track of the run data.
 
@@ -41,20 +66,56 @@ class SoamFlow(Flow):
         ----------
         saver: soam.savers.Saver
             The saver to store the pipeline steps and keep track of the whole run data.
+        profiler: soam.core.instrumentation.StepProfiler
+            Records the time, memory and rows of every task run. Not supported
+            with process workers, whose records would stay in the workers.
+        checkpoint_store: soam.core.checkpoint.CheckpointStore
+            Store of the outputs of the `checkpointable` steps that have none, so
+            a re-run skips the steps that already finished with the same inputs.
+        spill: soam.core.spill.ArrowSpill
+            Spills the large DataFrames returned by the steps to Arrow files and
+            passes handles between them, removed when the flow run ends.
+        n_workers: int
+            Tasks run at once with a prefect LocalDaskExecutor, sequentially if
+            None. Ignored if an executor is given.
+        scheduler: str
+            "threads" or "processes", the workers running the tasks.
         kwargs: dict
             extra args.
         """
 
+        if scheduler not in (THREADS, PROCESSES):
+            raise ValueError(f"Unknown scheduler {scheduler}.")
+        if profiler is not None and n_workers is not None and scheduler == PROCESSES:
+            raise ValueError(
+                "A StepProfiler records the task runs in the flow process, "
+                f'use scheduler="{THREADS}" to profile parallel flows.'
+            )
+        if n_workers is not None and kwargs.get("executor") is None:
+            kwargs["executor"] = LocalDaskExecutor(
+                scheduler=scheduler, num_workers=n_workers
+            )
         super().__init__(**kwargs)
+        self.n_workers = n_workers
+        self.scheduler = scheduler
         self.saver = saver
-        self.start_datetime: datetime
-        self.end_datetime: datetime
+        self.profiler = profiler
+        self.checkpoint_store = checkpoint_store
+        self.spill = spill
+        self.start_datetime: Optional[datetime] = None
+        self.end_datetime: Optional[datetime] = None
+        self.state_handlers.append(self.set_run_datetimes)
+        if self.profiler is not None:
+            self.state_handlers.append(self.profiler.flow_handler)
         if self.saver is not None:
             self.state_handlers.append(self.saver.save_flow_run)
+        if self.spill is not None:
+            self.state_handlers.append(self.spill.flow_handler)
 
         if TRACKING_IS_ACTIVE:
             self.active_run = None
             set_tracking_uri(TRACKING_URI)
+            self.tracker = MlflowBatchTracker(TRACKING_URI)
             self.state_handlers.append(self.set_tracker_run)
 
     def add_task(self, task: Task) -> Task:
@@ -74,13 +135,52 @@ class SoamFlow(Flow):
         if self.saver is not None:
             if self.saver.save_task_run not in task.state_handlers:
                 task.state_handlers.append(self.saver.save_task_run)
+        if self.profiler is not None:
+            if self.profiler.task_handler not in task.state_handlers:
+                task.state_handlers.append(self.profiler.task_handler)
+        if self.checkpoint_store is not None:
+            if getattr(task, "checkpointable", False) and task.checkpoint_store is None:
+                task.checkpoint_store = self.checkpoint_store
+        if self.spill is not None:
+            if getattr(task, "spill", False) is None:
+                task.spill = self.spill
+        if TRACKING_IS_ACTIVE:
+            if getattr(task, "tracker", False) is None:
+                task.tracker = self.tracker
         return super().add_task(task)
 
+    def set_run_datetimes(
+        self, obj, old_state, new_state
+    ):  # pylint: disable=unused-argument
+        """
+        Record when the flow run starts and ends, read by the savers.
+
+        Parameters
+        ----------
+        obj
+            the underlying object to which this state handler is attached
+        old_state
+            the previous state of this object
+        new_state
+            the proposed new state of this object
+        Returns
+        -------
+        newstate
+            the new state of this object.
+        """
+        if new_state.is_running():
+            self.start_datetime = datetime.now()
+            self.end_datetime = None
+        if new_state.is_finished():
+            self.end_datetime = datetime.now()
+        return new_state
+
     def set_tracker_run(
         self, obj, old_state, new_state
     ):  # pylint: disable=unused-argument
         """
-        Create a new mlflow run.
+        Create a new mlflow run, the active run of the MLflow fluent API while
+        the flow runs.
 
         Parameters
         ----------
@@ -96,7 +196,22 @@ class SoamFlow(Flow):
             the new state of this object.
         """
         if new_state.is_running():
-            obj.active_run = start_run(run_name="flow_run")
+            obj.active_run = self.tracker.start_run("flow_run")
+            self.tracker.flow_run = obj.active_run
+            # Steps in worker processes need the flow run id to nest their runs.
+            self.tracker.flush()
+            if obj.active_run.run_id is not None:
+                # mlflow.log_* calls of steps running in this process log to it.
+                start_run(run_id=obj.active_run.run_id, nested=True)
         if new_state.is_finished():
-            end_run()
+            status = "FINISHED" if new_state.is_successful() else "FAILED"
+            self.tracker.flow_run = None
+            if obj.active_run.run_id is not None:
+                # The step runs are logged before the flow run ends.
+                self.tracker.flush()
+                end_run(status)
+            else:
+                self.tracker.end_run(obj.active_run, status)
+            # The run is complete once the flow returns.
+            self.tracker.flush()
         return new_state
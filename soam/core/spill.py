@@ -0,0 +1,271 @@
+"""
+Spill
+-----
+Spill large DataFrames returned by steps to Arrow IPC files.
+
+Prefect keeps the result of every task in memory until the flow run ends. A flow
+with a spill writes the large DataFrame results of its steps to disk and passes
+lightweight handles between them instead, which are read back from their memory
+mapped files when a step receives them. By default the columns are copied out of
+the files once so steps can modify them, read only spills hand them the mapped
+memory without copying.
+"""
+import logging
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import uuid
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from prefect import Flow
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+    logger.debug("Pyarrow dependency is not installed.")
+
+DEFAULT_THRESHOLD_BYTES = 64 * 1024 ** 2
+
+
+class ArrowHandle:
+    """Reference to a DataFrame spilled to an Arrow IPC file."""
+
+    __slots__ = ("path", "rows", "nbytes", "read_only")
+
+    def __init__(
+        self, path: Union[str, Path], rows: int, nbytes: int, read_only: bool = False,
+    ):
+        """
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            The Arrow IPC file.
+        rows : int
+            Rows of the DataFrame.
+        nbytes : int
+            Memory used by the DataFrame.
+        read_only : bool, optional
+            Load the DataFrame without copying it, see `load`.
+        """
+        self.path = Path(path)
+        self.rows = rows
+        self.nbytes = nbytes
+        self.read_only = read_only
+
+    def load(self) -> pd.DataFrame:
+        """
+        Read the DataFrame back from its memory mapped file.
+
+        By default the columns are copied once out of the mapped file, so the
+        DataFrame is writable and steps can modify their inputs in place. Read
+        only handles convert the columns without copying them where Arrow
+        allows it, e.g. numeric and datetime columns without nulls, so they stay
+        backed by the mapped file and can't be modified in place.
+
+        Returns
+        -------
+        pd.DataFrame
+            The spilled DataFrame.
+        """
+        if not self.path.exists():
+            raise ValueError(
+                f"The spilled frame {self.path} was removed when its flow ended."
+            )
+        with pa.memory_map(str(self.path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        if self.read_only:
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+        return table.to_pandas()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __repr__(self) -> str:
+        return f"ArrowHandle({str(self.path)!r}, rows={self.rows})"
+
+
+def load_handles(value: Any) -> Any:
+    """
+    Replace the handles in a value, or in its tuples, lists and dicts, with
+    their DataFrames.
+
+    Parameters
+    ----------
+    value : object
+        A step input or output.
+
+    Returns
+    -------
+    object
+        The value with its DataFrames loaded.
+    """
+    if isinstance(value, ArrowHandle):
+        return value.load()
+    if type(value) in (tuple, list):
+        return type(value)(load_handles(item) for item in value)
+    if type(value) is dict:  # pylint: disable=unidiomatic-typecheck
+        return {key: load_handles(item) for key, item in value.items()}
+    return value
+
+
+class ArrowSpill:
+    """
+    Spill the large DataFrame results of the steps of a flow to disk.
+
+    Attach it with `SoamFlow(spill=...)`. Each flow run writes to its own
+    temporary directory, which is removed when the run ends. The results of the
+    reference tasks of the flow, by default its terminal tasks, are loaded back
+    into memory before that, handles of other tasks can't be loaded afterwards.
+    Steps load the handles they receive, other Prefect tasks can load them with
+    `load_handles`.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path, None] = None,
+        threshold_bytes: int = DEFAULT_THRESHOLD_BYTES,
+        cleanup: bool = True,
+        read_only: bool = False,
+    ):
+        """
+        Parameters
+        ----------
+        directory : str or pathlib.Path, optional
+            Where the run directories are created, by default the system
+            temporary directory.
+        threshold_bytes : int, optional
+            DataFrames using more memory are spilled, by default 64 MiB. Object
+            columns count their pointers only.
+        cleanup : bool, optional
+            Remove the spilled files when the flow run ends, by default True.
+            Otherwise call `cleanup` once the results are no longer needed.
+        read_only : bool, optional
+            Hand the steps the spilled frames backed by the memory mapped files
+            instead of copies, by default False. Their columns can't be modified
+            in place, which suits steps that only read them.
+        """
+        if pa is None:
+            raise ImportError(
+                "ArrowSpill needs pyarrow, ´pip install soam[arrow]´ to use it."
+            )
+        self.directory = directory
+        self.threshold_bytes = threshold_bytes
+        self.cleanup_on_finish = cleanup
+        self.read_only = read_only
+
+        self.run_dir: Optional[Path] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def start(self) -> Path:
+        """Create the directory of the current run if needed."""
+        with self._lock:
+            if self.run_dir is None:
+                if self.directory is not None:
+                    Path(self.directory).mkdir(parents=True, exist_ok=True)
+                self.run_dir = Path(
+                    tempfile.mkdtemp(prefix="soam_spill_", dir=self.directory)
+                )
+            return self.run_dir
+
+    def _next_path(self) -> Path:
+        # Unique across the worker processes sharing the run directory.
+        return self.start() / f"{uuid.uuid4().hex}.arrow"
+
+    def _spill_frame(self, df: pd.DataFrame) -> Union[pd.DataFrame, ArrowHandle]:
+        nbytes = int(df.memory_usage(index=True, deep=False).sum())
+        if nbytes < self.threshold_bytes:
+            return df
+        path = self._next_path()
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            with pa.OSFile(str(path), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        except (pa.ArrowException, TypeError, ValueError) as error:
+            logger.debug(f"Keeping in memory a frame Arrow can't store: {error}")
+            if path.exists():
+                path.unlink()
+            return df
+        return ArrowHandle(path, len(df), nbytes, read_only=self.read_only)
+
+    def spill(self, value: Any) -> Any:
+        """
+        Spill the large DataFrames of a step output.
+
+        Parameters
+        ----------
+        value : object
+            A DataFrame, or a tuple, list or dict that contains DataFrames.
+
+        Returns
+        -------
+        object
+            The value with handles in place of its large DataFrames.
+        """
+        if isinstance(value, pd.DataFrame):
+            return self._spill_frame(value)
+        if type(value) in (tuple, list):
+            return type(value)(self.spill(item) for item in value)
+        if type(value) is dict:  # pylint: disable=unidiomatic-typecheck
+            return {key: self.spill(item) for key, item in value.items()}
+        return value
+
+    def cleanup(self):
+        """Remove the files spilled by the current run."""
+        with self._lock:
+            run_dir, self.run_dir = self.run_dir, None
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    def flow_handler(
+        self, flow: "Flow", old_state, new_state
+    ):  # pylint: disable=unused-argument
+        """
+        State handler that loads the reference results and cleans up.
+
+        Parameters
+        ----------
+        flow
+            the underlying object to which this state handler is attached
+        old_state
+            the previous state of this object
+        new_state
+            the proposed new state of this object
+        Returns
+        -------
+        newstate
+            the new state of this object.
+        """
+        if new_state.is_running():
+            # Created before the tasks are sent to worker processes.
+            self.start()
+        if new_state.is_finished() and self.cleanup_on_finish:
+            task_states = new_state.result
+            if not isinstance(task_states, dict):
+                task_states = {}
+            for task in flow.reference_tasks():
+                state = task_states.get(task)
+                if state is None:
+                    continue
+                children = getattr(state, "map_states", None) or []
+                for child in [state, *children]:
+                    if child.result is not None:
+                        child.result = load_handles(child.result)
+            self.cleanup()
+        return new_state
@@ -6,44 +6,148 @@ An abstract base class for the steps in the pipeline, including: postprocess,
 preprocess, extract and forecaster.
 """
 from abc import abstractmethod
+import copy
+import functools
 import logging
+import threading
+from typing import (  # pylint:disable=unused-import
+    TYPE_CHECKING,
+    Callable,
+    Optional,
+    TypeVar,
+)
 
 import pandas as pd
 from prefect import Task, context
-from sklearn.base import BaseEstimator
+from sklearn.base import BaseEstimator, clone
 
 from soam.cfg import TRACKING_IS_ACTIVE
+from soam.core.checkpoint import fingerprint
+from soam.core.spill import load_handles
+from soam.core.tracking import default_tracker
 from soam.utilities.utils import flatten_dict
 
 logger = logging.getLogger(__name__)
+
 try:
-    from mlflow import end_run, log_params, start_run
+    from mlflow import end_run, start_run
 except ModuleNotFoundError:
     logger.debug("Mlflow dependency is not installed.")
 
+if TYPE_CHECKING:
+    from soam.core.checkpoint import CheckpointStore
+    from soam.core.spill import ArrowSpill
+    from soam.core.tracking import MlflowBatchTracker
+
+# Ids of the steps whose run is being managed in each thread, so the parent runs
+# a subclass run calls are not managed again.
+_MANAGING = threading.local()
+
+
+def _managed(run: Callable) -> Callable:
+    """Route the calls to a subclass run through `Step._managed_run`."""
+
+    @functools.wraps(run)
+    def managed_run(self, *args, **kwargs):
+        managing = _MANAGING.__dict__.setdefault("steps", set())
+        if id(self) in managing or (
+            getattr(self, "checkpoint_store", None) is None
+            and getattr(self, "spill", None) is None
+        ):
+            return run(self, *args, **kwargs)
+        managing.add(id(self))
+        try:
+            return self._managed_run(  # pylint: disable=protected-access
+                run, *args, **kwargs
+            )
+        finally:
+            managing.discard(id(self))
+
+    return managed_run
+
+
+StepT = TypeVar("StepT", bound="Step")
+
 
 class Step(Task, BaseEstimator):
     """
     The base class for all steps.
     All implementations of step have to implement the `run()` method defined below.
+
+    The runs of a step with a checkpoint store or a spill go through
+    `_managed_run`. Only the steps with `checkpointable` set get the checkpoint
+    store of a SoamFlow, so the steps that read external data or have side
+    effects, e.g. extractors and reports, run every time.
     """
 
-    def __init__(self, **kwargs):
+    checkpointable = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "run" in cls.__dict__:
+            cls.run = _managed(cls.__dict__["run"])  # type: ignore
+
+    def __init__(self, checkpoint_store: "Optional[CheckpointStore]" = None, **kwargs):
         """
         Soam Step init.
 
         Parameters
         ----------
+        checkpoint_store: soam.core.checkpoint.CheckpointStore
+            Store of the step outputs, a run with the same parameters and inputs
+            as a stored one returns its output without running. Only the output
+            is restored, not the state the run leaves on the step, e.g. fitted
+            models. Used even if the step is not `checkpointable`.
         kwargs: dict
             extra args.
         """
 
         super().__init__(**kwargs)
+        self._tracking_params: Optional[dict] = None
+        # Set by SoamFlow(spill=...), the large output frames are spilled to it.
+        self.spill: "Optional[ArrowSpill]" = None
+        self.checkpoint_store = checkpoint_store
 
         if TRACKING_IS_ACTIVE:
             self.active_run = None
+            self._tracked_runs: dict = {}
+            # Set by SoamFlow, the default tracker is used outside flows.
+            self.tracker: "Optional[MlflowBatchTracker]" = None
             self.state_handlers.append(self.set_tracker_run)
 
+    def _managed_run(self, run: Callable, *args, **kwargs):
+        """
+        Run the step loading the spilled frames it receives, returning the stored
+        output of a previous identical run and spilling its large output frames.
+
+        Parameters
+        ----------
+        run: callable
+            The unbound run of the step class.
+        args, kwargs
+            Arguments of the run.
+        """
+        args, kwargs = load_handles(args), load_handles(kwargs)
+        name = type(self).__name__
+        store, key = self.checkpoint_store, None
+        if store is not None:
+            try:
+                key = self.checkpoint_key(*args, **kwargs)
+            except ValueError as error:
+                logger.warning(f"Not checkpointing {name}: {error}")
+        if store is not None and key is not None:
+            hit, value = store.get(key)
+            if hit:
+                logger.info(f"Restored {name} output from checkpoint {key}.")
+                return value if self.spill is None else self.spill.spill(value)
+        value = run(self, *args, **kwargs)
+        if store is not None and key is not None:
+            try:
+                store.put(key, value)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning(f"Could not checkpoint {name} output: {error}")
+        return value if self.spill is None else self.spill.spill(value)
+
     def get_params(self, deep=True):
         out = dict()
         for key in self._get_param_names():
@@ -56,6 +160,82 @@ class Step(Task, BaseEstimator):
             out[key] = value
         return out
 
+    def set_params(self, **params):
+        self._tracking_params = None
+        return super().set_params(**params)
+
+    def get_tracking_params(self) -> dict:
+        """
+        Flattened parameters logged to the tracking run, computed once per step.
+
+        Returns
+        -------
+        dict
+            The deep parameters of the step, as logged by `mlflow.log_params`.
+        """
+        params = getattr(self, "_tracking_params", None)
+        if params is None:
+            params = self._tracking_params = flatten_dict(self.get_params())
+        return params
+
+    def clone(self: StepT) -> StepT:
+        """
+        Lightweight copy of the step to be used in hot loops, e.g. per fold.
+
+        The copy shares the immutable configuration with this step, estimator
+        parameters are rebuilt unfitted from their `get_params`, nested steps are
+        cloned and the data kept from previous runs is dropped. Unlike
+        `prefect.Task.copy` no flow checks are performed.
+
+        Returns
+        -------
+        Step
+            The cloned step.
+        """
+        new = copy.copy(self)
+        new.state_handlers = [
+            getattr(new, handler.__name__)
+            if getattr(handler, "__self__", None) is self
+            else handler
+            for handler in self.state_handlers
+        ]
+        new.tags = set(self.tags)
+        for key in self._get_param_names():
+            value = getattr(self, key, None)
+            if isinstance(value, Step):
+                setattr(new, key, value.clone())
+            elif isinstance(value, BaseEstimator):
+                setattr(new, key, clone(value))
+        new._reset_run_state()  # pylint: disable=protected-access
+        return new
+
+    def _reset_run_state(self):
+        """Drop the data kept from previous runs, called on the clones."""
+        if TRACKING_IS_ACTIVE:
+            self.active_run = None
+            self._tracked_runs = {}
+
+    def checkpoint_key(self, *args, **kwargs) -> str:
+        """
+        Key of a run in the checkpoint store.
+
+        Parameters
+        ----------
+        args, kwargs
+            Arguments of the run.
+
+        Returns
+        -------
+        str
+            Hash of the step class, its parameters and the run arguments.
+        """
+        return fingerprint(
+            f"{type(self).__module__}.{type(self).__qualname__}",
+            self.get_params(deep=False),
+            args,
+            kwargs,
+        )
+
     def get_mlflow_run_name(self):
         return f"{self.__class__.__name__}"
 
@@ -63,7 +243,14 @@ class Step(Task, BaseEstimator):
         self, obj, old_state, new_state
     ):  # pylint: disable=unused-argument
         """
-        Create a new mlflow run.
+        Queue a new nested mlflow run with the step parameters.
+
+        Steps running in the main thread, sequentially or in worker processes,
+        wait for their run to be created and keep it as the active run of the
+        MLflow fluent API while they run, so their `mlflow.log_*` calls log to
+        it. The fluent API keeps one active run per process, so steps running in
+        parallel threads don't activate theirs and those calls log to the flow
+        run.
 
         Parameters
         ----------
@@ -78,12 +265,32 @@ class Step(Task, BaseEstimator):
         newstate
             the new state of this object.
         """
+        tracker = getattr(obj, "tracker", None) or default_tracker()
+        # Mapped children of the task may run at once in other threads.
+        key = (context.get("map_index"), threading.get_ident())
+        runs = obj.__dict__.setdefault("_tracked_runs", {})
         if new_state.is_running():
-            obj.active_run = start_run(nested=True, run_name=self.get_mlflow_run_name())
-            log_params(flatten_dict(self.get_params()))
+            obj.active_run = tracker.start_run(
+                self.get_mlflow_run_name(), parent=tracker.flow_run
+            )
+            tracker.log_params(obj.active_run, self.get_tracking_params())
+            activated = threading.current_thread() is threading.main_thread()
+            if activated:
+                tracker.flush()
+                activated = obj.active_run.run_id is not None
+            if activated:
+                start_run(run_id=obj.active_run.run_id, nested=True)
+            runs[key] = (obj.active_run, activated)
 
-        if new_state.is_finished():
-            end_run()
+        if new_state.is_finished() and key in runs:
+            status = "FINISHED" if new_state.is_successful() else "FAILED"
+            run, activated = runs.pop(key)
+            if activated:
+                # Calls queued for the run are logged before it ends.
+                tracker.flush()
+                end_run(status)
+            else:
+                tracker.end_run(run, status)
         return new_state
 
     @abstractmethod
@@ -0,0 +1,337 @@
+"""
+Tracking
+--------
+Asynchronous MLflow tracking of flow and step runs.
+
+Runs, parameters and metrics are queued and sent by a background thread, which
+groups the parameters, tags and metrics of each run in `log_batch` requests.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+try:
+    from mlflow.entities import Metric, Param, RunTag
+    from mlflow.tracking import MlflowClient
+    from mlflow.tracking.fluent import _get_experiment_id
+except ModuleNotFoundError:
+    logger.debug("Mlflow dependency is not installed.")
+
+DEFAULT_EXPERIMENT_ID = "0"
+RUN_NAME_TAG = "mlflow.runName"
+PARENT_RUN_TAG = "mlflow.parentRunId"
+# Limits of a single log_batch request.
+MAX_PARAMS_TAGS_PER_BATCH = 100
+MAX_ENTITIES_PER_BATCH = 1000
+MAX_PARAM_LENGTH = 250
+# Attempts of each request before the operations of its run are dropped.
+MAX_ATTEMPTS = 3
+RETRY_WAIT = 0.5
+
+_CREATE = "create"
+_PARAMS = "params"
+_TAGS = "tags"
+_METRICS = "metrics"
+_END = "end"
+_STOP = "stop"
+
+
+class TrackedRun:
+    """Handle of a run, its id is set once the tracker creates it."""
+
+    __slots__ = ("name", "parent", "experiment_id", "run_id")
+
+    def __init__(
+        self,
+        name: str,
+        parent: "Optional[TrackedRun]" = None,
+        experiment_id: str = DEFAULT_EXPERIMENT_ID,
+    ):
+        self.name = name
+        self.parent = parent
+        self.experiment_id = experiment_id
+        self.run_id: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"TrackedRun({self.name!r}, run_id={self.run_id!r})"
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class MlflowBatchTracker:
+    """
+    Track runs in MLflow from a background thread.
+
+    Every call returns immediately. The queued calls are grouped, the entities
+    of each run are logged with `MlflowClient.log_batch` and runs are ended once
+    their entities are logged. `flush` waits until every queued call is sent.
+    Copies unpickled in worker processes send each call as it is made.
+
+    The calls of each run are sent on their own, failed requests are retried
+    and a run whose calls can't be sent is still ended, so a tracking error
+    never leaves other runs unlogged or a run in the RUNNING status.
+    """
+
+    def __init__(
+        self,
+        tracking_uri: Optional[str] = None,
+        experiment_id: Optional[str] = None,
+        max_queue_wait: float = 0.05,
+    ):
+        """
+        Parameters
+        ----------
+        tracking_uri : str, optional
+            MLflow tracking URI, by default the one set in mlflow.
+        experiment_id : str, optional
+            Experiment of the runs without a parent. By default the active one
+            when each run starts, resolved like the MLflow fluent API from
+            `mlflow.set_experiment` or the `MLFLOW_EXPERIMENT_NAME` and
+            `MLFLOW_EXPERIMENT_ID` environment variables.
+        max_queue_wait : float, optional
+            Seconds the thread waits for more calls to group with the queued
+            ones, by default 0.05
+        """
+        self.tracking_uri = tracking_uri or None
+        self.experiment_id = experiment_id
+        self.max_queue_wait = max_queue_wait
+
+        # Runs created from flows, the parent of the steps runs.
+        self.flow_run: Optional[TrackedRun] = None
+        self._pid = os.getpid()
+        self._client = None
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_client", "_queue", "_thread", "_lock"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._client = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _put(self, *operation):
+        if os.getpid() != self._pid:
+            # A worker process can end with calls queued, send them right away.
+            with self._lock:
+                if self._client is None:
+                    self._client = MlflowClient(self.tracking_uri)
+                try:
+                    self._send(self._client, [operation])
+                except Exception as error:  # pylint: disable=broad-except
+                    logger.warning(f"MLflow tracking failed: {error}")
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._work, name="mlflow-tracker", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(operation)
+
+    def start_run(self, name: str, parent: Optional[TrackedRun] = None) -> TrackedRun:
+        """
+        Queue the creation of a run.
+
+        Parameters
+        ----------
+        name : str
+            Name of the run.
+        parent : TrackedRun, optional
+            Run the new one is nested in.
+
+        Returns
+        -------
+        TrackedRun
+            Handle to log to and end the run.
+        """
+        if parent is not None:
+            experiment_id = parent.experiment_id
+        else:
+            experiment_id = self.experiment_id or _get_experiment_id()
+        run = TrackedRun(name, parent, experiment_id)
+        self._put(_CREATE, run, _now_ms())
+        return run
+
+    def log_params(self, run: TrackedRun, params: Dict[str, Any]):
+        """Queue parameters of a run, values are logged as strings."""
+        self._put(_PARAMS, run, params)
+
+    def set_tags(self, run: TrackedRun, tags: Dict[str, Any]):
+        """Queue tags of a run."""
+        self._put(_TAGS, run, tags)
+
+    def log_metrics(self, run: TrackedRun, metrics: Dict[str, float], step: int = 0):
+        """Queue metrics of a run."""
+        self._put(_METRICS, run, (metrics, _now_ms(), step))
+
+    def end_run(self, run: TrackedRun, status: str = "FINISHED"):
+        """Queue the end of a run."""
+        self._put(_END, run, (status, _now_ms()))
+
+    def flush(self):
+        """Wait until every queued call is sent."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Send the queued calls and stop the background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put((_STOP,))
+            self._thread.join()
+        self._thread = None
+
+    def _work(self):
+        client = MlflowClient(self.tracking_uri)
+        stop = False
+        while not stop:
+            operations = [self._queue.get()]
+            deadline = time.monotonic() + self.max_queue_wait
+            while operations[-1][0] != _STOP:
+                try:
+                    operations.append(
+                        self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    )
+                except queue.Empty:
+                    break
+            stop = operations[-1][0] == _STOP
+            try:
+                self._send(client, operations)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning(f"MLflow tracking failed: {error}")
+            finally:
+                for _ in operations:
+                    self._queue.task_done()
+
+    def _send(self, client, operations: List[tuple]):
+        """Create, log to and end the runs of a group of queued calls."""
+        runs: Dict[TrackedRun, List[tuple]] = {}
+        for operation in operations:
+            if operation[0] != _STOP:
+                runs.setdefault(operation[1], []).append(operation)
+        # Parents are created first, their calls were queued before.
+        for run, run_operations in runs.items():
+            try:
+                self._send_run(client, run, run_operations)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning(f"MLflow tracking of run {run.name} failed: {error}")
+                ends = [
+                    operation[2] for operation in run_operations if operation[0] == _END
+                ]
+                if ends and run.run_id is not None:
+                    status, end_time = ends[-1]
+                    try:
+                        _retry(
+                            client.set_terminated,
+                            run.run_id,
+                            status=status,
+                            end_time=end_time,
+                        )
+                    except Exception as end_error:  # pylint: disable=broad-except
+                        logger.warning(
+                            f"MLflow run {run.name} could not be ended: {end_error}"
+                        )
+
+    def _send_run(self, client, run: TrackedRun, operations: List[tuple]):
+        """Create, log to and end a run."""
+        params: List[Param] = []
+        tags: List[RunTag] = []
+        metrics: List[Metric] = []
+        end = None
+        for operation in operations:
+            kind = operation[0]
+            if kind == _CREATE:
+                create_tags = {RUN_NAME_TAG: run.name}
+                if run.parent is not None and run.parent.run_id is not None:
+                    create_tags[PARENT_RUN_TAG] = run.parent.run_id
+                run.run_id = _retry(
+                    client.create_run,
+                    run.experiment_id,
+                    start_time=operation[2],
+                    tags=create_tags,
+                ).info.run_id
+            elif kind == _PARAMS:
+                params.extend(
+                    Param(key, str(value)[:MAX_PARAM_LENGTH])
+                    for key, value in operation[2].items()
+                )
+            elif kind == _TAGS:
+                tags.extend(
+                    RunTag(key, str(value)) for key, value in operation[2].items()
+                )
+            elif kind == _METRICS:
+                values, timestamp, step = operation[2]
+                metrics.extend(
+                    Metric(key, float(value), timestamp, step)
+                    for key, value in values.items()
+                )
+            elif kind == _END:
+                end = operation[2]
+
+        if run.run_id is None:
+            logger.warning(
+                f"Dropping {len(params)} params, {len(tags)} tags, "
+                f"{len(metrics)} metrics and the end of MLflow run {run.name}, "
+                "which was never created."
+            )
+            return
+        while params or tags or metrics:
+            batch_params = params[:MAX_PARAMS_TAGS_PER_BATCH]
+            batch_tags = tags[: MAX_PARAMS_TAGS_PER_BATCH - len(batch_params)]
+            batch_metrics = metrics[
+                : MAX_ENTITIES_PER_BATCH - len(batch_params) - len(batch_tags)
+            ]
+            _retry(
+                client.log_batch,
+                run.run_id,
+                metrics=batch_metrics,
+                params=batch_params,
+                tags=batch_tags,
+            )
+            params = params[len(batch_params) :]
+            tags = tags[len(batch_tags) :]
+            metrics = metrics[len(batch_metrics) :]
+        if end is not None:
+            status, end_time = end
+            _retry(client.set_terminated, run.run_id, status=status, end_time=end_time)
+
+
+def _retry(request, *args, **kwargs):
+    """Call an MLflow request, retrying it with exponential backoff."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return request(*args, **kwargs)
+        except Exception as error:  # pylint: disable=broad-except
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            logger.debug(f"Retrying MLflow request after error: {error}")
+            time.sleep(RETRY_WAIT * 2 ** attempt)
+    return None
+
+
+_default_tracker: Optional[MlflowBatchTracker] = None
+_default_lock = threading.Lock()
+
+
+def default_tracker() -> MlflowBatchTracker:
+    """Tracker of the steps that run outside a SoamFlow."""
+    global _default_tracker  # pylint: disable=global-statement
+    with _default_lock:
+        if _default_tracker is None:
+            _default_tracker = MlflowBatchTracker()
+            atexit.register(_default_tracker.close)
+        return _default_tracker
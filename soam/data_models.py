@@ -17,6 +17,7 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     Text,
     UniqueConstraint,
@@ -143,7 +144,14 @@ class ForecastValues(AbstractIDBase):
     """Forecasted values Table Definition"""
 
     __tablename__ = FORECASTER_VALUES_TABLE
-    __table_args__ = (UniqueConstraint("task_run_id", "forecast_date"),)
+    __table_args__ = (
+        UniqueConstraint("task_run_id", "forecast_date"),
+        Index(
+            "ix_forecaster_values_task_run_id_forecast_date",
+            "task_run_id",
+            "forecast_date",
+        ),
+    )
 
     task_run_id = Column(
         UUIDType(binary=False),
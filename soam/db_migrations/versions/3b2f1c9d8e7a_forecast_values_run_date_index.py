@@ -0,0 +1,34 @@
+"""forecast_values task_run_id and forecast_date index
+
+Revision ID: 3b2f1c9d8e7a
+Revises: 74f172dd880e
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+# pylint: skip-file
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3b2f1c9d8e7a"
+down_revision = "74f172dd880e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Index forecasts by task run and date to look up stored intervals."""
+    op.create_index(
+        op.f("ix_forecaster_values_task_run_id_forecast_date"),
+        "forecaster_values",
+        ["task_run_id", "forecast_date"],
+        unique=False,
+    )
+
+
+def downgrade():
+    """Drop task_run_id and forecast_date index."""
+    op.drop_index(
+        op.f("ix_forecaster_values_task_run_id_forecast_date"),
+        table_name="forecaster_values",
+    )
@@ -0,0 +1,303 @@
+"""
+Baseline estimators.
+
+Naive, seasonal naive, moving average and drift forecasts implemented in NumPy.
+Besides the scikit-learn interface used by the Forecaster, every model can fit
+and forecast a whole panel of series at once (series x time) with `fit_panel`
+and `predict_panel`, and `batch_forecast` does it for a long format DataFrame.
+
+Prediction intervals are the analytic ones for each method assuming normal
+residuals, see https://otexts.com/fpp3/prediction-intervals.html.
+"""
+from abc import abstractmethod
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from soam.constants import DS_COL, Y_COL, YHAT_COL, YHAT_LOWER_COL, YHAT_UPPER_COL
+from soam.models.base import SkWrapper
+
+# pylint: disable=attribute-defined-outside-init
+
+SERIES_COL = "series"
+
+
+def _ffill(values: np.ndarray) -> np.ndarray:
+    """Forward fill the NaN of each row, leading NaN are kept."""
+    positions = np.where(~np.isnan(values), np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(positions, axis=1, out=positions)
+    return np.take_along_axis(values, positions, axis=1)
+
+
+def _residual_scale(residuals: np.ndarray, n_params: int = 0) -> np.ndarray:
+    """Residual standard deviation of each series, ignoring NaN."""
+    count = np.sum(~np.isnan(residuals), axis=1) - n_params
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sqrt(np.nansum(residuals ** 2, axis=1) / count)
+
+
+class BaselineModel(SkWrapper):
+    """Base class of the NumPy baseline models."""
+
+    n_params = 0
+
+    def __init__(
+        self, interval_width: float = 0.8, ds_col: str = DS_COL
+    ):  # pylint: disable=super-init-not-called
+        """
+        Parameters
+        ----------
+        interval_width : float, optional
+            Coverage of the prediction intervals, by default 0.8
+        ds_col : str, optional
+            Date column name, by default DS_COL
+        """
+        self.interval_width = interval_width
+        self.ds_col = ds_col
+
+    @abstractmethod
+    def _fit_values(self, values: np.ndarray):
+        """Store what the forecast needs from the filled (n_series, n_time) panel."""
+
+    @abstractmethod
+    def _residuals(self, values: np.ndarray) -> np.ndarray:
+        """One step in-sample residuals used to estimate the interval scale."""
+
+    @abstractmethod
+    def _forecast(self, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Point forecast and its standard deviation, both (n_series, horizon)."""
+
+    def fit_panel(self, values: np.ndarray) -> "BaselineModel":
+        """
+        Fit one model per row of a panel.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Panel of shape (n_series, n_time), NaN are treated as missing values.
+
+        Returns
+        -------
+        BaselineModel
+            The fitted model.
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        filled = _ffill(values)
+        self.last_ = filled[:, -1]
+        self._fit_values(filled)
+        self.sigma_ = _residual_scale(self._residuals(filled), self.n_params)
+        return self
+
+    def predict_panel(self, horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Forecast every series of the fitted panel.
+
+        Parameters
+        ----------
+        horizon : int
+            Number of steps to forecast.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            Forecast, lower and upper bounds, each with shape (n_series, horizon).
+        """
+        yhat, std = self._forecast(horizon)
+        z = norm.ppf(0.5 + self.interval_width / 2)
+        return yhat, yhat - z * std, yhat + z * std
+
+    def fit(self, X: pd.DataFrame, y: pd.Series):  # pylint: disable=unused-argument
+        """Fit estimator to data."""
+        return self.fit_panel(np.asarray(y, dtype=np.float64)[np.newaxis, :])
+
+    def predict(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Scikit learn's predict."""
+        yhat, lower, upper = self.predict_panel(len(X))
+        return pd.DataFrame(
+            {
+                self.ds_col: X[self.ds_col].values,
+                YHAT_COL: yhat[0],
+                YHAT_LOWER_COL: lower[0],
+                YHAT_UPPER_COL: upper[0],
+            }
+        )
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Scikit learn's transform."""
+        return self.predict(X)
+
+    def fit_transform(self, X: pd.DataFrame, y: pd.Series, output_length: int = 1):
+        """Scikit learn's fit_transform with output_length."""
+        self.fit(X[:-output_length], y[:-output_length])
+        return self.transform(X[-output_length:])
+
+
+class NaiveModel(BaselineModel):
+    """Forecast the last observed value."""
+
+    def _fit_values(self, values):
+        pass
+
+    def _residuals(self, values):
+        return np.diff(values, axis=1)
+
+    def _forecast(self, horizon):
+        steps = np.arange(1, horizon + 1)
+        yhat = np.repeat(self.last_[:, np.newaxis], horizon, axis=1)
+        return yhat, self.sigma_[:, np.newaxis] * np.sqrt(steps)
+
+
+class SeasonalNaiveModel(BaselineModel):
+    """Forecast the last observed value of the same season."""
+
+    def __init__(
+        self, season_length: int = 7, interval_width: float = 0.8, ds_col: str = DS_COL,
+    ):
+        """
+        Parameters
+        ----------
+        season_length : int, optional
+            Number of periods in a season, by default 7
+        interval_width : float, optional
+            Coverage of the prediction intervals, by default 0.8
+        ds_col : str, optional
+            Date column name, by default DS_COL
+        """
+        super().__init__(interval_width=interval_width, ds_col=ds_col)
+        self.season_length = season_length
+
+    def _fit_values(self, values):
+        if values.shape[1] < self.season_length:
+            raise ValueError("Series are shorter than a season.")
+        self.last_season_ = values[:, -self.season_length :]
+
+    def _residuals(self, values):
+        return values[:, self.season_length :] - values[:, : -self.season_length]
+
+    def _forecast(self, horizon):
+        steps = np.arange(horizon)
+        yhat = self.last_season_[:, steps % self.season_length]
+        seasons = steps // self.season_length + 1
+        return yhat, self.sigma_[:, np.newaxis] * np.sqrt(seasons)
+
+
+class MovingAverageModel(BaselineModel):
+    """Forecast the mean of the last `window` observations."""
+
+    def __init__(
+        self, window: int = 7, interval_width: float = 0.8, ds_col: str = DS_COL,
+    ):
+        """
+        Parameters
+        ----------
+        window : int, optional
+            Number of observations averaged, by default 7
+        interval_width : float, optional
+            Coverage of the prediction intervals, by default 0.8
+        ds_col : str, optional
+            Date column name, by default DS_COL
+        """
+        super().__init__(interval_width=interval_width, ds_col=ds_col)
+        self.window = window
+
+    def _fit_values(self, values):
+        self.mean_ = np.nanmean(values[:, -self.window :], axis=1)
+
+    def _residuals(self, values):
+        # Each value minus the mean of the `window` values before it.
+        observed = ~np.isnan(values)
+        pad = np.zeros((len(values), 1))
+        sums = np.hstack([pad, np.cumsum(np.where(observed, values, 0.0), axis=1)])
+        counts = np.hstack([pad, np.cumsum(observed, axis=1)])
+        window_sums = sums[:, self.window : -1] - sums[:, : -self.window - 1]
+        window_counts = counts[:, self.window : -1] - counts[:, : -self.window - 1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return values[:, self.window :] - window_sums / window_counts
+
+    def _forecast(self, horizon):
+        # The one step residuals already include the error of the window mean.
+        yhat = np.repeat(self.mean_[:, np.newaxis], horizon, axis=1)
+        return yhat, np.repeat(self.sigma_[:, np.newaxis], horizon, axis=1)
+
+
+class DriftModel(BaselineModel):
+    """Extrapolate the line between the first and last observations."""
+
+    n_params = 1
+
+    def _fit_values(self, values):
+        observed = ~np.isnan(values)
+        first = observed.argmax(axis=1)
+        first_value = np.take_along_axis(values, first[:, np.newaxis], axis=1)[:, 0]
+        self.n_steps_ = values.shape[1] - 1 - first
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.slope_ = (self.last_ - first_value) / self.n_steps_
+
+    def _residuals(self, values):
+        return np.diff(values, axis=1) - self.slope_[:, np.newaxis]
+
+    def _forecast(self, horizon):
+        steps = np.arange(1, horizon + 1)
+        yhat = self.last_[:, np.newaxis] + self.slope_[:, np.newaxis] * steps
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = self.sigma_[:, np.newaxis] * np.sqrt(
+                steps * (1 + steps / self.n_steps_[:, np.newaxis])
+            )
+        return yhat, std
+
+
+def batch_forecast(
+    df: pd.DataFrame,
+    model: BaselineModel,
+    horizon: int,
+    series_col: str = SERIES_COL,
+    ds_col: str = DS_COL,
+    y_col: str = Y_COL,
+    freq: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Forecast many series at once with a baseline model.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Long format frame with one row per series and date.
+    model : BaselineModel
+        Model fitted on the whole panel at once.
+    horizon : int
+        Number of periods to forecast.
+    series_col : str, optional
+        Column identifying each series, by default SERIES_COL
+    ds_col : str, optional
+        Date column name, by default DS_COL
+    y_col : str, optional
+        Response column name, by default Y_COL
+    freq : str, optional
+        Frequency of the dates, inferred from the data if not given.
+
+    Returns
+    -------
+    pd.DataFrame
+        Long format forecast with the series, date, yhat, yhat_lower and
+        yhat_upper columns.
+    """
+    panel = df.pivot(index=series_col, columns=ds_col, values=y_col)
+    if freq is None:
+        freq = pd.infer_freq(panel.columns)
+        if freq is None:
+            raise ValueError("Could not infer the frequency, pass freq.")
+    future = pd.date_range(panel.columns[-1], periods=horizon + 1, freq=freq)[1:]
+
+    yhat, lower, upper = model.fit_panel(panel.to_numpy()).predict_panel(horizon)
+
+    return pd.DataFrame(
+        {
+            series_col: np.repeat(panel.index.values, horizon),
+            ds_col: np.tile(future.values, len(panel)),
+            YHAT_COL: yhat.ravel(),
+            YHAT_LOWER_COL: lower.ravel(),
+            YHAT_UPPER_COL: upper.ravel(),
+        }
+    )
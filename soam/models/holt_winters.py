@@ -0,0 +1,460 @@
+"""
+Panel Holt-Winters estimator.
+
+Additive and multiplicative exponential smoothing fitted for many aligned
+series at once. The smoothing recursions run in NumPy over the series axis and
+over a batch of candidate smoothing parameters, so the parameter search is a
+handful of vectorized passes instead of one optimizer per series:
+
+1. A shared Latin hypercube of candidates is evaluated for every series.
+2. Each series refines its best candidate with a pattern search, moving every
+   parameter up and down by a step that halves on each round.
+
+`SkHoltWinters` takes the same constructor and fit parameters as
+`soam.models.exponential.SkExponentialSmoothing` with the pinned statsmodels
+0.11, e.g. `damped` and `smoothing_slope`, so it can be swapped in. The names of
+later statsmodels versions, e.g. `damped_trend` and `smoothing_trend`, are
+accepted too.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from soam.constants import DS_COL, YHAT_COL
+from soam.models.base import SkWrapper
+
+# pylint: disable=attribute-defined-outside-init
+
+SMOOTHING_LEVEL = "smoothing_level"
+SMOOTHING_TREND = "smoothing_trend"
+SMOOTHING_SEASONAL = "smoothing_seasonal"
+DAMPING_TREND = "damping_trend"
+DEFAULT_BOUNDS = {
+    SMOOTHING_LEVEL: (1e-4, 1 - 1e-4),
+    SMOOTHING_TREND: (1e-4, 1 - 1e-4),
+    SMOOTHING_SEASONAL: (1e-4, 1 - 1e-4),
+    DAMPING_TREND: (0.8, 0.995),
+}
+INITIAL_LEVEL = "initial_level"
+INITIAL_TREND = "initial_trend"
+# statsmodels 0.11 fit parameter names and their current ones.
+_FIT_PARAM_ALIASES = {
+    "smoothing_slope": SMOOTHING_TREND,
+    "damping_slope": DAMPING_TREND,
+    "initial_slope": INITIAL_TREND,
+}
+# ExponentialSmoothing.fit options that only tune its optimizer.
+_OPTIMIZER_FIT_PARAMS = {"use_basinhopping", "use_brute", "start_params", "method"}
+ADDITIVE = "add"
+MULTIPLICATIVE = "mul"
+_COMPONENT_ALIASES = {
+    None: None,
+    "add": ADDITIVE,
+    "additive": ADDITIVE,
+    "mul": MULTIPLICATIVE,
+    "multiplicative": MULTIPLICATIVE,
+}
+
+
+class HoltWintersState(NamedTuple):
+    """Fitted parameters and final states, one row per series."""
+
+    params: Dict[str, np.ndarray]
+    level: np.ndarray
+    trend: Optional[np.ndarray]
+    season: Optional[np.ndarray]
+    sse: np.ndarray
+    n_obs: int
+
+
+def _component(value, name):
+    if isinstance(value, str):
+        value = value.lower()
+    if value not in _COMPONENT_ALIASES:
+        raise ValueError(f"{name} must be one of 'add', 'mul' or None, got {value}.")
+    return _COMPONENT_ALIASES[value]
+
+
+def _latin_hypercube(n_samples: int, n_dims: int, rng) -> np.ndarray:
+    """Stratified samples in the unit cube, one per row of each dimension."""
+    strata = np.argsort(rng.random((n_dims, n_samples)), axis=1).T
+    return (strata + rng.random((n_samples, n_dims))) / n_samples
+
+
+class SkHoltWinters(SkWrapper):
+    """NumPy Holt-Winters model that fits panels of series at once."""
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self,
+        endog=None,
+        trend: Optional[str] = None,
+        damped: bool = False,
+        seasonal: Optional[str] = None,
+        seasonal_periods: Optional[int] = None,
+        initialization_method: Optional[str] = None,
+        initial_level: Optional[float] = None,
+        initial_trend: Optional[float] = None,
+        initial_seasonal=None,
+        use_boxcox=None,
+        bounds: Optional[Dict[str, Tuple[float, float]]] = None,
+        dates=None,
+        freq=None,
+        missing: str = "none",
+        fit_params: Dict = None,
+        date_col: str = DS_COL,
+        n_candidates: int = 32,
+        n_refinements: int = 6,
+        random_state: int = 0,
+        damped_trend: bool = False,
+    ):
+        """Construct with the ExponentialSmoothing wrapper parameters.
+
+        Parameters
+        ----------
+        endog, dates, freq, missing :
+            Accepted for compatibility with SkExponentialSmoothing and ignored,
+            the data is passed to fit.
+        trend : str, optional
+            'add', 'mul' or None, by default None
+        damped : bool, optional
+            Whether to damp the trend, by default False
+        seasonal : str, optional
+            'add', 'mul' or None, by default None
+        seasonal_periods : int, optional
+            Number of periods in a season, required with seasonal.
+        initialization_method : str, optional
+            'known' uses the initial values given, any other value estimates the
+            initial states from the first seasons.
+        initial_level, initial_trend, initial_seasonal : optional
+            Initial states, used with initialization_method 'known'.
+        use_boxcox :
+            Box-Cox transforms are not supported, must be None or False.
+        bounds : dict, optional
+            (low, high) bounds of the smoothing parameters by name.
+        fit_params : Dict, optional
+            ExponentialSmoothing.fit parameters. Smoothing parameters given,
+            e.g. {'smoothing_level': 0.3, 'smoothing_slope': 0.1}, are fixed and
+            the rest are optimized. 'initial_level' and 'initial_slope' fix the
+            initial states. Options of the statsmodels optimizer are ignored and
+            unknown names raise a ValueError.
+        date_col : str, optional
+            date column, by default DS_COL
+        n_candidates : int, optional
+            Candidates evaluated for every series in the first pass, by default 32
+        n_refinements : int, optional
+            Pattern search rounds per series, by default 6
+        random_state : int, optional
+            Seed of the candidates sampling, by default 0
+        damped_trend : bool, optional
+            Name of damped in later statsmodels versions, by default False
+        """
+        self.endog = endog
+        self.trend = trend
+        self.damped = damped
+        self.seasonal = seasonal
+        self.seasonal_periods = seasonal_periods
+        self.initialization_method = initialization_method
+        self.initial_level = initial_level
+        self.initial_trend = initial_trend
+        self.initial_seasonal = initial_seasonal
+        self.use_boxcox = use_boxcox
+        self.bounds = bounds
+        self.dates = dates
+        self.freq = freq
+        self.missing = missing
+        self.fit_params = fit_params
+        self.date_col = date_col
+        self.n_candidates = n_candidates
+        self.n_refinements = n_refinements
+        self.random_state = random_state
+        self.damped_trend = damped_trend
+
+    @property
+    def _is_damped(self) -> bool:
+        return bool(self.damped or self.damped_trend)
+
+    def _fit_options(self):
+        """Fixed smoothing parameters and initial states from fit_params."""
+        fixed, initial = {}, {}
+        for name, value in (self.fit_params or {}).items():
+            name = _FIT_PARAM_ALIASES.get(name, name)
+            if name in DEFAULT_BOUNDS:
+                if value is not None:
+                    fixed[name] = value
+            elif name in (INITIAL_LEVEL, INITIAL_TREND):
+                if value is not None:
+                    initial[name] = value
+            elif name == "optimized":
+                continue
+            elif name in ("use_boxcox", "remove_bias"):
+                if value:
+                    raise ValueError(f"{name} is not supported.")
+            elif name not in _OPTIMIZER_FIT_PARAMS:
+                raise ValueError(f"Unknown fit parameter {name}.")
+        return fixed, initial
+
+    def _spec(self):
+        trend = _component(self.trend, "trend")
+        seasonal = _component(self.seasonal, "seasonal")
+        if self.use_boxcox:
+            raise ValueError("Box-Cox transforms are not supported.")
+        if seasonal is not None and not self.seasonal_periods:
+            raise ValueError("seasonal_periods is required with a seasonal component.")
+        if self._is_damped and trend is None:
+            raise ValueError("Can only dampen the trend component.")
+        names = [SMOOTHING_LEVEL]
+        if trend is not None:
+            names.append(SMOOTHING_TREND)
+        if seasonal is not None:
+            names.append(SMOOTHING_SEASONAL)
+        if self._is_damped:
+            names.append(DAMPING_TREND)
+        return trend, seasonal, names
+
+    def _initial_states(self, values: np.ndarray, trend, seasonal, initial=None):
+        """Heuristic initial level, trend and seasonal states of each series."""
+        n_series, n_obs = values.shape
+        # _spec guarantees seasonal_periods is set for seasonal models.
+        m: int = self.seasonal_periods or 1 if seasonal is not None else 1
+        if n_obs < 2 * m:
+            raise ValueError(f"At least {2 * m} observations are needed.")
+        first = values[:, :m].mean(axis=1)
+        second = values[:, m : 2 * m].mean(axis=1)
+        known = self.initialization_method == "known"
+        initial_level = self.initial_level if known else None
+        initial_trend = self.initial_trend if known else None
+        initial_level = (initial or {}).get(INITIAL_LEVEL, initial_level)
+        initial_trend = (initial or {}).get(INITIAL_TREND, initial_trend)
+
+        level = first
+        if initial_level is not None:
+            level = np.broadcast_to(np.asarray(initial_level, float), (n_series,))
+
+        slope = None
+        if trend == ADDITIVE:
+            slope = (second - first) / m
+        elif trend == MULTIPLICATIVE:
+            slope = (second / first) ** (1 / m)
+        if trend is not None and initial_trend is not None:
+            slope = np.broadcast_to(np.asarray(initial_trend, float), (n_series,))
+
+        # Seasonal states are relative to the initial level, as in statsmodels.
+        season = None
+        if seasonal == ADDITIVE:
+            season = values[:, :m] - level[:, np.newaxis]
+        elif seasonal == MULTIPLICATIVE:
+            season = values[:, :m] / level[:, np.newaxis]
+        if seasonal is not None and known and self.initial_seasonal is not None:
+            season = np.broadcast_to(
+                np.asarray(self.initial_seasonal, float), (n_series, m)
+            )
+        return level, slope, season
+
+    def _recursion(  # pylint: disable=too-many-locals
+        self, values, params, trend, seasonal, initial
+    ):
+        """
+        Run the smoothing recursions for every series and candidate.
+
+        `params` holds (n_series, n_candidates) arrays. Returns the sum of
+        squared one step errors and the final states.
+        """
+        alpha = params[SMOOTHING_LEVEL]
+        n_series, n_candidates = alpha.shape
+        beta = params.get(SMOOTHING_TREND)
+        gamma = params.get(SMOOTHING_SEASONAL)
+        phi = params.get(DAMPING_TREND, 1.0)
+
+        level0, slope0, season0 = initial
+        level = np.repeat(level0[:, np.newaxis], n_candidates, axis=1)
+        slope = None
+        if trend is not None:
+            slope = np.repeat(slope0[:, np.newaxis], n_candidates, axis=1)
+        season = None
+        if seasonal is not None:
+            season = np.repeat(season0[:, np.newaxis, :], n_candidates, axis=1)
+            period = season.shape[-1]
+        sse = np.zeros((n_series, n_candidates))
+
+        with np.errstate(all="ignore"):
+            for t in range(values.shape[1]):
+                y = values[:, t, np.newaxis]
+                if trend == ADDITIVE:
+                    base = level + phi * slope
+                elif trend == MULTIPLICATIVE:
+                    base = level * slope ** phi
+                else:
+                    base = level
+
+                if seasonal == ADDITIVE:
+                    s = season[:, :, t % period]
+                    error = y - (base + s)
+                    deseasoned = y - s
+                elif seasonal == MULTIPLICATIVE:
+                    s = season[:, :, t % period]
+                    error = y - base * s
+                    deseasoned = y / s
+                else:
+                    error = y - base
+                    deseasoned = y
+                sse += error * error
+
+                new_level = alpha * deseasoned + (1 - alpha) * base
+                if trend == ADDITIVE:
+                    slope = beta * (new_level - level) + (1 - beta) * phi * slope
+                elif trend == MULTIPLICATIVE:
+                    slope = beta * (new_level / level) + (1 - beta) * slope ** phi
+                if seasonal == ADDITIVE:
+                    season[:, :, t % period] = gamma * (y - base) + (1 - gamma) * s
+                elif seasonal == MULTIPLICATIVE:
+                    season[:, :, t % period] = gamma * (y / base) + (1 - gamma) * s
+                level = new_level
+
+        sse = np.where(np.isfinite(sse), sse, np.inf)
+        return sse, level, slope, season
+
+    def _evaluate(self, values, unit, names, fixed, bounds, spec, initial):
+        """SSE of (n_series, n_candidates, n_params) candidates in the unit cube."""
+        trend, seasonal, _ = spec
+        params = {}
+        for i, name in enumerate(names):
+            low, high = bounds[name]
+            params[name] = low + unit[..., i] * (high - low)
+        for name, value in fixed.items():
+            params[name] = np.full(unit.shape[:2], float(value))
+        return self._recursion(values, params, trend, seasonal, initial)
+
+    def fit_panel(self, values: np.ndarray) -> "SkHoltWinters":
+        """
+        Fit one model per row of a panel.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Panel of aligned series with shape (n_series, n_time) and no NaN.
+
+        Returns
+        -------
+        SkHoltWinters
+            The fitted model.
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        if not np.isfinite(values).all():
+            raise ValueError("Series must not contain NaN or infinite values.")
+        trend, seasonal, all_names = spec = self._spec()
+        if MULTIPLICATIVE in (trend, seasonal) and (values <= 0).any():
+            raise ValueError("Multiplicative components need strictly positive data.")
+        bounds = {**DEFAULT_BOUNDS, **(self.bounds or {})}
+        fixed, initial_states = self._fit_options()
+        # Parameters of components the model lacks are ignored, as in statsmodels.
+        fixed = {name: value for name, value in fixed.items() if name in all_names}
+        names = [name for name in all_names if name not in fixed]
+        if names and not (self.fit_params or {}).get("optimized", True):
+            raise ValueError(f"optimized=False needs fixed values of {names}.")
+        initial = self._initial_states(values, trend, seasonal, initial_states)
+        n_series = values.shape[0]
+
+        if names:
+            rng = np.random.default_rng(self.random_state)
+            candidates = _latin_hypercube(self.n_candidates, len(names), rng)
+            unit = np.broadcast_to(candidates, (n_series,) + candidates.shape)
+            sse, *_ = self._evaluate(values, unit, names, fixed, bounds, spec, initial)
+            best = sse.argmin(axis=1)
+            best_unit = candidates[best]
+            best_sse = sse[np.arange(n_series), best]
+
+            # Pattern search: try moving each parameter up and down by step.
+            moves = np.concatenate([np.eye(len(names)), -np.eye(len(names))])
+            step = 0.5 / self.n_candidates ** (1 / len(names))
+            for _ in range(self.n_refinements):
+                neighbours = np.clip(
+                    best_unit[:, np.newaxis, :] + step * moves[np.newaxis], 0, 1
+                )
+                sse, *_ = self._evaluate(
+                    values, neighbours, names, fixed, bounds, spec, initial
+                )
+                candidate = sse.argmin(axis=1)
+                candidate_sse = sse[np.arange(n_series), candidate]
+                improved = candidate_sse < best_sse
+                best_unit[improved] = neighbours[improved, candidate[improved]]
+                best_sse[improved] = candidate_sse[improved]
+                step /= 2
+        else:
+            best_unit = np.zeros((n_series, 0))
+
+        unit = best_unit[:, np.newaxis, :]
+        sse, level, slope, season = self._evaluate(
+            values, unit, names, fixed, bounds, spec, initial
+        )
+        params = {}
+        for i, name in enumerate(names):
+            low, high = bounds[name]
+            params[name] = low + best_unit[:, i] * (high - low)
+        params.update({name: np.full(n_series, float(v)) for name, v in fixed.items()})
+        self.state_ = HoltWintersState(
+            params=params,
+            level=level[:, 0],
+            trend=None if slope is None else slope[:, 0],
+            season=None if season is None else season[:, 0, :],
+            sse=sse[:, 0],
+            n_obs=values.shape[1],
+        )
+        return self
+
+    def predict_panel(self, horizon: int) -> np.ndarray:
+        """
+        Forecast every series of the fitted panel.
+
+        Parameters
+        ----------
+        horizon : int
+            Number of steps to forecast.
+
+        Returns
+        -------
+        np.ndarray
+            Forecasts with shape (n_series, horizon).
+        """
+        trend, seasonal, _ = self._spec()
+        state = self.state_
+        steps = np.arange(1, horizon + 1)
+        if self._is_damped:
+            phi = state.params[DAMPING_TREND][:, np.newaxis]
+            trend_steps = np.cumsum(phi ** steps, axis=1)
+        else:
+            trend_steps = np.broadcast_to(steps, (len(state.level), horizon))
+
+        level = state.level[:, np.newaxis]
+        if state.trend is None:
+            yhat = np.repeat(level, horizon, axis=1)
+        elif trend == ADDITIVE:
+            yhat = level + trend_steps * state.trend[:, np.newaxis]
+        else:
+            yhat = level * state.trend[:, np.newaxis] ** trend_steps
+
+        if state.season is not None:
+            period = state.season.shape[1]
+            season = state.season[:, (state.n_obs + steps - 1) % period]
+            yhat = yhat + season if seasonal == ADDITIVE else yhat * season
+        return yhat
+
+    def fit(self, X: pd.DataFrame, y: pd.Series):  # pylint: disable=unused-argument
+        """Fit estimator to data."""
+        return self.fit_panel(np.asarray(y, dtype=np.float64)[np.newaxis, :])
+
+    def predict(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Scikit learn's predict."""
+        predictions = pd.DataFrame()
+        predictions[self.date_col] = X[self.date_col].values
+        predictions[YHAT_COL] = self.predict_panel(len(X))[0]
+        return predictions
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Scikit learn's transform."""
+        return self.predict(X)
+
+    def fit_transform(self, X: pd.DataFrame, y: pd.Series, output_length: int = 1):
+        """Scikit learn's fit_transform with output_length."""
+        self.fit(X[:-output_length], y[:-output_length])
+        return self.transform(X[-output_length:])
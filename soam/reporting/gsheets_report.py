@@ -4,17 +4,400 @@ Google Sheets report generation
 GSheets report creator and sender. Its a postprocess that creates a GSheets report with
 the model forecasts.
 """
+from collections import OrderedDict
 import logging
 from pathlib import Path
-from typing import Mapping
+import threading
+import time
+import weakref
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import a1_to_rowcol, absolute_range_name, rowcol_to_a1
+from gspread_pandas import Client
 from muttlib.gsheetsconn import GSheetsClient
+import numpy as np
 import pandas as pd
 
 from soam.core import Step
 
 logger = logging.getLogger(__name__)
 
+# Sheets API rejects requests above ~10MB; this keeps payloads well below it.
+DEFAULT_MAX_CELLS_PER_REQUEST = 50_000
+RETRYABLE_STATUS = (429, 500, 503)
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+
+_CLIENTS: Dict[Tuple, Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+_SEND_LOCKS: "weakref.WeakKeyDictionary[Any, threading.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _cached_client(key: Tuple, factory: Callable[[], Any]):
+    """Build the client for `key` once and share it across tasks."""
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = factory()
+        return _CLIENTS[key]
+
+
+def get_gsheets_client(config_json_path, **gsheets_kwargs) -> GSheetsClient:
+    """Return the muttlib GSheetsClient shared by every task using this config."""
+    config_path = Path(config_json_path).resolve()
+    key = ("muttlib", str(config_path), tuple(sorted(gsheets_kwargs.items())))
+    return _cached_client(key, lambda: GSheetsClient(config_path, **gsheets_kwargs))
+
+
+def get_gspread_client(config_json_path, **gsheets_kwargs) -> Client:
+    """
+    Return the gspread client shared by every writer using this config.
+
+    It is authorized with the credentials of the muttlib client built from the
+    same config and `gsheets_kwargs` (user, auth_scope, auth_creds), so chunked
+    and direct writes act on behalf of the same account.
+    """
+    config_path = Path(config_json_path).resolve()
+    key = ("gspread", str(config_path), tuple(sorted(gsheets_kwargs.items())))
+    gsheets_client = get_gsheets_client(config_path, **gsheets_kwargs)
+    return _cached_client(
+        key,
+        # pylint: disable=protected-access
+        lambda: Client(creds=gsheets_client._get_auth()),
+    )
+
+
+def _send_lock(client) -> threading.Lock:
+    """Lock serializing the writers sending through a shared client."""
+    with _CLIENTS_LOCK:
+        return _SEND_LOCKS.setdefault(client, threading.Lock())
+
+
+def clear_client_cache():
+    """Drop every shared client, e.g. after rotating credentials."""
+    with _CLIENTS_LOCK:
+        _CLIENTS.clear()
+
+
+def _is_retryable(error: APIError) -> bool:
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status in RETRYABLE_STATUS
+
+
+def call_with_backoff(
+    func: Callable,
+    *args,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+    **kwargs,
+):
+    """Call `func` retrying with exponential backoff on quota and transient errors."""
+    for attempt in range(max_retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except APIError as error:
+            if attempt == max_retries or not _is_retryable(error):
+                raise
+            wait = backoff * 2 ** attempt
+            logger.warning(
+                f"Sheets API quota or transient error, retrying in {wait:.1f}s."
+            )
+            time.sleep(wait)
+    return None  # pragma: no cover
+
+
+def _frame_to_values(
+    df: pd.DataFrame, headers: bool = True, fill_value: Any = ""
+) -> List[List]:
+    """Convert a DataFrame into the JSON serializable rows the values API expects."""
+    values = df.astype(object).where(df.notna(), fill_value)
+    for col, dtype in df.dtypes.items():
+        if np.issubdtype(dtype, np.datetime64):
+            values[col] = values[col].map(str)
+    rows = values.values.tolist()
+    if headers:
+        rows.insert(0, [str(col) for col in df.columns])
+    return rows
+
+
+class _Write(NamedTuple):
+    sheet: Union[str, int, None]
+    row: int
+    col: int
+    rows: List[List]
+    replace: bool
+    freeze_headers: bool
+
+
+def insert_kwargs_to_add_kwargs(
+    index: bool = False,
+    header: bool = True,
+    first_cell_loc: Union[str, Tuple[int, int]] = "A1",
+    worksheet: Union[str, int, None] = None,
+    preclean_sheet: bool = True,
+    null_fill_value: Any = "",
+    freeze_headers: bool = True,
+    **df_to_sheet_kwargs,
+) -> Dict[str, Any]:
+    """
+    Translate muttlib `GSheetsClient.insert_from_frame` args, with its defaults,
+    into `GSheetsBatchWriter.add` args.
+
+    Returns
+    -------
+    dict
+        Keyword arguments of GSheetsBatchWriter.add.
+
+    Raises
+    ------
+    ValueError
+        If extra gspread_pandas `Spread.df_to_sheet` args are passed, the writer
+        can't honor them.
+    """
+    if df_to_sheet_kwargs:
+        raise ValueError(
+            "GSheetsBatchWriter does not support the df_to_sheet args "
+            f"{sorted(df_to_sheet_kwargs)}."
+        )
+    if isinstance(first_cell_loc, str):
+        first_cell_loc = a1_to_rowcol(first_cell_loc)
+    return {
+        "sheet": worksheet,
+        "start": tuple(first_cell_loc),
+        "headers": header,
+        "index": index,
+        "fill_value": null_fill_value,
+        "replace": preclean_sheet,
+        "freeze_headers": freeze_headers,
+    }
+
+
+# insert_from_frame args GSheetsBatchWriter can honor.
+INSERT_FROM_FRAME_ARGS = (
+    "index",
+    "header",
+    "first_cell_loc",
+    "worksheet",
+    "preclean_sheet",
+    "null_fill_value",
+    "freeze_headers",
+)
+
+
+class GSheetsBatchWriter:
+    """
+    Collect writes from many tasks and send them as size-bounded batchUpdates.
+
+    Writes are grouped per spreadsheet, so several frames headed to the same
+    spreadsheet are sent together in as few `values_batch_update` calls as the
+    payload limit allows. Frames larger than the limit are split by rows.
+    Missing worksheets are created and replaced worksheets are cleared once per
+    flush, before any of their writes. Writers can be shared among threads, the
+    flushes of every writer using the same client are sent one at a time.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_cells_per_request: int = DEFAULT_MAX_CELLS_PER_REQUEST,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+    ):
+        """
+        Parameters
+        ----------
+        client:
+            gspread compatible client, see `get_gspread_client`.
+        max_cells_per_request: int
+            Maximum number of cells sent in a single batchUpdate.
+        max_retries: int
+            Retries on quota (429) and transient (5xx) errors.
+        backoff: float
+            Seconds to wait before the first retry, doubled on each retry.
+        """
+        if max_cells_per_request < 1:
+            raise ValueError("max_cells_per_request must be positive.")
+        self.client = client
+        self.max_cells_per_request = max_cells_per_request
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._pending: "OrderedDict[str, List[_Write]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._send_lock = _send_lock(client)
+
+    @property
+    def pending_cells(self) -> int:
+        with self._lock:
+            return sum(
+                len(write.rows) * max(len(write.rows[0]), 1) if write.rows else 0
+                for writes in self._pending.values()
+                for write in writes
+            )
+
+    def add(
+        self,
+        df: pd.DataFrame,
+        spreadsheet: str,
+        sheet: Union[str, int, None] = None,
+        start: Tuple[int, int] = (1, 1),
+        headers: bool = True,
+        index: bool = False,
+        fill_value: Any = "",
+        replace: bool = False,
+        freeze_headers: bool = False,
+    ):
+        """
+        Queue df to be written to a spreadsheet on the next flush.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            Data to write.
+        spreadsheet: str
+            Spreadsheet id or name as in Drive.
+        sheet: str or int, optional
+            Worksheet title, created if missing, or index, by default the first
+            one.
+        start: tuple of int
+            1-based (row, col) of the top left cell.
+        headers: bool
+            Whether to write the column names on the first row.
+        index: bool
+            Whether to write the index as the first columns.
+        fill_value: object
+            Value written in place of nulls.
+        replace: bool
+            Whether to clear the worksheet before writing.
+        freeze_headers: bool
+            Whether to freeze the rows up to the headers.
+        """
+        if index:
+            df = df.reset_index()
+        rows = _frame_to_values(df, headers=headers, fill_value=fill_value)
+        if not rows and not replace:
+            return
+        write = _Write(sheet, start[0], start[1], rows, replace, freeze_headers)
+        with self._lock:
+            self._pending.setdefault(spreadsheet, []).append(write)
+
+    def _value_ranges(self, writes) -> List[List[Dict]]:
+        """Split the queued writes into payloads bounded by max_cells_per_request."""
+        payloads: List[List[Dict]] = [[]]
+        cells = 0
+        for sheet, row, col, rows in writes:
+            if not rows:
+                continue
+            width = max(len(rows[0]), 1)
+            step = max(self.max_cells_per_request // width, 1)
+            for offset in range(0, len(rows), step):
+                chunk = rows[offset : offset + step]
+                size = len(chunk) * width
+                if payloads[-1] and cells + size > self.max_cells_per_request:
+                    payloads.append([])
+                    cells = 0
+                payloads[-1].append(
+                    {
+                        "range": absolute_range_name(
+                            sheet, rowcol_to_a1(row + offset, col)
+                        ),
+                        "values": chunk,
+                    }
+                )
+                cells += size
+        return payloads
+
+    def _open(self, spreadsheet: str):
+        """Open a spreadsheet by id or name, creating it if missing as muttlib does."""
+        try:
+            return self.client.open_by_key(spreadsheet)
+        except APIError:
+            pass
+        try:
+            return self.client.open(spreadsheet)
+        except SpreadsheetNotFound:
+            logger.info(f"Creating spreadsheet '{spreadsheet}'.")
+            return self.client.create(spreadsheet)
+
+    def _prepare_sheets(
+        self, spread, writes: List[_Write]
+    ) -> List[Tuple[str, int, int, List[List]]]:
+        """Create, clear and freeze the worksheets of the writes of a spreadsheet."""
+        worksheets: Dict[Union[str, int, None], Any] = {}
+        resolved: List[Tuple[str, int, int, List[List]]] = []
+        for write in writes:
+            if write.sheet not in worksheets:
+                if write.sheet is None or isinstance(write.sheet, int):
+                    worksheet = spread.get_worksheet(write.sheet or 0)
+                else:
+                    try:
+                        worksheet = spread.worksheet(write.sheet)
+                    except WorksheetNotFound:
+                        width = len(write.rows[0]) if write.rows else 0
+                        worksheet = spread.add_worksheet(
+                            write.sheet,
+                            rows=max(write.row + len(write.rows) - 1, 1000),
+                            cols=max(write.col + width - 1, 26),
+                        )
+                if any(w.replace for w in writes if w.sheet == write.sheet):
+                    call_with_backoff(
+                        worksheet.clear,
+                        max_retries=self.max_retries,
+                        backoff=self.backoff,
+                    )
+                worksheets[write.sheet] = worksheet
+            worksheet = worksheets[write.sheet]
+            if write.freeze_headers and write.rows:
+                call_with_backoff(
+                    worksheet.freeze,
+                    rows=write.row,
+                    max_retries=self.max_retries,
+                    backoff=self.backoff,
+                )
+            resolved.append((worksheet.title, write.row, write.col, write.rows))
+        return resolved
+
+    def flush(self) -> List[Dict]:
+        """
+        Send every queued write.
+
+        Returns
+        -------
+        list of dict
+            The responses of each batchUpdate call.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+        with self._send_lock:
+            return self._send(pending)
+
+    def _send(self, pending: "OrderedDict[str, List[_Write]]") -> List[Dict]:
+        responses = []
+        for spreadsheet, writes in pending.items():
+            spread = self._open(spreadsheet)
+            for data in self._value_ranges(self._prepare_sheets(spread, writes)):
+                body = {"valueInputOption": "USER_ENTERED", "data": data}
+                responses.append(
+                    call_with_backoff(
+                        spread.values_batch_update,
+                        body,
+                        max_retries=self.max_retries,
+                        backoff=self.backoff,
+                    )
+                )
+        return responses
+
 
 class GSheetsReportTask(Step):
     """
@@ -22,7 +405,12 @@ class GSheetsReportTask(Step):
     """
 
     def __init__(
-        self, config_json_path: str, gsheets_kwargs: Mapping = None, **kwargs
+        self,
+        config_json_path: str,
+        gsheets_kwargs: Mapping = None,
+        writer: Optional[GSheetsBatchWriter] = None,
+        max_cells_per_request: int = DEFAULT_MAX_CELLS_PER_REQUEST,
+        **kwargs,
     ):  # pylint: disable=dangerous-default-value
         """
         Parameters
@@ -31,6 +419,11 @@ class GSheetsReportTask(Step):
             Path to GSheets config json
         gsheets_kwargs: dict
             Extra args to pass to muttlib.gsheetsconn.GSheetsClient
+        writer: GSheetsBatchWriter, optional
+            Shared writer to queue frames in instead of writing them right away,
+            call its `flush` once all the tasks ran.
+        max_cells_per_request: int
+            Frames with more cells than this are written in chunks.
         kwargs:
             Extra args to pass to soam.core.Step
         """
@@ -40,7 +433,11 @@ class GSheetsReportTask(Step):
             raise ValueError("Config path does not point to a file.")
         if not gsheets_kwargs:
             gsheets_kwargs = {}
-        self.client = GSheetsClient(config_path, **gsheets_kwargs)
+        self.config_json_path = config_json_path
+        self.gsheets_kwargs = gsheets_kwargs
+        self.writer = writer
+        self.max_cells_per_request = max_cells_per_request
+        self.client = get_gsheets_client(config_path, **gsheets_kwargs)
 
     def run(self, df: pd.DataFrame, spreadsheet: str, **insert_kwargs):  # type: ignore[override]
         """
@@ -53,7 +450,13 @@ class GSheetsReportTask(Step):
         spreadsheet: str
             Spreadsheet id or name as in Drive.
         kwargs:
-            Extra args to pass to muttlib.gsheetsconn.GSheetsClient.insert_from_frame
+            Extra args to pass to muttlib.gsheetsconn.GSheetsClient.insert_from_frame,
+            `index`, `header`, `first_cell_loc`, `worksheet`, `preclean_sheet`,
+            `null_fill_value` and `freeze_headers`, and the extra args it passes on
+            to gspread_pandas `Spread.df_to_sheet`. They are translated, with the
+            same defaults, for GSheetsBatchWriter.add when the frame is queued in
+            the writer or written in chunks. Frames with extra df_to_sheet args
+            are never chunked.
 
         Returns
         -------
@@ -64,4 +467,18 @@ class GSheetsReportTask(Step):
         if df.empty:
             logger.warning("Exporting empty DataFrame")
 
-        return self.client.insert_from_frame(df, spreadsheet, **insert_kwargs)
+        if self.writer is None and (
+            df.size <= self.max_cells_per_request
+            or set(insert_kwargs) - set(INSERT_FROM_FRAME_ARGS)
+        ):
+            return self.client.insert_from_frame(df, spreadsheet, **insert_kwargs)
+
+        add_kwargs = insert_kwargs_to_add_kwargs(**insert_kwargs)
+        if self.writer is not None:
+            return self.writer.add(df, spreadsheet, **add_kwargs)
+        writer = GSheetsBatchWriter(
+            get_gspread_client(self.config_json_path, **self.gsheets_kwargs),
+            max_cells_per_request=self.max_cells_per_request,
+        )
+        writer.add(df, spreadsheet, **add_kwargs)
+        return writer.flush()
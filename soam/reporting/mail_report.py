@@ -12,18 +12,127 @@ import logging
 from os.path import basename
 from pathlib import Path
 import smtplib
-from typing import List, Optional, Tuple, Union
+import threading
+from typing import List, Mapping, Optional, Tuple, Union
 
 from soam.cfg import MAIL_TEMPLATE, get_smtp_cred
 from soam.constants import PROJECT_NAME
 from soam.core.step import Step
 
 DEFAULT_SUBJECT = "[{end_date}]Forecast report for {metric_name}"
+DEFAULT_DIGEST_SUBJECT = "[{end_date}]Forecast report for {n_metrics} metrics"
 DEFAULT_SIGNATURE = PROJECT_NAME
+DIGEST_METRIC_NAME = "digest"
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
 
 logger = logging.getLogger(__name__)
 
 
+class SMTPSession:
+    """
+    Authenticated SMTP connection reused to send many messages.
+
+    The connection is opened lazily and kept open until `close` is called,
+    if the server drops it the session reconnects and retries the message.
+    Sessions can be shared among threads, messages are sent one at a time.
+    """
+
+    def __init__(self, smtp_credentials: dict, max_retries: int = 2):
+        """
+        Create SMTPSession object.
+
+        Parameters
+        ----------
+        smtp_credentials : dict
+            Credentials for the SMTP service, as returned by get_smtp_cred.
+        max_retries : int, optional
+            Reconnections allowed per message on transient failures, by default 2.
+        """
+        self.credentials = smtp_credentials
+        self.max_retries = max_retries
+        self.server: Optional[smtplib.SMTP] = None
+        self._lock = threading.RLock()
+
+    def connect(self) -> smtplib.SMTP:
+        """Open and authenticate the connection if it is not open."""
+        with self._lock:
+            return self._connect()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.server is None:
+            user = self.credentials.get("user_address")
+            password = self.credentials.get("password")
+            host = self.credentials["host"]
+            port = self.credentials["port"]
+            logger.info(f"Opening SMTP connection to host: {host} and port: {port}")
+            server = smtplib.SMTP(host, port)
+            try:
+                server.ehlo()
+                if user is not None and password is not None:
+                    server.starttls()
+                    server.ehlo()
+                    server.login(user, password)
+            except Exception:
+                # Don't leak the socket of a connection that can't be used.
+                server.close()
+                raise
+            self.server = server
+        return self.server
+
+    def close(self):
+        """Close the connection."""
+        with self._lock:
+            if self.server is not None:
+                try:
+                    self.server.quit()
+                except TRANSIENT_ERRORS:
+                    self.server.close()
+                self.server = None
+
+    def send(self, from_address: str, mail_recipients: List[str], msg: MIMEMultipart):
+        """
+        Send a message, reconnecting on transient failures.
+
+        Parameters
+        ----------
+        from_address : str
+            Sender of the message.
+        mail_recipients : list of str
+            The mails of the recipients for the message.
+        msg : email.mime.multipart.MIMEMultipart
+            The message to be sent.
+        """
+        message = msg.as_string()
+        with self._lock:
+            self._send(from_address, mail_recipients, message)
+
+    def _send(self, from_address: str, mail_recipients: List[str], message: str):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._connect().sendmail(from_address, mail_recipients, message)
+                return
+            except TRANSIENT_ERRORS as err:
+                # The connection is broken, close its socket without QUIT.
+                if self.server is not None:
+                    self.server.close()
+                    self.server = None
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"SMTP connection lost, reconnecting: {err}")
+            except smtplib.SMTPResponseException as err:
+                if not 400 <= err.smtp_code < 500 or attempt == self.max_retries:
+                    raise
+                logger.warning(f"Transient SMTP error, retrying: {err}")
+                self.close()
+
+    def __enter__(self) -> "SMTPSession":
+        self.connect()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
 class MailReport:
     """
     Builds and sends reports via mail.
@@ -34,6 +143,7 @@ class MailReport:
         mail_recipients_list: List[str],
         metric_name: str,
         setting_path: Optional[str] = None,
+        smtp_session: Optional[SMTPSession] = None,
     ):
         """
         Create MailReport object.
@@ -46,11 +156,15 @@ class MailReport:
             Name of the metric being forecasted.
         setting_path : str, optional
             The path for the .ini document with the settings.
+        smtp_session : SMTPSession, optional
+            Session shared among reports to send the mails through a single
+            connection, by default a new connection is opened per mail.
         """
         self.mail_recipients_list = mail_recipients_list
         credentials = get_smtp_cred(setting_path)
         self.credentials = credentials
         self.metric_name = metric_name
+        self.smtp_session = smtp_session
 
     def send(
         self,
@@ -89,6 +203,50 @@ class MailReport:
             [],
         )
 
+    def send_digest(
+        self,
+        current_date: str,
+        plot_filenames: Mapping[str, Union[Path, str]],
+        subject: str = DEFAULT_DIGEST_SUBJECT,
+        signature: str = DEFAULT_SIGNATURE,
+    ):
+        """
+        Send a single email with the plots of many metrics.
+
+        Parameters
+        ----------
+        current_date : str
+            Date when the report will be sent.
+        plot_filenames : mapping of str to str or pathlib.Path
+             Path of the forecast plot to send for each metric name.
+        subject : str
+            Subject of the email.
+        signature : str
+            Signature for the email.
+        """
+        logger.info(
+            f"Sending digest of {len(plot_filenames)} metrics to: {self.mail_recipients_list}"
+        )
+        mime_imgs, metrics_imgs = [], []
+        for metric_name, plot_filename in plot_filenames.items():
+            mime_img, mime_img_name = self._get_mime_images(Path(plot_filename))
+            mime_imgs.append(mime_img)
+            metrics_imgs.append((metric_name, mime_img_name))
+
+        if subject == DEFAULT_DIGEST_SUBJECT:
+            subject = subject.format(end_date=current_date, n_metrics=len(metrics_imgs))
+        msg_body = getattr(MAIL_TEMPLATE, "digest_body")(
+            signature=signature, end_date=current_date, metrics_imgs=metrics_imgs
+        )
+        self._send_mail(
+            self.credentials,
+            self.mail_recipients_list,
+            subject,
+            msg_body,
+            mime_imgs,
+            [],
+        )
+
     def _send_mail(
         self,
         smtp_credentials: dict,
@@ -118,8 +276,6 @@ class MailReport:
         attachments : list of str
             List of files to attach in the email.
         """
-        user = smtp_credentials.get("user_address")
-        password = smtp_credentials.get("password")
         from_address = smtp_credentials["mail_from"]
         host = smtp_credentials["host"]
         port = smtp_credentials["port"]
@@ -154,13 +310,11 @@ class MailReport:
             )
             msg_root.attach(part)
 
-        with smtplib.SMTP(host, port) as server:
-            server.ehlo()
-            if user is not None and password is not None:
-                server.starttls()
-                server.ehlo()
-                server.login(user, password)
-            server.sendmail(from_address, mail_recipients, msg_root.as_string())
+        if self.smtp_session is not None:
+            self.smtp_session.send(from_address, mail_recipients, msg_root)
+        else:
+            with SMTPSession(smtp_credentials) as session:
+                session.send(from_address, mail_recipients, msg_root)
         logger.info("Email sent succesfully")
 
     def _build_subject_n_msg_body(
@@ -248,7 +402,13 @@ class MailReportTask(Step, MailReport):
     Builds the task that sends reports via mail.
     """
 
-    def __init__(self, mail_recipients_list: List[str], metric_name: str, **kwargs):
+    def __init__(
+        self,
+        mail_recipients_list: List[str],
+        metric_name: str,
+        smtp_session: Optional[SMTPSession] = None,
+        **kwargs,
+    ):
         """
         Initialization of the Mail Report Task.
 
@@ -258,9 +418,14 @@ class MailReportTask(Step, MailReport):
             List of the recipients of the email to be sent.
         metric_name: str
             Name of the performance metric being measured.
+        smtp_session: SMTPSession, optional
+            Session shared among tasks to send the mails through a single
+            connection.
         """
         Step.__init__(self, **kwargs)  # type: ignore
-        MailReport.__init__(self, mail_recipients_list, metric_name)
+        MailReport.__init__(
+            self, mail_recipients_list, metric_name, smtp_session=smtp_session
+        )
 
     def run(  # type: ignore
         self,
@@ -288,3 +453,58 @@ class MailReportTask(Step, MailReport):
             Sends the report via email.
         """
         return self.send(current_date, plot_filename, subject, signature)
+
+
+class MailDigestReportTask(Step, MailReport):
+    """
+    Builds the task that sends the plots of many metrics in a single mail.
+    """
+
+    def __init__(
+        self,
+        mail_recipients_list: List[str],
+        smtp_session: Optional[SMTPSession] = None,
+        **kwargs,
+    ):
+        """
+        Initialization of the Mail Digest Report Task.
+
+        Parameters
+        ----------
+        mail_recipients_list: List[str]
+            List of the recipients of the email to be sent.
+        smtp_session: SMTPSession, optional
+            Session shared among tasks to send the mails through a single
+            connection.
+        """
+        Step.__init__(self, **kwargs)  # type: ignore
+        MailReport.__init__(
+            self, mail_recipients_list, DIGEST_METRIC_NAME, smtp_session=smtp_session
+        )
+
+    def run(  # type: ignore
+        self,
+        current_date: str,
+        plot_filenames: Mapping[str, Union[Path, str]],
+        subject: str = DEFAULT_DIGEST_SUBJECT,
+        signature: str = DEFAULT_SIGNATURE,
+    ):
+        """
+        Run the Mail Digest Report Task.
+
+        Parameters
+        ----------
+        current_date: str,
+            Current datetime as string.
+        plot_filenames: Mapping[str, Union[Path, str]],
+            The path and filename of the plot of each metric.
+        subject: str = DEFAULT_DIGEST_SUBJECT,
+            The subject for the email.
+        signature: str = DEFAULT_SIGNATURE,
+            Signature for the email.
+        Returns
+        -------
+        Mail Digest Report Task
+            Sends the digest via email.
+        """
+        return self.send_digest(current_date, plot_filenames, subject, signature)
@@ -4,10 +4,15 @@ PDF Report Generator
 PDF report creator. Its a postprocess that generates a PDF report with
 the model forecasts.
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import hashlib
 import logging
 from pathlib import Path
-from typing import Dict
+import threading
+import time
+from typing import Dict, List, NamedTuple, Sequence, Tuple
 
 import jupytext
 from nbconvert import PDFExporter
@@ -18,6 +23,14 @@ from pkg_resources import resource_filename
 from soam.core import Step
 
 logger = logging.getLogger(__name__)
+_thread_local = threading.local()
+
+
+class PDFReportResult(NamedTuple):
+    """Generated PDF path and the seconds spent on each stage."""
+
+    pdf_path: str
+    timings: Dict[str, float]
 
 
 class PDFReport:
@@ -25,6 +38,9 @@ class PDFReport:
     Generate PDF Report object from IPython Notebook.
     """
 
+    _converted_notebooks: Dict[Tuple[Path, Path], Tuple[str, Path]] = {}
+    _converted_notebooks_lock = threading.Lock()
+
     def __init__(self, base_path: str):
         """
         Initialization of the PDF Report object.
@@ -52,45 +68,121 @@ class PDFReport:
         path
             Generated PDF Path
         """
-        report_file = Path(nb_path)
+        report_file = self._check_report_file(nb_path)
+        return self._export(report_file, nb_params).pdf_path
+
+    def export_notebooks_to_pdf(
+        self, nb_path: str, nb_params_list: Sequence[Dict], max_workers: int = 4,
+    ) -> List[PDFReportResult]:
+        """
+        Run a notebook with many parameter sets concurrently and convert them to PDF.
 
+        The notebook is converted once and reused by every run, executions and
+        PDF conversions are distributed over a bounded thread pool.
+
+        Parameters
+        ----------
+        nb_path : str
+            Path of the Notebook or Script to Execute .ipynb / .py
+        nb_params_list : sequence of Dict
+            Parameters to run the notebook with (Papermill), one per report.
+        max_workers : int, optional
+            Maximum number of reports generated at once, by default 4.
+
+        Returns
+        -------
+        list of PDFReportResult
+            Generated PDF path and timings of each report, in the given order.
+        """
+        report_file = self._check_report_file(nb_path)
+        # convert once before spreading the work
+        self._get_converted_notebook(report_file)
+        with ThreadPoolExecutor(
+            max_workers=max_workers, initializer=_set_thread_event_loop
+        ) as executor:
+            futures = [
+                executor.submit(self._export, report_file, dict(nb_params), suffix)
+                for suffix, nb_params in enumerate(nb_params_list)
+            ]
+            return [future.result() for future in futures]
+
+    def _check_report_file(self, nb_path: str) -> Path:
+        """Check the notebook path points to a file."""
+        report_file = Path(nb_path)
         if not report_file.is_file():
             raise ValueError("Notebook path does not point to a file.")
-
+        return report_file
+
+    def _export(
+        self, report_file: Path, nb_params: Dict, suffix=None
+    ) -> PDFReportResult:
+        """Execute the converted notebook and export it to PDF."""
+        timings = {}
+        start = time.perf_counter()
         nb_params = self._parse_params(nb_params)
 
-        report_filename, report_extension = report_file.stem, report_file.suffix
-
-        if report_extension != "ipynb":
-            report_nb = self.base_path / f"{report_filename}.ipynb"
-        else:
-            report_nb = report_file
+        report_nb = self._get_converted_notebook(report_file)
+        timings["convert"] = time.perf_counter() - start
 
         now_timestamp = datetime.today().strftime('%Y-%m-%dT%H-%M-%S')
-
-        run_nb = self.base_path / f"{report_filename} {now_timestamp}.ipynb"
-        pdf_filename = self.base_path / f"{report_filename} {now_timestamp}.pdf"
+        run_name = f"{report_file.stem} {now_timestamp}"
+        if suffix is not None:
+            run_name += f"_{suffix}"
+        run_nb = self.base_path / f"{run_name}.ipynb"
+        pdf_filename = self.base_path / f"{run_name}.pdf"
 
         logger.info("Running %s and converting to %s", run_nb, pdf_filename)
 
-        jupytext_notebook = jupytext.read(report_file)
-        # write to execution nb
-        jupytext.write(jupytext_notebook, report_nb)
-
+        stage_start = time.perf_counter()
         _ = pm.execute_notebook(str(report_nb), str(run_nb), parameters=nb_params,)
+        timings["execute"] = time.perf_counter() - stage_start
 
-        pdfexp = PDFExporter(
-            template_file=resource_filename("soam", "resources/pdf_report.tpl")
-        )
-
-        pdf_data, _ = pdfexp.from_filename(run_nb)
+        stage_start = time.perf_counter()
+        pdf_data, _ = self._get_pdf_exporter().from_filename(run_nb)
 
         with open(pdf_filename, "wb") as f:
             f.write(pdf_data)
+        timings["export"] = time.perf_counter() - stage_start
+        timings["total"] = time.perf_counter() - start
 
         logger.info("Succesfully wrote: %s", str(pdf_filename))
 
-        return str(pdf_filename)
+        return PDFReportResult(str(pdf_filename), timings)
+
+    def _get_converted_notebook(self, report_file: Path) -> Path:
+        """
+        Convert the report with jupytext, reusing previous conversions.
+
+        Conversions are cached by the resolved path of the report, and written
+        to a notebook named after it, so reports with the same name in other
+        directories don't overwrite each other. An edited report, whose source
+        hash changed, is converted again.
+        """
+        report_path = report_file.resolve()
+        source_hash = hashlib.sha256(report_path.read_bytes()).hexdigest()
+        key = (self.base_path.resolve(), report_path)
+        with self._converted_notebooks_lock:
+            cached_hash, report_nb = self._converted_notebooks.get(key, ("", None))
+            if (
+                report_nb is None
+                or cached_hash != source_hash
+                or not report_nb.is_file()
+            ):
+                path_hash = hashlib.sha256(str(report_path).encode()).hexdigest()
+                report_nb = self.base_path / f"{report_file.stem}_{path_hash[:8]}.ipynb"
+                jupytext_notebook = jupytext.read(report_file)
+                # write to execution nb
+                jupytext.write(jupytext_notebook, report_nb)
+                self._converted_notebooks[key] = (source_hash, report_nb)
+        return report_nb
+
+    def _get_pdf_exporter(self) -> PDFExporter:  # pylint: disable=no-self-use
+        """Get the PDF exporter of the current thread, creating it once."""
+        if not hasattr(_thread_local, "pdf_exporter"):
+            _thread_local.pdf_exporter = PDFExporter(
+                template_file=resource_filename("soam", "resources/pdf_report.tpl")
+            )
+        return _thread_local.pdf_exporter
 
     def _parse_params(self, nb_params):
         """
@@ -102,6 +194,11 @@ class PDFReport:
         return nb_params
 
 
+def _set_thread_event_loop():
+    """Give each worker thread its own event loop for the notebook kernels."""
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+
 class PDFReportTask(Step, PDFReport):
     """
     Creates the task to generate a PDF report.
@@ -7,15 +7,22 @@ model forecasts though the slack app.
 """
 from asyncio import Future
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from io import BytesIO
+import logging
 from pathlib import Path, PosixPath
-from typing import IO, Any, Dict, Optional, Sequence, Union
+import threading
+import time
+from typing import IO, Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 import warnings
 
 from jinja2 import Template
 from muttlib.utils import path_or_string
+import numpy as np
 import pandas as pd
 import slack
+from slack.errors import SlackApiError
 from slack.web.slack_response import SlackResponse
 
 from soam.cfg import get_slack_cred
@@ -24,6 +31,11 @@ from soam.core.step import Step
 
 DEFAULT_GREETING_MESSAGE = "Hello everyone! Here are the results of the forecast for the *{metric_name}* metric:\n"
 DEFAULT_FAREWELL_MESSAGE = "Cheers!\n SoaM."
+NUMBER_SUFFIXES = ['', 'k', 'M', 'G', 'T', 'P']
+RATE_LIMITED_STATUS = 429
+DEFAULT_RETRY_AFTER = 1.0
+
+logger = logging.getLogger(__name__)
 
 
 class SlackReport:
@@ -200,20 +212,22 @@ class SlackAnomalyReportTask(Step):
     Builds up the task of the anomaly report designed for Slack.
     """
 
-    def __init__(self, **kwargs: Any):
+    def __init__(
+        self, rate: Optional[float] = None, rate_limit_retries: int = 3, **kwargs: Any,
+    ):
         """
         Parameters
         ----------
-        channel_id: str
-            Slack channel id where the report will be sent.
-        metric_name: str
-            Performance metric being measured.
-        setting_path: str
-            Setting path.
+        rate: float, optional
+            Maximum requests per second, by default None, no throttling.
+        rate_limit_retries: int
+            Maximum number of retries of rate limited requests, by default 3.
         kwargs:
             Extra args to pass.
         """
         Step.__init__(self, **kwargs)  # type: ignore
+        self.rate = rate
+        self.rate_limit_retries = rate_limit_retries
 
     def run(  # type: ignore
         self,
@@ -239,7 +253,14 @@ class SlackAnomalyReportTask(Step):
             Name of the date column
         """
         return send_anomaly_report(
-            slack_client, channel_id, plot, metric_name, anomaly_df, date_col
+            slack_client,
+            channel_id,
+            plot,
+            metric_name,
+            anomaly_df,
+            date_col,
+            rate=self.rate,
+            max_retries=self.rate_limit_retries,
         )
 
 
@@ -268,7 +289,7 @@ class SlackMessage:
         """Message property."""
         message = path_or_string(self.template)
         if self.arguments:
-            template = Template(message)
+            template = _get_template(message)
             message = template.render(**self.arguments)  # type:ignore
         return message
 
@@ -290,6 +311,12 @@ class SlackMessage:
             raise TypeError("Only PosixPath and BytesIO supported.")
 
 
+@lru_cache(maxsize=128)
+def _get_template(source: str) -> Template:
+    """Compile a Jinja template once per source."""
+    return Template(source)
+
+
 def send_slack_message(
     slack_client: slack.WebClient,
     channel: str,
@@ -322,50 +349,309 @@ def send_slack_message(
 
 
 def send_slack_messages_in_thread(
-    slack_client: slack.WebClient, channel: str, messages: Sequence[SlackMessage]
-):
-    first_message = messages[0]
-    response = send_slack_message(slack_client, channel, first_message)
-    for msg in messages[1:]:
-        response = send_slack_message(
-            slack_client, channel, msg, thread_ts=response["ts"]
-        )
+    slack_client: slack.WebClient,
+    channel: str,
+    messages: Sequence[SlackMessage],
+    **delivery_kwargs: Any,
+) -> List["DeliveryReport"]:
+    """Send messages as a thread, replying to the first one.
+
+    Parameters
+    ----------
+    channel : str
+        slack channel to send the messages to.
+    messages : sequence of SlackMessage
+        Messages of the thread.
+    delivery_kwargs :
+        Extra args to pass to `send_slack_messages_concurrently`.
+
+    Returns
+    -------
+    list of DeliveryReport
+        Latency and retries of each message.
+    """
+    return send_multiple_slack_messages(
+        slack_client, channel, [messages], **delivery_kwargs
+    )
 
 
 def send_multiple_slack_messages(
     slack_client: slack.WebClient,
     channel: str,
     messages: Sequence[Union[SlackMessage, Sequence[SlackMessage]]],
-):
-    for element in messages:
-        if isinstance(element, Iterable):
-            send_slack_messages_in_thread(slack_client, channel, element)
-        else:
-            send_slack_message(slack_client, channel, element)
+    **delivery_kwargs: Any,
+) -> List["DeliveryReport"]:
+    """Send messages and threads with `send_slack_messages_concurrently`.
+
+    Parameters
+    ----------
+    channel : str
+        slack channel to send the messages to.
+    messages : sequence of SlackMessage or sequences of SlackMessage
+        Elements to send, sequences are sent as a thread.
+    delivery_kwargs :
+        Extra args to pass to `send_slack_messages_concurrently`, e.g. `rate`.
+
+    Returns
+    -------
+    list of DeliveryReport
+        Latency and retries of each message in the order they were given.
+
+    Raises
+    ------
+    Exception
+        The error of the first failed message, once all the others were sent.
+    """
+    reports = send_slack_messages_concurrently(
+        slack_client, channel, messages, **delivery_kwargs
+    )
+    for report in reports:
+        if report.error is not None:
+            raise report.error
+    return reports
+
+
+class DeliveryReport(NamedTuple):
+    """Delivery outcome of a single message, failed ones carry their error."""
+
+    element: int
+    position: int
+    latency: float
+    retries: int
+    response: Optional[SlackResponse]
+    error: Optional[Exception] = None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by the workers delivering messages.
+
+    Besides the steady refill rate, the bucket can be paused until a given
+    time, which is how Slack's `Retry-After` header is honored by every worker.
+    """
+
+    def __init__(self, rate: Optional[float] = None, capacity: int = 1):
+        """
+        Parameters
+        ----------
+        rate: float, optional
+            Tokens added per second, by default None which means no throttling
+            besides `Retry-After` pauses.
+        capacity: int
+            Maximum number of tokens, i.e. the allowed burst, by default 1.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.rate is None:
+                        return
+                    self._tokens = min(
+                        self.capacity,
+                        self._tokens + (now - self._last_refill) * self.rate,
+                    )
+                    self._last_refill = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_after(error: SlackApiError) -> Optional[float]:
+    """Seconds to wait from a rate limited response, None for other errors."""
+    response = error.response
+    if getattr(response, "status_code", None) != RATE_LIMITED_STATUS:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    return float(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+
+
+def send_slack_message_with_retries(
+    slack_client: slack.WebClient,
+    channel: str,
+    msg: SlackMessage,
+    thread_ts: Optional[int] = None,
+    bucket: Optional[TokenBucket] = None,
+    max_retries: int = 3,
+) -> Tuple[SlackResponse, int]:
+    """Send Slack message retrying rate limited requests.
+
+    Parameters
+    ----------
+    channel : str
+        slack channel to send the message to.
+    msg : SlackMessage
+        SlackMessage instance.
+    thread_ts : int, optional
+        message timestamp to reply to in threaded fashion, by default None.
+    bucket : TokenBucket, optional
+        bucket to take a token from before each request, by default None.
+    max_retries : int
+        maximum number of retries of rate limited requests, by default 3.
+
+    Returns
+    -------
+    tuple of (SlackResponse, int)
+        The response and the number of retries needed.
+    """
+    bucket = bucket or TokenBucket()
+    retries = 0
+    # Buffers are read to the end by each upload, so retries rewind them.
+    buffer = msg.attachment_ref if isinstance(msg.attachment_ref, BytesIO) else None
+    start = buffer.tell() if buffer is not None else 0
+    while True:
+        bucket.acquire()
+        if buffer is not None:
+            buffer.seek(start)
+        try:
+            return send_slack_message(slack_client, channel, msg, thread_ts), retries
+        except SlackApiError as error:
+            retry_after = _retry_after(error)
+            if retry_after is None or retries >= max_retries:
+                raise
+            logger.warning("Slack rate limit hit, retrying in %s s.", retry_after)
+            bucket.pause(retry_after)
+            retries += 1
+
+
+def send_slack_messages_concurrently(
+    slack_client: slack.WebClient,
+    channel: str,
+    messages: Sequence[Union[SlackMessage, Sequence[SlackMessage]]],
+    max_workers: int = 8,
+    rate: Optional[float] = None,
+    burst: int = 1,
+    max_retries: int = 3,
+) -> List[DeliveryReport]:
+    """Send messages and threads concurrently.
+
+    Independent elements are delivered concurrently by a thread pool, messages
+    of a thread are sent in order by the same worker. All workers share a
+    token bucket which also honors Slack's `Retry-After` header.
+
+    A failed message doesn't stop the others, its error is reported instead.
+    The replies of a thread whose first message failed are not sent and report
+    the same error.
+
+    Parameters
+    ----------
+    channel : str
+        slack channel to send the messages to.
+    messages : sequence of SlackMessage or sequences of SlackMessage
+        Elements to send, sequences are sent as a thread.
+    max_workers : int
+        Maximum number of concurrent requests, by default 8.
+    rate : float, optional
+        Maximum requests per second, by default None, no throttling.
+    burst : int
+        Requests allowed in a burst when rate is set, by default 1.
+    max_retries : int
+        maximum number of retries of rate limited requests, by default 3.
+
+    Returns
+    -------
+    list of DeliveryReport
+        Latency, retries and error of each message in the order they were given.
+    """
+    bucket = TokenBucket(rate, burst)
+
+    def deliver(element: int, thread: Sequence[SlackMessage]) -> List[DeliveryReport]:
+        reports = []
+        thread_ts = None
+        for position, msg in enumerate(thread):
+            start = time.perf_counter()
+            try:
+                response, retries = send_slack_message_with_retries(
+                    slack_client, channel, msg, thread_ts, bucket, max_retries
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning(
+                    "Slack message %s of element %s failed: %s",
+                    position,
+                    element,
+                    error,
+                )
+                reports.append(
+                    DeliveryReport(
+                        element, position, time.perf_counter() - start, 0, None, error
+                    )
+                )
+                if position == 0:
+                    reports.extend(
+                        DeliveryReport(element, reply, 0.0, 0, None, error)
+                        for reply in range(1, len(thread))
+                    )
+                    break
+                continue
+            reports.append(
+                DeliveryReport(
+                    element, position, time.perf_counter() - start, retries, response
+                )
+            )
+            if position == 0:
+                thread_ts = response["ts"]
+        return reports
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                deliver,
+                element_idx,
+                element if isinstance(element, Iterable) else [element],
+            )
+            for element_idx, element in enumerate(messages)
+        ]
+        return [report for future in futures for report in future.result()]
 
 
 def _format_number(num):
-    magnitude = 0
-    while abs(num) >= 1000:
-        magnitude += 1
-        num /= 1000.0
-    # add more suffixes if you need them
-    return '%.2f%s' % (num, ['', 'k', 'M', 'G', 'T', 'P'][magnitude])
+    return _format_numbers(pd.Series([num])).iloc[0]
+
+
+def _format_numbers(values: pd.Series) -> pd.Series:
+    """Format numbers with two decimals and a thousands magnitude suffix."""
+    numbers = values.to_numpy(dtype=float)
+    thresholds = 1000.0 ** np.arange(1, len(NUMBER_SUFFIXES))
+    magnitude = np.searchsorted(thresholds, np.abs(numbers), side='right')
+    magnitude[np.isnan(numbers)] = 0
+    formatted = np.char.add(
+        _format_fixed(numbers / 1000.0 ** magnitude),
+        np.array(NUMBER_SUFFIXES)[magnitude],
+    )
+    return pd.Series(formatted, index=values.index, dtype=object)
+
+
+def _format_fixed(numbers: np.ndarray) -> np.ndarray:
+    """Format an array of numbers with two decimals."""
+    return np.char.mod('%.2f', numbers)
 
 
 def _df_to_report_string(
     df, date_col, value_col, greeting_message=None, farewell_message=None
 ):
     """Concatenates the rows using the date_col and value_col for formatting purposes."""
-    summary_entries = []
-    if greeting_message:
-        summary_entries.append(greeting_message)
-
-    for _, row in df.iterrows():
-        date = row[date_col].strftime('%Y-%b-%d')
-        value = row[value_col]
-        summary_entries.append(f"• *[{date}]* {value}\n")
+    dates = pd.to_datetime(df[date_col]).dt.strftime('%Y-%b-%d')
+    rows = "• *[" + dates + "]* " + df[value_col].astype(str) + "\n"
 
+    summary_entries = rows.tolist()
+    if greeting_message:
+        summary_entries.insert(0, greeting_message)
     if farewell_message:
         summary_entries.append(farewell_message)
 
@@ -380,7 +666,9 @@ def send_anomaly_report(
     metric_name: str,
     anomaly_df: pd.DataFrame,
     date_col: str,
-):
+    rate: Optional[float] = None,
+    max_retries: int = 3,
+) -> List[DeliveryReport]:
     """
     Parameters
     ----------
@@ -394,6 +682,10 @@ def send_anomaly_report(
         DataFrame with anomalous values. Must have the following columns: ['y','yhat','yhat_lower','yhat_upper']
     date_col: str
         Name of the date column
+    rate : float, optional
+        Maximum requests per second, by default None, no throttling.
+    max_retries : int
+        maximum number of retries of rate limited requests, by default 3.
     """
     detection_window = len(anomaly_df)
     stddev = anomaly_df.yhat.std()
@@ -412,9 +704,17 @@ def send_anomaly_report(
             attachment=plot,
         )
     else:
-        aux['message'] = aux.apply(
-            lambda row: f"Count: {_format_number(row['y'])}, expected value in range ( {_format_number(row['yhat_lower'])} , {_format_number(row['yhat_upper'])} ) - {row['stddev']:.2f} standard deviations",
-            axis=1,
+        stddevs = pd.Series(_format_fixed(aux['stddev'].to_numpy()), index=aux.index)
+        aux = aux.assign(
+            message="Count: "
+            + _format_numbers(aux['y'])
+            + ", expected value in range ( "
+            + _format_numbers(aux['yhat_lower'])
+            + " , "
+            + _format_numbers(aux['yhat_upper'])
+            + " ) - "
+            + stddevs
+            + " standard deviations"
         )
         greeting_message = f"Hello everyone! Here are the outliers found for the last {detection_window} days for the metric '{metric_name}'"
         summary_message = _df_to_report_string(
@@ -426,4 +726,11 @@ def send_anomaly_report(
         )
         msg = SlackMessage(summary_message, attachment=plot)
 
-    send_slack_message(slack_client, channel=channel_id, msg=msg)
+    return send_multiple_slack_messages(
+        slack_client,
+        channel_id,
+        [msg],
+        max_workers=1,
+        rate=rate,
+        max_retries=max_retries,
+    )
@@ -10,16 +10,21 @@ from prefect.engine.state import State
 
 from soam.constants import FLOW_FILE_NAME, LOCK_NAME
 from soam.core import SoamFlow
+from soam.core.spill import load_handles
 from soam.savers.savers import Saver
 from soam.utilities.utils import get_file_path
 
+DEFAULT_LOCK_TIMEOUT = 60.0
+
 
 class CSVSaver(Saver):
     """
     CSV Saver object to store the predictions and the runs.
     """
 
-    def __init__(self, path: Union[str, Path]):
+    def __init__(
+        self, path: Union[str, Path], lock_timeout: float = DEFAULT_LOCK_TIMEOUT
+    ):
         """
         Create a saver object to store the predcitions and the runs.
 
@@ -29,9 +34,15 @@ class CSVSaver(Saver):
         ----------
         path
             str or pathlib.Path where the file will be created.
+        lock_timeout
+            Seconds a task run waits for the flow file lock, tasks running in
+            parallel append to the file one at a time, by default 60. The task
+            run fails with a filelock.Timeout if a stale lock is held longer.
+            Waits until the lock is acquired if negative.
         """
         super().__init__()
         self.path = Path(make_dirs(path))
+        self.lock_timeout = lock_timeout
 
     @property
     def flow_path(self) -> Path:
@@ -112,7 +123,7 @@ class CSVSaver(Saver):
             The new updated state of the forecast task.
         """
         if new_state.is_successful():
-            save_prediction = new_state.result[0].copy()
+            save_prediction = load_handles(new_state.result[0]).copy()
             save_prediction["task_run_id"] = context["task_run_id"]
 
             task_run_id = context["task_slug"] + "_" + context["task_run_id"]
@@ -147,11 +158,9 @@ class CSVSaver(Saver):
                 str(self.flow_run_lock)
             )
 
-            with lock.acquire(timeout=5):
-                read_df = pd.read_csv(flow_run_file)
-                flow_values = read_df[read_df.flow_state.str.contains("Running")].iloc[
-                    0
-                ]
+            with lock.acquire(timeout=self.lock_timeout):
+                # The flow run row is the first one, written by save_flow_run.
+                flow_values = pd.read_csv(flow_run_file, nrows=1).iloc[0]
                 csv_data = {
                     "flow_run_id": [flow_values["flow_run_id"]],
                     "start_datetime": [flow_values["start_datetime"]],
@@ -200,6 +209,8 @@ class CSVSaver(Saver):
             df.to_csv(self.flow_file_path, index=False)
 
         elif new_state.is_successful() or new_state.is_failed():
-            self.flow_run_lock.unlink()
+            # Only created if a task run was saved.
+            if self.flow_run_lock.exists():
+                self.flow_run_lock.unlink()
 
         return new_state
@@ -7,6 +7,7 @@ from prefect import Task, context
 from prefect.engine.state import State
 
 from soam.core import SoamFlow
+from soam.core.spill import load_handles
 from soam.data_models import Base, ForecastValues, SoamFlowRunSchema, SoamTaskRunSchema
 from soam.savers.savers import Saver
 from soam.utilities.helpers import session_scope
@@ -58,7 +59,7 @@ class DBSaver(Saver):
             The new updated state of the forecast task.
         """
         if new_state.is_successful():
-            save_prediction = new_state.result[0].copy()
+            save_prediction = load_handles(new_state.result[0]).copy()
             save_prediction["task_run_id"] = context["task_run_id"]
             self.db_client.insert_from_frame(
                 save_prediction, ForecastValues.__tablename__
@@ -4,16 +4,19 @@ Utils
 -----
 Utility functions for the whole project.
 """
-import collections
+import collections.abc
 from copy import deepcopy
 import logging.config
 import os
 from pathlib import Path
+import sys
+import threading
 from typing import List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 from pandas.tseries import offsets
+from pandas.tseries.frequencies import to_offset
 
 from soam.constants import DS_COL
 
@@ -231,27 +234,133 @@ class SuppressStdOutStdErr(object):
     to stderr just before a script exits, and after the context manager has
     exited (at least, I think that is why it lets exceptions through).
 
+    The suppression is reference counted and shared by the whole process:
+    the file descriptors are redirected when the first block is entered and
+    restored when the last one exits. Blocks can be nested and entered from
+    many threads at once, e.g. to fit models in a thread pool, without one
+    thread restoring the output while another is still inside its block.
+    Forked children start with the output restored and no active block.
+
     Ref:
         https://github.com/facebook/prophet/issues/223
     """
 
+    _lock = threading.Lock()
+    _depth = 0
+    _null_fd: Optional[int] = None
+    _save_fds: List[int] = []
+
     def __init__(self):
-        """Open a pair of null files and save the actual stdout (1) and stderr (2) file descriptors."""
-        self.null_fds = [os.open(os.devnull, os.O_RDWR) for x in range(2)]
-        self.save_fds = [os.dup(1), os.dup(2)]
+        self._pid: Optional[int] = None
 
     def __enter__(self):
-        # Assign the null pointers to stdout and stderr.
-        os.dup2(self.null_fds[0], 1)
-        os.dup2(self.null_fds[1], 2)
+        cls = type(self)
+        with cls._lock:
+            if cls._depth == 0:
+                cls._redirect()
+            cls._depth += 1
+            self._pid = os.getpid()
+        return self
 
     def __exit__(self, *_):
-        # Re-assign the real stdout/stderr back to (1) and (2)
-        os.dup2(self.save_fds[0], 1)
-        os.dup2(self.save_fds[1], 2)
-        # Close the null files
-        for fd in self.null_fds + self.save_fds:
+        cls = type(self)
+        if self._pid != os.getpid():
+            # Entered before forking, the child already reset the suppression.
+            return
+        with cls._lock:
+            cls._depth -= 1
+            if cls._depth == 0:
+                cls._restore()
+
+    @classmethod
+    def _redirect(cls):
+        """Save the actual stdout (1) and stderr (2) and point them to null."""
+        for stream in (sys.stdout, sys.stderr):
+            if stream is not None:
+                stream.flush()
+        cls._null_fd = os.open(os.devnull, os.O_RDWR)
+        cls._save_fds = [os.dup(1), os.dup(2)]
+        os.dup2(cls._null_fd, 1)
+        os.dup2(cls._null_fd, 2)
+
+    @classmethod
+    def _restore(cls):
+        """Re-assign the real stdout/stderr back to (1) and (2)."""
+        for stream in (sys.stdout, sys.stderr):
+            if stream is not None:
+                stream.flush()
+        os.dup2(cls._save_fds[0], 1)
+        os.dup2(cls._save_fds[1], 2)
+        for fd in cls._save_fds + [cls._null_fd]:
             os.close(fd)
+        cls._null_fd, cls._save_fds = None, []
+
+    @classmethod
+    def _reset_after_fork(cls):
+        """
+        Renew the lock, which may be held by another thread when forking, and
+        restore the output, since the blocks of the parent never exit here.
+        """
+        cls._lock = threading.Lock()
+        if cls._depth > 0:
+            cls._restore()
+        cls._depth = 0
+
+    @classmethod
+    def is_active(cls) -> bool:
+        """Whether the output is currently suppressed."""
+        return cls._depth > 0
+
+
+# os.register_at_fork is only available on Unix.
+_register_at_fork = getattr(os, "register_at_fork", None)
+if _register_at_fork is not None:
+    _register_at_fork(
+        after_in_child=SuppressStdOutStdErr._reset_after_fork  # pylint: disable=protected-access
+    )
+
+
+FREQUENCY_SAMPLE_SIZE = 32
+
+
+def infer_frequency(
+    dates, sample_size: int = FREQUENCY_SAMPLE_SIZE, allow_gaps: bool = False
+) -> Optional[str]:
+    """
+    Infer the frequency of sorted dates from their last values.
+
+    Parameters
+    ----------
+    dates : array like of datetimes
+        Sorted dates.
+    sample_size : int, optional
+        Number of trailing dates inspected, by default FREQUENCY_SAMPLE_SIZE
+    allow_gaps : bool, optional
+        Accept samples with missing dates. The frequency is then the first one
+        inferred from three consecutive dates, or the smallest step, whose grid
+        contains all the sampled dates. By default False.
+
+    Returns
+    -------
+    str or None
+        pandas frequency string, None if it could not be inferred.
+    """
+    sample = pd.DatetimeIndex(np.asarray(dates)[-sample_size:])
+    if len(sample) < 3:
+        return None
+    frequency = pd.infer_freq(sample)
+    if frequency is not None or not allow_gaps:
+        return frequency
+
+    candidates = [pd.infer_freq(sample[i : i + 3]) for i in range(len(sample) - 2)]
+    step = np.diff(sample.asi8).min()
+    if step > 0:
+        candidates.append(to_offset(pd.Timedelta(step)).freqstr)
+    for candidate in pd.unique([c for c in candidates if c is not None]):
+        grid = pd.date_range(sample[0], sample[-1], freq=candidate)
+        if sample.isin(grid).all():
+            return candidate
+    return None
 
 
 def add_future_dates(
@@ -267,7 +376,10 @@ def add_future_dates(
     periods : int
         number of new future rows or datapoints to append.
     frequency : str, optional
-        pandas frequency string, by default None
+        pandas frequency string, by default inferred from the last
+        FREQUENCY_SAMPLE_SIZE dates. Irregular dates before them are ignored,
+        so such columns get the frequency of their recent dates instead of
+        raising.
     ds_col : str, optional
         date column name, by default DS_COL
 
@@ -282,18 +394,20 @@ def add_future_dates(
         Frequency could not be inferred.
     """
     if frequency is None:
-        inferred_frequency = pd.infer_freq(df[ds_col])
-        if inferred_frequency is None:
+        frequency = infer_frequency(df[ds_col].values)
+        if frequency is None:
             raise ValueError(
                 "Frequency could not be inferred, please specify a frequency."
             )
-        frequency = inferred_frequency
     date_range_values = pd.date_range(
-        start=df[[ds_col]].iloc[-1][0], periods=periods + 1, freq=frequency
+        start=df[ds_col].iloc[-1], periods=periods + 1, freq=frequency
     ).values[1:]
-    future_df = {col: [np.nan] * periods for col in df.columns if col != ds_col}
-    future_df[ds_col] = date_range_values
-    future_df = pd.DataFrame(future_df)
+    future_df = pd.DataFrame(
+        {
+            col: date_range_values if col == ds_col else np.full(periods, np.nan)
+            for col in df.columns
+        }
+    )
     full_df = pd.concat([df, future_df], axis=0, ignore_index=True)
     return full_df
 
@@ -319,7 +433,7 @@ def flatten_dict(d, parent_key='', sep='.'):
     items = []
     for k, v in d.items():
         new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, collections.MutableMapping):
+        if isinstance(v, collections.abc.MutableMapping):
             items.extend(flatten_dict(v, new_key, sep=sep).items())
         else:
             items.append((new_key, v))
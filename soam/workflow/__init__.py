@@ -1,7 +1,11 @@
 """SoaM workflow."""
+from soam.workflow.auto_forecaster import AutoForecaster
 from soam.workflow.backtester import Backtester, compute_metrics
+from soam.workflow.features import LagFeatures
 from soam.workflow.forecaster import Forecaster
 from soam.workflow.merge_concat import MergeConcat
+from soam.workflow.parameter_search import ParameterSearch
+from soam.workflow.regularizer import TimeSeriesRegularizer
 from soam.workflow.slicer import Slicer
 from soam.workflow.store import Store
 from soam.workflow.time_series_extractor import TimeSeriesExtractor
@@ -9,5 +13,10 @@ import soam.workflow.transformer
 from soam.workflow.transformer import (
     BaseDataFrameTransformer,
     DummyDataFrameTransformer,
+    FunctionDataFrameTransformer,
+    RunningMinMaxScaler,
+    RunningStandardScaler,
+    StatelessDataFrameTransformer,
     Transformer,
+    TransformerPipeline,
 )
@@ -1,13 +1,31 @@
 """
 Anomaly detection module.
 """
+from collections import OrderedDict
 import logging
-from typing import NamedTuple  # pylint:disable=unused-import
+from typing import (  # pylint:disable=unused-import
+    TYPE_CHECKING,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 import pandas as pd
+from sqlalchemy import select
 
-from soam.constants import DS_COL, YHAT_COL
+from soam.constants import (
+    DS_COL,
+    FORECAST_DATE,
+    YHAT_COL,
+    YHAT_LOWER_COL,
+    YHAT_UPPER_COL,
+)
 from soam.core import Step
+from soam.data_models import ForecastValues
+
+if TYPE_CHECKING:
+    import muttlib
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -19,6 +37,8 @@ class IntervalColumns(NamedTuple):
 
 
 class ConfidenceIntervalAnomaly(Step):
+    checkpointable = True
+
     def __init__(  # type: ignore
         self,
         metric: str,
@@ -78,6 +98,26 @@ class ConfidenceIntervalAnomaly(Step):
             raise ValueError(f"Metric {self.metric} not present in time_series.")
 
         time_series = time_series.iloc[-len(prediction) :]
+        return self._detect(time_series, prediction)
+
+    def _detect(
+        self, time_series: pd.DataFrame, prediction: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        Flag the values of the metric that fall outside the prediction boundaries.
+
+        Parameters
+        ----------
+        time_series: pandas.DataFrame
+            Values of the metric to check, aligned to the prediction dates.
+        prediction: pandas.DataFrame
+            Prediction with the ds, response and interval columns.
+
+        Returns
+        -------
+        pandas.DataFrame
+            A pandas DataFrame with the outliers columns.
+        """
         time_series = time_series.astype({self.ds_col: "datetime64[ns]"})
         outlier = pd.merge_asof(time_series, prediction, on=self.ds_col)
         outlier["default"] = False
@@ -102,4 +142,274 @@ class ConfidenceIntervalAnomaly(Step):
         return outlier
 
 
-__all__ = ['ConfidenceIntervalAnomaly']
+class AnomalyBackfill(ConfidenceIntervalAnomaly):
+    def __init__(  # type: ignore
+        self,
+        model,
+        metric: str,
+        backfill_window: int,
+        refit_interval: int = 7,
+        ds_col: str = DS_COL,
+        response_col: str = YHAT_COL,
+        interval_cols: IntervalColumns = None,
+        **kwargs,
+    ):
+        """Detect anomalies over a historical window reusing each fit for many points.
+
+        Instead of refitting the model for every point of the window, the window
+        is split in blocks of `refit_interval` points. The model is fitted once
+        per block with the data previous to it. All the points are then flagged
+        in a single pass.
+
+        Models with an `update(X, y)` method, which adds observations to the
+        fitted model without refitting its parameters, predict each point of
+        the block one step ahead, updated with the actuals before it. Other
+        models predict the whole block at once, so the k-th point of a block is
+        compared to a k-step-ahead interval, wider than a one step one.
+
+        Parameters
+        ----------
+        model : scikit-learn.base.BaseEstimator
+            Model to fit, its predictions must contain the interval columns,
+            e.g. `SkProphet(full_output=True)`.
+        metric : str
+            metric name to compare to bounds
+        backfill_window : int
+            Number of trailing points of the time series to flag.
+        refit_interval : int, optional
+            Number of points predicted by each fit, by default 7.
+            Use 1 to get one-step-ahead intervals for every point with models
+            without `update`.
+        ds_col : str, optional
+            Date column, by default DS_COL
+        response_col : str, optional
+            Name of the prediction column, by default YHAT_COL
+        interval_cols : IntervalColumns, optional
+            Column names for prediction boundaries, by default yhat_lower and
+            yhat_upper.
+        """
+        super().__init__(
+            metric=metric,
+            ds_col=ds_col,
+            response_col=response_col,
+            interval_cols=interval_cols,
+            **kwargs,
+        )
+        if backfill_window < 1:
+            raise ValueError("backfill_window should be greater than zero.")
+        if refit_interval < 1:
+            raise ValueError("refit_interval should be greater than zero.")
+        self.model = model
+        self.backfill_window = backfill_window
+        self.refit_interval = refit_interval
+
+    def run(self, time_series: pd.DataFrame) -> pd.DataFrame:  # type: ignore
+        """
+        Fit the model once per block and detect the anomalies of the window.
+
+        Parameters
+        ----------
+            time_series: pandas.DataFrame
+                containing as minimum the ds column and the metric column.
+                The last `backfill_window` rows are flagged.
+
+        Returns
+        -------
+        pandas.DataFrame
+            A pandas DataFrame with the outliers columns for the backfill window.
+        """
+        if self.metric not in time_series.columns:
+            raise ValueError(f"Metric {self.metric} not present in time_series.")
+        if self.backfill_window >= len(time_series):
+            raise ValueError("backfill_window should be lower than the series length.")
+
+        time_series = time_series.sort_values(by=self.ds_col)
+        X = time_series.drop(self.metric, axis=1)
+        y = time_series[self.metric]
+
+        window_start = len(time_series) - self.backfill_window
+        updatable = callable(getattr(self.model, "update", None))
+        predictions = []
+        for block_start in range(window_start, len(time_series), self.refit_interval):
+            block_end = min(block_start + self.refit_interval, len(time_series))
+            self.model.fit(X.iloc[:block_start], y.iloc[:block_start])
+            if not updatable:
+                predictions.append(self.model.predict(X.iloc[block_start:block_end]))
+                continue
+            for point in range(block_start, block_end):
+                X_point, y_point = X.iloc[point : point + 1], y.iloc[point : point + 1]
+                predictions.append(self.model.predict(X_point))
+                if point + 1 < block_end:
+                    self.model.update(X_point, y_point)
+        logger.info(
+            "Backfilled %s points of %s with %s fits.",
+            self.backfill_window,
+            self.metric,
+            -(-self.backfill_window // self.refit_interval),
+        )
+
+        prediction = pd.concat(predictions, ignore_index=True)
+        missing_cols = {self.response_col, *self.interval_cols} - set(
+            prediction.columns
+        )
+        if missing_cols:
+            raise ValueError(
+                f"Model predictions are missing the columns: {missing_cols}."
+            )
+        prediction = prediction[[self.ds_col, self.response_col, *self.interval_cols]]
+        prediction = prediction.astype({self.ds_col: "datetime64[ns]"})
+
+        return self._detect(time_series.iloc[window_start:], prediction)
+
+
+class StoredForecastAnomaly(ConfidenceIntervalAnomaly):
+    def __init__(  # type: ignore
+        self,
+        db_client: "muttlib.dbconn.BaseClient",
+        metric: str,
+        task_run_ids: List[str],
+        cache_size: int = 32,
+        cache_window: str = "D",
+        ds_col: str = DS_COL,
+        **kwargs,
+    ):
+        """Detect anomalies against the forecasts stored by the DBSaver.
+
+        No model is fitted, the intervals for the incoming timestamps are looked
+        up in the ForecastValues table among the forecasts of the given task
+        runs, and the latest stored value is used for each date. Queried windows
+        are kept in an in-process LRU cache per detector, keyed by the task runs
+        and the window, so batches arriving during the same `cache_window` hit
+        the database once. The forecasts of a task run don't change once it has
+        saved them, call `clear_cache` if a window was queried before.
+
+        Parameters
+        ----------
+        db_client : muttlib.dbconn.BaseClient
+            Client for the database where the forecasts are stored.
+        metric : str
+            metric name to compare to bounds
+        task_run_ids : list of str
+            Forecaster task runs to take the forecasts from, those of the metric.
+        cache_size : int, optional
+            Number of forecast windows kept in memory, by default 32.
+        cache_window : str, optional
+            pandas frequency string used to align the queried windows,
+            by default "D".
+        ds_col : str, optional
+            Date column, by default DS_COL
+        """
+        super().__init__(metric=metric, ds_col=ds_col, **kwargs)
+        if not task_run_ids:
+            raise ValueError("task_run_ids should contain the forecasts task runs.")
+        self.db_client = db_client
+        self.task_run_ids = task_run_ids
+        self.cache_size = cache_size
+        self.cache_window = cache_window
+        self._cache: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+
+    def get_params(self, deep=True):
+        d = super().get_params(deep)
+        d["db_conn_str"] = self.db_client.conn_str
+        del d["db_client"]
+        return d
+
+    def run(self, time_series: pd.DataFrame) -> pd.DataFrame:  # type: ignore
+        """
+        Detect anomalies of the incoming values with the stored intervals.
+
+        Parameters
+        ----------
+            time_series: pandas.DataFrame
+                containing as minimum the ds column and the metric column.
+
+        Returns
+        -------
+        pandas.DataFrame
+            A pandas DataFrame with the outliers columns for the timestamps with
+            a stored forecast.
+        """
+        if self.metric not in time_series.columns:
+            raise ValueError(f"Metric {self.metric} not present in time_series.")
+
+        time_series = time_series.astype({self.ds_col: "datetime64[ns]"})
+        time_series = time_series.sort_values(by=self.ds_col)
+        prediction = self.get_forecasts(
+            time_series[self.ds_col].iloc[0], time_series[self.ds_col].iloc[-1]
+        )
+
+        in_prediction = time_series[self.ds_col].isin(prediction[self.ds_col])
+        if not in_prediction.all():
+            logger.warning(
+                "No stored forecast for %s timestamps, skipping them.",
+                (~in_prediction).sum(),
+            )
+        return self._detect(time_series[in_prediction], prediction)
+
+    def get_forecasts(self, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """
+        Retrieve the latest stored forecast for each date between start and end.
+
+        Parameters
+        ----------
+        start : pandas.Timestamp
+            First date to retrieve.
+        end : pandas.Timestamp
+            Last date to retrieve.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame with the ds, yhat and interval columns.
+        """
+        window_start = start.floor(self.cache_window)
+        window_end = end.ceil(self.cache_window)
+        key = (tuple(sorted(map(str, self.task_run_ids))), window_start, window_end)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            forecasts = self._cache[key]
+        else:
+            forecasts = self._query_forecasts(window_start, window_end)
+            self._cache[key] = forecasts
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return forecasts[forecasts[self.ds_col].between(start, end)]
+
+    def clear_cache(self):
+        """Drop the cached forecast windows, e.g. after storing new forecasts."""
+        self._cache.clear()
+
+    def _query_forecasts(
+        self, window_start: pd.Timestamp, window_end: pd.Timestamp
+    ) -> pd.DataFrame:
+        """Query the forecasts of the window, keeping the latest one per date."""
+        table = ForecastValues.__table__
+        query = select(
+            [
+                table.c.forecast_date,
+                table.c.yhat,
+                table.c.yhat_lower,
+                table.c.yhat_upper,
+            ]
+        ).where(
+            table.c.forecast_date.between(
+                window_start.to_pydatetime(), window_end.to_pydatetime()
+            )
+        )
+        query = query.where(table.c.task_run_id.in_(self.task_run_ids))
+        query = query.order_by(table.c.forecast_date, table.c.id)
+
+        forecasts = pd.read_sql(query, con=self.db_client.get_engine())
+        forecasts = forecasts.drop_duplicates(subset=FORECAST_DATE, keep="last")
+        forecasts = forecasts.rename(
+            columns={
+                FORECAST_DATE: self.ds_col,
+                YHAT_COL: self.response_col,
+                YHAT_LOWER_COL: self.interval_cols.lower,
+                YHAT_UPPER_COL: self.interval_cols.upper,
+            }
+        )
+        return forecasts.astype({self.ds_col: "datetime64[ns]"}).reset_index(drop=True)
+
+
+__all__ = ['AnomalyBackfill', 'ConfidenceIntervalAnomaly', 'StoredForecastAnomaly']
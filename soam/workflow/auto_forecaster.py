@@ -0,0 +1,297 @@
+"""
+AutoForecaster
+--------------
+Forecaster Task that picks the best of many candidate models by backtesting
+them with successive halving.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+from typing import (  # pylint:disable=unused-import
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, clone
+
+from soam.constants import DS_COL, Y_COL, YHAT_COL
+from soam.core import Step
+from soam.workflow.backtester import BacktestFold, prepare_backtest_folds
+from soam.workflow.forecaster import Forecaster
+from soam.workflow.metrics import compute_batch_metrics
+from soam.workflow.transformer import Transformer
+
+logger = logging.getLogger(__name__)
+
+# Errors of models failing to fit or forecast a fold, which score it as inf.
+FIT_ERRORS = (ArithmeticError, np.linalg.LinAlgError, RuntimeError, ValueError)
+
+CANDIDATE_COL = "candidate"
+N_FOLDS_COL = "n_folds"
+SCORE_COL = "score"
+
+
+def score_fold(
+    model: BaseEstimator,
+    fold: BacktestFold,
+    metric: Union[str, Callable] = "mae",
+    ds_col: str = DS_COL,
+    response_col: str = Y_COL,
+) -> float:
+    """
+    Fit an unfitted copy of model on a fold and score its forecast.
+
+    Parameters
+    ----------
+    model: BaseEstimator
+        Model to evaluate, it is cloned so it is left untouched.
+    fold: BacktestFold
+        Preprocessed fold, see soam.workflow.backtester.prepare_backtest_folds.
+    metric: str or callable
+        A soam.workflow.metrics.BATCH_METRICS name or a sklearn like metric.
+        Its absolute value is minimized, so signed errors such as bias are
+        ranked by their distance to zero.
+    ds_col: str
+        Date column name.
+    response_col: str
+        Response column name.
+
+    Returns
+    -------
+    float
+        The absolute fold error, inf if the model failed to fit or forecast.
+
+    Raises
+    ------
+    ValueError
+        If the fold lacks the date or response columns.
+    """
+    for col in (ds_col, response_col):
+        if col not in fold.train.columns or col not in fold.test.columns:
+            raise ValueError(f"{col} not present in the fold columns.")
+    forecaster = Forecaster(
+        model=clone(model),
+        output_length=fold.horizon,
+        ds_col=ds_col,
+        response_col=response_col,
+        lean=True,
+    )
+    try:
+        prediction, _, _ = forecaster.run(fold.train)
+    except FIT_ERRORS as error:
+        logger.warning(
+            f"{model.__class__.__name__} failed on a fold: {error!r}", exc_info=True
+        )
+        return np.inf
+    length = min(len(prediction), len(fold.test))
+    y_true = fold.test[response_col].values[:length]
+    y_pred = prediction[YHAT_COL].values[:length]
+    if callable(metric):
+        value = metric(y_true, y_pred)
+    else:
+        value = compute_batch_metrics(
+            y_true, y_pred, metrics=[metric], y_train=fold.train[response_col].values
+        )[metric]
+    value = abs(float(value))
+    return value if np.isfinite(value) else np.inf
+
+
+class AutoForecaster(Step):
+    """
+    Select the best candidate model with successive halving and forecast with it.
+
+    All candidates share one split plan whose folds are preprocessed once. Folds
+    are ordered from the cheapest, the smallest train set, to the most expensive.
+    Every round evaluates the surviving candidates on the first `n` folds, keeps
+    the best `1 / eta` of them and multiplies `n` by `eta`, so most candidates
+    are discarded after a few cheap folds.
+    """
+
+    checkpointable = True
+
+    def __init__(  # type: ignore
+        self,
+        candidates: Union[Mapping[str, BaseEstimator], Sequence[BaseEstimator]],
+        output_length: int = 1,
+        test_window: Optional[int] = None,
+        train_window: Optional[int] = None,
+        step_size: Optional[int] = None,
+        preprocessor: Optional[Transformer] = None,
+        metric: Union[str, Callable] = "mae",
+        eta: int = 2,
+        min_folds: int = 1,
+        n_jobs: Optional[int] = None,
+        ds_col: str = DS_COL,
+        response_col: str = Y_COL,
+        **kwargs,
+    ):
+        """
+        Parameters
+        ----------
+        candidates : dict or list of scikit-learn.base.BaseEstimator
+            Candidate models by name, or a list named after their classes.
+        output_length : int, optional
+            The length of the output to predict, by default 1
+        test_window : int, optional
+            Length of each backtest test set, by default output_length
+        train_window : int, optional
+            Length of each backtest train set, None for expanding windows.
+        step_size : int, optional
+            Distance between successive backtest test sets, by default test_window
+        preprocessor : soam.workflow.Transformer, optional
+            Transformer fitted on each backtest train set.
+        metric : str or callable, optional
+            Error whose absolute value is minimized, a BATCH_METRICS name or a
+            sklearn like metric, by default "mae"
+        eta : int, optional
+            Fraction of candidates kept and fold growth factor per round,
+            by default 2
+        min_folds : int, optional
+            Folds evaluated in the first round, by default 1
+        n_jobs : int, optional
+            Threads evaluating candidates and folds in parallel, by default
+            the executor default.
+        ds_col : str, optional
+            The date column name, by default DS_COL
+        response_col : str, optional
+            The y column name, by default Y_COL
+        """
+        super().__init__(**kwargs)
+        if eta < 2:
+            raise ValueError("eta must be at least 2.")
+        if not isinstance(candidates, Mapping):
+            candidates = {
+                f"{candidate.__class__.__name__}_{i}": candidate
+                for i, candidate in enumerate(candidates)
+            }
+        if not candidates:
+            raise ValueError("At least one candidate is needed.")
+        self.candidates = dict(candidates)
+        self.output_length = output_length
+        self.test_window = test_window
+        self.train_window = train_window
+        self.step_size = step_size
+        self.preprocessor = preprocessor
+        self.metric = metric
+        self.eta = eta
+        self.min_folds = min_folds
+        self.n_jobs = n_jobs
+        self.ds_col = ds_col
+        self.response_col = response_col
+
+        self.leaderboard = pd.DataFrame()
+
+    def _reset_run_state(self):
+        super()._reset_run_state()
+        self.leaderboard = pd.DataFrame()
+
+    def run(  # type: ignore
+        self, time_series: pd.DataFrame, folds: Optional[List[BacktestFold]] = None,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame, object]:
+        """
+        Select the best candidate on the history and forecast with it.
+
+        Parameters
+        ----------
+        time_series : pd.DataFrame
+            History followed by `output_length` future dates, as for Forecaster.
+        folds : list of BacktestFold, optional
+            Precomputed folds to share with other steps, see
+            soam.workflow.backtester.prepare_backtest_folds.
+
+        Returns
+        -------
+        tuple(pandas.DataFrame, pandas.DataFrame, model)
+            0 : Predicted Values DataFrame.
+            1 : Provided Time Series data.
+            2 : Trained best model.
+        """
+        if folds is None:
+            folds = prepare_backtest_folds(
+                time_series.iloc[: -self.output_length],
+                self.test_window or self.output_length,
+                self.train_window,
+                self.step_size,
+                self.preprocessor,
+            )
+        if not folds:
+            raise ValueError("The time series is too short to backtest.")
+
+        self.leaderboard = self.select(folds)
+        best = self.leaderboard[CANDIDATE_COL].iloc[0]
+        logger.info(f"Selected {best} as the best candidate.")
+        forecaster = Forecaster(
+            model=clone(self.candidates[best]),
+            output_length=self.output_length,
+            ds_col=self.ds_col,
+            response_col=self.response_col,
+        )
+        return forecaster.run(time_series)
+
+    def select(self, folds: List[BacktestFold]) -> pd.DataFrame:
+        """
+        Rank the candidates with successive halving.
+
+        Parameters
+        ----------
+        folds : list of BacktestFold
+            Preprocessed folds shared by every candidate.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per candidate with the number of folds it was evaluated on
+            and its mean error, sorted from best to worst.
+        """
+        order = sorted(range(len(folds)), key=lambda i: (len(folds[i].train), -i))
+        errors: Dict[Tuple[str, int], float] = {}
+        alive = list(self.candidates)
+        n_folds = min(self.min_folds, len(folds))
+        ranking: List[Tuple[str, int, float]] = []
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            while True:
+                budget = order[:n_folds]
+                pending = [
+                    (name, i)
+                    for name in alive
+                    for i in budget
+                    if (name, i) not in errors
+                ]
+                scores = executor.map(
+                    lambda job: score_fold(
+                        self.candidates[job[0]],
+                        folds[job[1]],
+                        self.metric,
+                        self.ds_col,
+                        self.response_col,
+                    ),
+                    pending,
+                )
+                errors.update(zip(pending, scores))
+
+                means = {
+                    name: float(np.mean([errors[(name, i)] for i in budget]))
+                    for name in alive
+                }
+                alive = sorted(alive, key=means.__getitem__)
+                if len(alive) == 1:
+                    break
+                keep = max(1, math.ceil(len(alive) / self.eta))
+                ranking = [
+                    (name, n_folds, means[name]) for name in alive[keep:]
+                ] + ranking
+                logger.debug(f"Pruned {alive[keep:]} after {n_folds} folds.")
+                alive = alive[:keep]
+                n_folds = min(len(folds), n_folds * self.eta)
+
+        ranking = [(alive[0], n_folds, means[alive[0]])] + ranking
+        return pd.DataFrame(ranking, columns=[CANDIDATE_COL, N_FOLDS_COL, SCORE_COL])
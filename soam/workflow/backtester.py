@@ -1,24 +1,42 @@
 """Workflow backtester."""
 from collections.abc import Mapping
+import copy
 import logging
+import warnings
 from typing import (  # pylint:disable=unused-import
     TYPE_CHECKING,
     Any,
     Callable,
     Dict,
+    Iterator,
     List,
+    NamedTuple,
     Optional,
     Tuple,
     Union,
 )
 
+import numpy as np
 import pandas as pd
 from prefect.utilities.tasks import defaults_from_attrs
 
-from soam.constants import DS_COL, Y_COL, YHAT_COL
+from soam.constants import (
+    DS_COL,
+    METRICS_KEYWORD,
+    PLOT_KEYWORD,
+    RANGES_KEYWORD,
+    Y_COL,
+    YHAT_COL,
+)
 from soam.core import Step
 from soam.utilities.utils import add_future_dates, split_backtesting_ranges
 from soam.workflow.forecaster import Forecaster
+from soam.workflow.metrics import (
+    RunningAggregation,
+    compute_batch_metrics,
+    stack_ragged,
+)
+from soam.workflow.sinks import BacktestSink, CallbackSink
 from soam.workflow.transformer import DummyDataFrameTransformer, Transformer
 
 if TYPE_CHECKING:
@@ -27,16 +45,184 @@ if TYPE_CHECKING:
 
 
 logger = logging.getLogger(__name__)
-RANGES_KEYWORD = "ranges"
-METRICS_KEYWORD = "metrics"
-PLOT_KEYWORD = "plot"
+
+
+def _nan_aggregation(func: Callable) -> Callable:
+    """Aggregate over the folds skipping NaN, a metric undefined in every fold is NaN."""
+
+    def aggregate(metric_values):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return func(metric_values, axis=0)
+
+    return aggregate
+
+
+# Same NaN skipping as the RunningAggregation used by backtests with a sink.
 DEFAULT_METRIC_AGGREGATION = {
-    "avg": lambda metric_values: sum(metric_values) / len(metric_values),
-    "max": max,
-    "min": min,
+    "avg": _nan_aggregation(np.nanmean),
+    "max": _nan_aggregation(np.nanmax),
+    "min": _nan_aggregation(np.nanmin),
 }
 
 
+class BacktestFold(NamedTuple):
+    """
+    A preprocessed backtest split, ready to be forecasted.
+
+    Each fold owns its `fitted_preprocessor`, fitted on the fold train set.
+    """
+
+    train: pd.DataFrame
+    test: pd.DataFrame
+    ranges: Tuple[pd.Timestamp, pd.Timestamp, pd.Timestamp]
+    fitted_preprocessor: Any
+    horizon: int
+
+
+def prepare_fold(
+    train_set: pd.DataFrame,
+    test_set: pd.DataFrame,
+    preprocessor: Transformer,
+    test_window: int,
+) -> BacktestFold:
+    """
+    Preprocess a split and append the dates to forecast to its train set.
+
+    Parameters
+    ----------
+    train_set: pd.DataFrame
+        Raw train split.
+    test_set: pd.DataFrame
+        Raw test split.
+    preprocessor: Transformer
+        Transformer fitted on the train split, it is cloned first and run in lean
+        mode so the fold frames are only referenced by the fold.
+    test_window: int
+        Number of future dates to append to the train set.
+
+    Returns
+    -------
+    BacktestFold
+        The preprocessed train and test sets, the fold ranges, the fitted
+        transformer and the number of future dates.
+    """
+    preproc = preprocessor.clone()
+    ready_train_set, fitted_preproc = preproc.run(train_set, lean=True)
+    return _build_fold(
+        train_set, test_set, ready_train_set, fitted_preproc, test_window
+    )
+
+
+def _build_fold(train_set, test_set, ready_train_set, fitted_preproc, test_window):
+    """Append the future dates to the train set and transform the test set."""
+    ready_train_set = add_future_dates(ready_train_set, periods=test_window)
+    ready_test_set = fitted_preproc.transform(test_set)
+    ranges = (
+        train_set[DS_COL].min(),
+        train_set[DS_COL].max(),
+        test_set[DS_COL].max(),
+    )
+    return BacktestFold(
+        ready_train_set, ready_test_set, ranges, fitted_preproc, test_window
+    )
+
+
+def iter_backtest_folds(
+    time_series: pd.DataFrame,
+    test_window: int,
+    train_window: Optional[int] = None,
+    step_size: Optional[int] = None,
+    preprocessor: Optional[Transformer] = None,
+) -> Iterator[BacktestFold]:
+    """
+    Split and preprocess a time series one fold at a time.
+
+    With expanding windows an incremental preprocessor, see
+    BaseDataFrameTransformer, is fitted on the first train set and copied once,
+    the copy is then only updated in place with the rows each following train
+    set adds. Each of those folds gets a snapshot of its state.
+
+    Parameters
+    ----------
+    time_series: pd.DataFrame
+        Data to split.
+    test_window: int
+        Length of each test set.
+    train_window: int, optional
+        Length of each train set, None for expanding windows.
+    step_size: int, optional
+        Distance between the beginning of successive test sets.
+    preprocessor: Transformer, optional
+        Transformer fitted on each train set.
+
+    Yields
+    ------
+    BacktestFold
+        The preprocessed folds in chronological order.
+    """
+    if preprocessor is None:
+        preprocessor = Transformer(DummyDataFrameTransformer())
+    incremental = train_window is None and getattr(
+        preprocessor.transformer, "incremental", False
+    )
+    running_preproc, n_seen = None, 0
+    for train_set, test_set in split_backtesting_ranges(
+        time_series, test_window, train_window, step_size,
+    ):
+        if running_preproc is not None:
+            running_preproc.partial_fit(train_set.iloc[n_seen:])
+            yield _build_fold(
+                train_set,
+                test_set,
+                running_preproc.transform(train_set),
+                copy.deepcopy(running_preproc),
+                test_window,
+            )
+        else:
+            fold = prepare_fold(train_set, test_set, preprocessor, test_window)
+            if incremental:
+                # The first fold keeps its own state.
+                running_preproc = copy.deepcopy(fold.fitted_preprocessor)
+            yield fold
+        n_seen = len(train_set)
+
+
+def prepare_backtest_folds(
+    time_series: pd.DataFrame,
+    test_window: int,
+    train_window: Optional[int] = None,
+    step_size: Optional[int] = None,
+    preprocessor: Optional[Transformer] = None,
+) -> List[BacktestFold]:
+    """
+    Split and preprocess a time series once so the folds can be shared.
+
+    Parameters
+    ----------
+    time_series: pd.DataFrame
+        Data to split.
+    test_window: int
+        Length of each test set.
+    train_window: int, optional
+        Length of each train set, None for expanding windows.
+    step_size: int, optional
+        Distance between the beginning of successive test sets.
+    preprocessor: Transformer, optional
+        Transformer fitted on each train set.
+
+    Returns
+    -------
+    list of BacktestFold
+        The preprocessed folds in chronological order.
+    """
+    return list(
+        iter_backtest_folds(
+            time_series, test_window, train_window, step_size, preprocessor
+        )
+    )
+
+
 class Backtester(Step):
     """
     Class to perform backtesting.
@@ -59,10 +245,12 @@ class Backtester(Step):
     step_size: int
         Distance between each successive step between the beginning of each forecasting
         range. If None defaults to test_window.
-    metrics: dict(str, callable)
+    metrics: dict(str, callable or str)
         `dict` containing name of a metric and a callable to compute it.
         The callable must conform to the interface used by sklearn for regression metrics:
         https://scikit-learn.org/stable/modules/classes.html#regression-metrics
+        Strings name a soam.workflow.metrics.BATCH_METRICS metric, these are
+        computed for all the folds at once.
     savers : list of soam.savers.Saver, optional
         The saver to store the parameters and state changes.
     aggregation: bool or dict
@@ -75,8 +263,14 @@ class Backtester(Step):
         aggregate de list of values per metric.
         If aggregation is set to False or None, no aggregation would be performed.
         #TODO: make PLOT_KEYWORD support tuples to pick slices.
+    sink: soam.workflow.sinks.BacktestSink or callable, optional
+        Receives each fold's result and predictions as soon as it finishes.
+        When set the folds are not kept in memory and the default aggregation is
+        computed incrementally.
     """
 
+    checkpointable = True
+
     def __init__(
         self,
         forecaster: "Forecaster",
@@ -88,6 +282,7 @@ class Backtester(Step):
         metrics: "Dict[str, Callable]" = None,
         savers: "Optional[List[Saver]]" = None,
         aggregation: Union[str, Dict] = None,
+        sink: "Union[BacktestSink, Callable, None]" = None,
         **kwargs,
     ):
         """
@@ -111,10 +306,12 @@ class Backtester(Step):
             step_size: int
                 Distance between each successive step between the beginning of each forecasting
                 range. If None defaults to test_window.
-            metrics: dict(str, callable)
+            metrics: dict(str, callable or str)
                 `dict` containing name of a metric and a callable to compute it.
                 The callable must conform to the interface used by sklearn for regression metrics:
                 https://scikit-learn.org/stable/modules/classes.html#regression-metrics
+                Strings name a soam.workflow.metrics.BATCH_METRICS metric, these are
+                computed for all the folds at once.
             savers: list of soam.savers.Saver, optional
                 The saver to store the parameters and state changes.
             aggregation: bool or dict
@@ -126,6 +323,10 @@ class Backtester(Step):
                 containing the name of the aggregation associated with the function to
                 aggregate de list of values per metric.
                 If aggregation is set to False or None, no aggregation would be performed.
+            sink: soam.workflow.sinks.BacktestSink or callable, optional
+                Receives each fold's result and predictions as soon as it finishes.
+                A callable is called with the fold position, its result and its
+                predictions.
         """
         super().__init__(**kwargs)
         if savers is not None:
@@ -144,6 +345,7 @@ class Backtester(Step):
         self.step_size = step_size
         self.metrics = metrics
         self.aggregation = aggregation
+        self.sink = sink
 
     @defaults_from_attrs(
         'forecaster',
@@ -154,6 +356,7 @@ class Backtester(Step):
         'step_size',
         'metrics',
         'aggregation',
+        'sink',
     )
     def run(  # type: ignore
         self,
@@ -166,6 +369,7 @@ class Backtester(Step):
         step_size: Optional[int] = None,
         metrics: Dict[str, Callable] = None,
         aggregation: Union[bool, Dict] = None,
+        sink: "Union[BacktestSink, Callable, None]" = None,
     ) -> List[Dict[str, Any]]:
         """
         Train the model with past data and compute metrics.
@@ -194,11 +398,13 @@ class Backtester(Step):
             Distance between each successive step between the beginning of each
             forecasting
             range. If None defaults to test_window.
-        metrics: dict(str, callable)
+        metrics: dict(str, callable or str)
             `dict` containing name of a metric and a callable to compute it.
             The callable must conform to the interface used by sklearn for regression
             metrics:
             https://scikit-learn.org/stable/modules/classes.html#regression-metrics
+            Strings name a soam.workflow.metrics.BATCH_METRICS metric, these are
+            computed for all the folds at once.
         aggregation: bool or dict
             The expected aggregations for the results.
             If set to true will use the default aggregation, this keeps the last plot,
@@ -209,6 +415,11 @@ class Backtester(Step):
             aggregate de list of values per metric.
             If aggregation is set to False or None, no aggregation would be performed.
             #TODO: make PLOT_KEYWORD support tuples to pick slices.
+        sink: soam.workflow.sinks.BacktestSink or callable, optional
+            Receives each fold's result and predictions as soon as it finishes.
+            When set the folds are not kept in memory, metrics are aggregated
+            with a running mean, min and max, and the aggregated result is
+            returned. A plot index in the aggregation must be -1 or positive.
         """
         # TODO
         # - What is the effect of reusing steps like this if they have saver set?
@@ -216,45 +427,128 @@ class Backtester(Step):
         if test_window is None:
             test_window = forecaster.output_length  # type: ignore
 
-        time_series_splits = split_backtesting_ranges(
-            time_series, test_window, train_window, step_size,
+        folds = iter_backtest_folds(
+            time_series, test_window, train_window, step_size, preprocessor,
         )
-        rv = []
-        for train_set, test_set in time_series_splits:
-            slice_rv = {}
-
-            fc = forecaster.copy()  # type: ignore
-            preproc = preprocessor.copy()  # type: ignore
-
-            ready_train_set, fitted_preproc = preproc.run(train_set)
-            ready_train_set = add_future_dates(ready_train_set, periods=test_window)
-            prediction, _, _ = fc.run(ready_train_set)
-            train_start = train_set[DS_COL].min()
-            train_end = train_set[DS_COL].max()
-            test_end = test_set[DS_COL].max()
-            slice_rv[RANGES_KEYWORD] = (train_start, train_end, test_end)
-
-            ready_test_set = fitted_preproc.transform(test_set)
-            slice_metrics = compute_metrics(
-                ready_test_set[Y_COL], prediction[YHAT_COL], metrics
+        if sink is not None:
+            return self._run_with_sink(
+                folds, sink, forecaster, forecast_plotter, metrics, aggregation,
             )
-            slice_rv[METRICS_KEYWORD] = slice_metrics
-
-            if forecast_plotter:
-                full_set = pd.concat([ready_train_set, ready_test_set])
-                fcp = forecast_plotter.copy()
-                fcp.path = (
-                    fcp.path.parent
-                    / f"train_start={train_start}_train_end={train_end}_test_end={test_end}_{fcp.path.name}"
-                )
-                slice_rv[PLOT_KEYWORD] = fcp.run(full_set, prediction)
 
+        rv = []
+        folds_y, folds_yhat, folds_train = [], [], []
+        for fold in folds:
+            slice_rv, ready_train_set, ready_test_set, prediction = self._run_fold(
+                fold, forecaster, forecast_plotter, metrics,
+            )
+            # The future dates have no y so they are masked out of the MASE scale.
+            folds_train.append(ready_train_set[Y_COL].values)
+            folds_y.append(ready_test_set[Y_COL].values)
+            folds_yhat.append(prediction[YHAT_COL].values)
             rv.append(slice_rv)
 
+        batch_metrics = compute_folds_metrics(folds_y, folds_yhat, folds_train, metrics)
+        for fold_index, slice_rv in enumerate(rv):
+            slice_rv[METRICS_KEYWORD] = _merge_metrics(
+                slice_rv[METRICS_KEYWORD], batch_metrics, fold_index, metrics
+            )
+
         if aggregation:
             return aggregate_rv(aggregation, rv)
         return rv
 
+    def _run_fold(  # pylint: disable=no-self-use
+        self, fold, forecaster, forecast_plotter, metrics,
+    ):
+        """Fit and evaluate a single preprocessed fold."""
+        slice_rv = {}
+
+        ready_train_set, ready_test_set = fold.train, fold.test
+        prediction, _, _ = forecaster.clone().run(ready_train_set)  # type: ignore
+        train_start, train_end, test_end = fold.ranges
+        slice_rv[RANGES_KEYWORD] = fold.ranges
+
+        slice_metrics = compute_metrics(
+            ready_test_set[Y_COL], prediction[YHAT_COL], metrics
+        )
+        slice_rv[METRICS_KEYWORD] = slice_metrics
+
+        if forecast_plotter:
+            full_set = pd.concat([ready_train_set, ready_test_set])
+            fcp = forecast_plotter.copy()
+            fcp.path = (
+                fcp.path.parent
+                / f"train_start={train_start}_train_end={train_end}_test_end={test_end}_{fcp.path.name}"
+            )
+            slice_rv[PLOT_KEYWORD] = fcp.run(full_set, prediction)
+
+        return slice_rv, ready_train_set, ready_test_set, prediction
+
+    def _run_with_sink(
+        self, folds, sink, forecaster, forecast_plotter, metrics, aggregation,
+    ):
+        """Stream each fold to the sink keeping only running aggregations."""
+        if not isinstance(sink, BacktestSink):
+            sink = CallbackSink(sink)
+        if isinstance(aggregation, Mapping) and METRICS_KEYWORD in aggregation:
+            raise ValueError(
+                "Custom metric aggregations are not supported with a sink, "
+                "aggregate the sink output instead."
+            )
+        plot_index = -1
+        if isinstance(aggregation, Mapping):
+            plot_index = aggregation.get(PLOT_KEYWORD, -1)
+        if plot_index < -1:
+            raise ValueError("With a sink the plot index must be -1 or positive.")
+
+        running = RunningAggregation()
+        first_range = last_range = plot = None
+        try:
+            for fold, backtest_fold in enumerate(folds):
+                slice_rv, ready_train_set, ready_test_set, prediction = self._run_fold(
+                    backtest_fold, forecaster, forecast_plotter, metrics,
+                )
+                batch_metrics = compute_folds_metrics(
+                    [ready_test_set[Y_COL].values],
+                    [prediction[YHAT_COL].values],
+                    [ready_train_set[Y_COL].values],
+                    metrics,
+                )
+                slice_rv[METRICS_KEYWORD] = _merge_metrics(
+                    slice_rv[METRICS_KEYWORD], batch_metrics, 0, metrics
+                )
+                predictions = prediction.merge(
+                    ready_test_set[[DS_COL, Y_COL]], on=DS_COL, how="left"
+                )
+                sink.write(fold, slice_rv, predictions)
+
+                running.update(slice_rv[METRICS_KEYWORD])
+                if first_range is None:
+                    first_range = slice_rv[RANGES_KEYWORD][0]
+                last_range = slice_rv[RANGES_KEYWORD][-1]
+                if plot_index in (-1, fold):
+                    plot = slice_rv.get(PLOT_KEYWORD)
+        finally:
+            sink.close()
+
+        return [
+            {
+                RANGES_KEYWORD: (first_range, last_range),
+                METRICS_KEYWORD: running.result(),
+                PLOT_KEYWORD: plot,
+            }
+        ]
+
+
+def _merge_metrics(slice_metrics, batch_metrics, fold, metrics):
+    """Combine the per fold metrics with the batch ones keeping the metrics order."""
+    return {
+        metric_name: float(batch_metrics[metric_name][fold])
+        if metric_name in batch_metrics
+        else slice_metrics[metric_name]
+        for metric_name in metrics
+    }
+
 
 def aggregate_rv(
     aggregation: Union[bool, Dict], result_values: List[Dict[str, Any]],
@@ -285,17 +579,29 @@ def aggregate_rv(
         plot and the different aggregation functions per metric.
     """
     metric_aggregation = DEFAULT_METRIC_AGGREGATION
-    aggregated_plot = result_values[-1][PLOT_KEYWORD]
+    aggregated_plot = result_values[-1].get(PLOT_KEYWORD)
     if isinstance(aggregation, Mapping):
         if METRICS_KEYWORD in aggregation:
             metric_aggregation = aggregation[METRICS_KEYWORD]
         if PLOT_KEYWORD in aggregation:
-            aggregated_plot = result_values[aggregation[PLOT_KEYWORD]][PLOT_KEYWORD]
+            aggregated_plot = result_values[aggregation[PLOT_KEYWORD]].get(PLOT_KEYWORD)
 
-    metrics_to_aggregate: Dict[str, List] = {}
-    for split_result in result_values:
-        for metric, value in split_result[METRICS_KEYWORD].items():
-            metrics_to_aggregate.setdefault(metric, []).append(value)
+    # Metrics missing from some folds are NaN there, so they are skipped.
+    metric_names = dict.fromkeys(
+        metric
+        for split_result in result_values
+        for metric in split_result[METRICS_KEYWORD]
+    )
+    metrics_to_aggregate = {
+        metric: np.array(
+            [
+                split_result[METRICS_KEYWORD].get(metric, np.nan)
+                for split_result in result_values
+            ],
+            dtype=np.float64,
+        )
+        for metric in metric_names
+    }
 
     aggregated_metrics = {
         metric: {
@@ -336,4 +642,50 @@ def compute_metrics(y_true, y_pred, metrics):
     -------
     dict
         Performance metric and its value"""
-    return {metric_name: func(y_true, y_pred) for metric_name, func in metrics.items()}
+    return {
+        metric_name: func(y_true, y_pred)
+        for metric_name, func in metrics.items()
+        if callable(func)
+    }
+
+
+def compute_folds_metrics(y_trues, y_preds, y_trains, metrics):
+    """
+    Vectorized computation of the named metrics for all the folds at once.
+
+    Parameters
+    ----------
+    y_trues: list of array-like
+        True values of each fold.
+    y_preds: list of array-like
+        Predicted values of each fold.
+    y_trains: list of array-like
+        Training values of each fold, used to scale MASE.
+    metrics: dict
+        Metrics by name, only the ones given as a BATCH_METRICS name are computed.
+
+    Returns
+    -------
+    dict
+        Performance metric and an array with its value for each fold.
+    """
+    names = {
+        metric_name: func
+        for metric_name, func in metrics.items()
+        if isinstance(func, str)
+    }
+    if not names or not y_trues:
+        return {}
+    width = max(len(y) for y in list(y_trues) + list(y_preds))
+    y_true, true_mask = stack_ragged(y_trues, width=width)
+    y_pred, pred_mask = stack_ragged(y_preds, width=width)
+    y_train, train_mask = stack_ragged(y_trains)
+    values = compute_batch_metrics(
+        y_true,
+        y_pred,
+        true_mask & pred_mask,
+        metrics=set(names.values()),
+        y_train=y_train,
+        train_mask=train_mask,
+    )
+    return {metric_name: values[func] for metric_name, func in names.items()}
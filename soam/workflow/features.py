@@ -0,0 +1,201 @@
+"""
+Features
+--------
+Lag, rolling window and calendar regressors for many series at once.
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from soam.constants import DS_COL, Y_COL
+from soam.workflow.transformer import StatelessDataFrameTransformer
+
+ROLLING_STATS = {
+    "mean": np.nanmean,
+    "std": lambda windows, axis: np.nanstd(windows, axis=axis, ddof=1),
+    "min": np.nanmin,
+    "max": np.nanmax,
+}
+CALENDAR_FEATURES = (
+    "year",
+    "quarter",
+    "month",
+    "day",
+    "dayofweek",
+    "dayofyear",
+    "hour",
+)
+
+
+def lag_values(values: np.ndarray, starts: np.ndarray, lag: int) -> np.ndarray:
+    """
+    Lag values that are grouped in contiguous series.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values sorted by series and date.
+    starts : np.ndarray
+        Position of the first value of each value's series.
+    lag : int
+        Number of positions to lag.
+
+    Returns
+    -------
+    np.ndarray
+        The lagged values, NaN where the lag falls before the series start.
+    """
+    source = np.arange(len(values)) - lag
+    return np.where(source >= starts, values[np.maximum(source, 0)], np.nan)
+
+
+def rolling_windows(
+    values: np.ndarray, starts: np.ndarray, window: int, shift: int = 0
+) -> np.ndarray:
+    """
+    Windows of the values ending `shift` positions before each one.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values sorted by series and date.
+    starts : np.ndarray
+        Position of the first value of each value's series.
+    window : int
+        Length of each window.
+    shift : int, optional
+        Positions between each value and the end of its window, by default 0
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (len(values), window), positions outside the series
+        are NaN.
+    """
+    pad = window - 1 + shift
+    padded = np.concatenate([np.full(pad, np.nan), values.astype(np.float64)])
+    windows = sliding_window_view(padded, window)[: len(values)]
+    source = (np.arange(len(values)) - pad)[:, np.newaxis] + np.arange(window)
+    return np.where(source >= starts[:, np.newaxis], windows, np.nan)
+
+
+class LagFeatures(StatelessDataFrameTransformer):
+    """
+    Add lag, rolling window and calendar regressors to a long format frame.
+
+    Features of every series are computed at once over NumPy arrays. Lags and
+    windows only use values at least `horizon` periods old, so the future rows
+    of a frame with `horizon` future dates appended, as fed to the Forecaster,
+    get features built from observed values only.
+    """
+
+    def __init__(
+        self,
+        lags: Sequence[int] = (),
+        windows: Sequence[int] = (),
+        window_stats: Sequence[str] = ("mean",),
+        calendar: Sequence[str] = (),
+        horizon: int = 1,
+        min_periods: Optional[int] = None,
+        series_col: Optional[str] = None,
+        ds_col: str = DS_COL,
+        y_col: str = Y_COL,
+    ):  # pylint: disable=super-init-not-called
+        """
+        Parameters
+        ----------
+        lags : list of int, optional
+            Lags of the response, each at least `horizon`.
+        windows : list of int, optional
+            Lengths of the rolling windows, each one ends `horizon` periods
+            before the row.
+        window_stats : list of str, optional
+            Statistics of each window, from "mean", "std", "min" and "max",
+            by default ("mean",)
+        calendar : list of str, optional
+            Date attributes added as features, from CALENDAR_FEATURES.
+        horizon : int, optional
+            Number of periods forecasted, by default 1
+        min_periods : int, optional
+            Observations needed in a window, at least 1, by default the window
+            length.
+        series_col : str, optional
+            Column identifying each series, None for a single series.
+        ds_col : str, optional
+            Date column name, by default DS_COL
+        y_col : str, optional
+            Response column name, by default Y_COL
+        """
+        if any(lag < horizon for lag in lags):
+            raise ValueError(
+                "Lags shorter than the horizon are unknown for the future dates."
+            )
+        if min_periods is not None and min_periods < 1:
+            raise ValueError("min_periods must be at least 1.")
+        unknown = (set(window_stats) - set(ROLLING_STATS)) | (
+            set(calendar) - set(CALENDAR_FEATURES)
+        )
+        if unknown:
+            raise ValueError(f"Unknown features {unknown}.")
+        self.lags = lags
+        self.windows = windows
+        self.window_stats = window_stats
+        self.calendar = calendar
+        self.horizon = horizon
+        self.min_periods = min_periods
+        self.series_col = series_col
+        self.ds_col = ds_col
+        self.y_col = y_col
+
+    def feature_names(self) -> List[str]:
+        """Names of the added columns, e.g. for the `extra_regressors` of a model."""
+        return (
+            [f"{self.y_col}_lag_{lag}" for lag in self.lags]
+            + [
+                f"{self.y_col}_rolling_{stat}_{window}"
+                for window in self.windows
+                for stat in self.window_stats
+            ]
+            + [f"{self.ds_col}_{attribute}" for attribute in self.calendar]
+        )
+
+    def transform(self, X, inplace=False):
+        if not inplace:
+            X = X.copy()
+        dates = X[self.ds_col].values
+        if self.series_col is None:
+            order = np.argsort(dates, kind="stable")
+            codes = np.zeros(len(X), dtype=np.int64)
+        else:
+            codes = pd.factorize(X[self.series_col])[0]
+            order = np.lexsort((dates, codes))
+        sorted_codes = codes[order]
+        is_start = np.ones(len(X), dtype=bool)
+        is_start[1:] = sorted_codes[1:] != sorted_codes[:-1]
+        starts = np.maximum.accumulate(np.where(is_start, np.arange(len(X)), 0))
+        values = X[self.y_col].to_numpy(dtype=np.float64)[order]
+
+        features = {}
+        for lag in self.lags:
+            features[f"{self.y_col}_lag_{lag}"] = lag_values(values, starts, lag)
+        for window in self.windows:
+            windows = rolling_windows(values, starts, window, shift=self.horizon)
+            enough = np.sum(~np.isnan(windows), axis=1) >= (self.min_periods or window)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                for stat in self.window_stats:
+                    with_stat = np.full(len(values), np.nan)
+                    with_stat[enough] = ROLLING_STATS[stat](windows[enough], axis=1)
+                    features[f"{self.y_col}_rolling_{stat}_{window}"] = with_stat
+
+        # Back to the input row order.
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        for name, feature in features.items():
+            X[name] = feature[position]
+        if self.calendar:
+            ds = pd.to_datetime(X[self.ds_col]).dt
+            for attribute in self.calendar:
+                X[f"{self.ds_col}_{attribute}"] = getattr(ds, attribute).values
+        return X
@@ -17,6 +17,8 @@ if TYPE_CHECKING:
 class Forecaster(Step):
     """Forecaster Task."""
 
+    checkpointable = True
+
     def __init__(  # type: ignore
         self,
         model,
@@ -24,6 +26,7 @@ class Forecaster(Step):
         output_length: int = 1,
         ds_col: str = DS_COL,
         response_col: str = Y_COL,
+        lean: bool = False,
         **kwargs,
     ):
         """
@@ -41,6 +44,11 @@ class Forecaster(Step):
             The date column name of the input time series DataFrame, by default DS_COL
         response_col : str, optional
             The y column name of the input time series DataFrame, by default Y_COL
+        lean : bool, optional
+            Copy the input only once, by default False.
+            The sort is skipped when the dates are already monotonic, the
+            regressors are copied once, train and predict sets are row slices of
+            them, and neither the input nor the prediction are kept on the task.
         """
         super().__init__(**kwargs)
         if savers is not None:
@@ -51,7 +59,13 @@ class Forecaster(Step):
         self.output_length = output_length
         self.ds_col = ds_col
         self.response_col = response_col
+        self.lean = lean
+
+        self.time_series = pd.DataFrame()
+        self.prediction = pd.DataFrame()
 
+    def _reset_run_state(self):
+        super()._reset_run_state()
         self.time_series = pd.DataFrame()
         self.prediction = pd.DataFrame()
 
@@ -75,18 +89,57 @@ class Forecaster(Step):
             1 : Provided Time Series data (untouched).
             2 : Trained model.
         """
-        self.time_series = time_series.copy()
+        if self.lean:
+            X, y = self._format_input_lean(time_series)
+        else:
+            self.time_series = time_series.copy()
+            X, y = self._format_input(time_series)
 
-        X, y = self._format_input(time_series)
-
-        X_train = X[: -self.output_length]
-        X_pred = X[-self.output_length :]
-        y_train = y[: -self.output_length]
+        X_train = X.iloc[: -self.output_length]
+        X_pred = X.iloc[-self.output_length :]
+        y_train = y.iloc[: -self.output_length]
 
         self.model.fit(X_train, y_train)
-        self.prediction = self.model.predict(X_pred)
+        prediction = self.model.predict(X_pred)
+        if self.lean:
+            return prediction, time_series, self.model
+        self.prediction = prediction
         return self.prediction, self.time_series, self.model
 
+    def _check_input(self, time_series: pd.DataFrame):
+        if self.ds_col not in time_series.columns:
+            raise ValueError(f"{self.ds_col} not present Time Series columns.")
+        if self.response_col not in time_series.columns:
+            raise ValueError(f"{self.response_col} not present Time Series columns.")
+
+    def _format_input_lean(
+        self, time_series: pd.DataFrame
+    ) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Split the time series into regressors and response copying it once.
+
+        Selecting the regressors copies them, while unsorted time series are
+        copied by sorting and the response is popped out of the copy.
+
+        Parameters
+        ----------
+        time_series : pandas.DataFrame
+
+        Returns
+        -------
+        pandas.DataFrame
+            Formatted DataFrame
+        """
+        self._check_input(time_series)
+        if time_series[self.ds_col].is_monotonic_increasing:
+            regressors = [
+                col for col in time_series.columns if col != self.response_col
+            ]
+            return time_series[regressors], time_series[self.response_col]
+        time_series = time_series.sort_values(by=self.ds_col)
+        y = time_series.pop(self.response_col)
+        return time_series, y
+
     def _format_input(
         self, time_series: pd.DataFrame
     ) -> Tuple[pd.DataFrame, pd.Series]:
@@ -102,10 +155,7 @@ class Forecaster(Step):
         pandas.DataFrame
             Formatted DataFrame
         """
-        if self.ds_col not in time_series.columns:
-            raise ValueError(f"{self.ds_col} not present Time Series columns.")
-        if self.response_col not in time_series.columns:
-            raise ValueError(f"{self.response_col} not present Time Series columns.")
+        self._check_input(time_series)
         time_series = time_series.sort_values(by=self.ds_col)
         return (
             time_series.drop(self.response_col, axis=1),
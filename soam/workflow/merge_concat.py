@@ -13,6 +13,8 @@ from soam.core import Step
 
 
 class MergeConcat(Step):
+    checkpointable = True
+
     def __init__(
         self, keys: Union[str, List[str], None] = None, **kwargs,
     ):
@@ -0,0 +1,251 @@
+"""
+Vectorized forecasting metrics.
+
+Metrics are computed over the last axis of stacked arrays, so every fold (and
+series) of a backtest is evaluated in a single call. Ragged folds are padded
+and a boolean mask flags the valid observations.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAE = "mae"
+MSE = "mse"
+RMSE = "rmse"
+MAPE = "mape"
+SMAPE = "smape"
+MASE = "mase"
+BIAS = "bias"
+DEFAULT_BATCH_METRICS = (MAE, RMSE, MAPE, SMAPE, MASE, BIAS)
+EPSILON = np.finfo(np.float64).eps
+
+
+def stack_ragged(
+    sequences: Iterable[Sequence[float]],
+    shape: Optional[Tuple[int, ...]] = None,
+    width: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack 1-D sequences of different lengths into a padded 2-D array.
+
+    Parameters
+    ----------
+    sequences: iterable of array-like
+        The values of each fold, for panels flatten series and folds.
+    shape: tuple of int, optional
+        Leading shape to reshape the stacked sequences to, e.g.
+        `(n_series, n_folds)`.
+    width: int, optional
+        Length to pad to, defaults to the longest sequence.
+
+    Returns
+    -------
+    values, mask: np.ndarray
+        Values padded with NaN and the mask of valid observations, both with
+        shape `shape + (width,)`.
+    """
+    arrays = [np.asarray(seq, dtype=np.float64).ravel() for seq in sequences]
+    lengths = np.array([len(arr) for arr in arrays], dtype=int)
+    if width is None:
+        width = int(lengths.max()) if len(arrays) else 0
+    elif len(arrays) and lengths.max() > width:
+        raise ValueError(f"Sequences longer than width {width}.")
+    mask = np.arange(width) < lengths[:, None]
+    values = np.full(mask.shape, np.nan)
+    if len(arrays):
+        values[mask] = np.concatenate(arrays)
+    mask &= ~np.isnan(values)
+    if shape is not None:
+        values = values.reshape(shape + (width,))
+        mask = mask.reshape(shape + (width,))
+    return values, mask
+
+
+def _masked_mean(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    count = mask.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(mask, values, 0.0).sum(axis=-1) / count
+
+
+def _mae(y, yhat, mask, scale):  # pylint: disable=unused-argument
+    return _masked_mean(np.abs(yhat - y), mask)
+
+
+def _mse(y, yhat, mask, scale):  # pylint: disable=unused-argument
+    return _masked_mean((yhat - y) ** 2, mask)
+
+
+def _rmse(y, yhat, mask, scale):
+    return np.sqrt(_mse(y, yhat, mask, scale))
+
+
+def _mape(y, yhat, mask, scale):  # pylint: disable=unused-argument
+    # Same convention as sklearn.metrics.mean_absolute_percentage_error.
+    return _masked_mean(np.abs(yhat - y) / np.maximum(np.abs(y), EPSILON), mask)
+
+
+def _smape(y, yhat, mask, scale):  # pylint: disable=unused-argument
+    denominator = np.abs(y) + np.abs(yhat)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(denominator > 0, 2 * np.abs(yhat - y) / denominator, 0.0)
+    return _masked_mean(ratio, mask)
+
+
+def _mase(y, yhat, mask, scale):
+    if scale is None:
+        raise ValueError("MASE requires the training values, pass y_train.")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _mae(y, yhat, mask, scale) / scale
+
+
+def _bias(y, yhat, mask, scale):  # pylint: disable=unused-argument
+    return _masked_mean(yhat - y, mask)
+
+
+BATCH_METRICS: Dict[str, Callable] = {
+    MAE: _mae,
+    MSE: _mse,
+    RMSE: _rmse,
+    MAPE: _mape,
+    SMAPE: _smape,
+    MASE: _mase,
+    BIAS: _bias,
+}
+
+
+def naive_scale(
+    y_train: np.ndarray, train_mask: Optional[np.ndarray] = None, season: int = 1
+) -> np.ndarray:
+    """
+    Mean absolute error of the seasonal naive forecast in-sample, used by MASE.
+
+    Parameters
+    ----------
+    y_train: np.ndarray
+        Training values, observations on the last axis.
+    train_mask: np.ndarray, optional
+        Valid training observations, defaults to the non NaN values.
+    season: int
+        Seasonal lag of the naive forecast, 1 for the plain naive forecast.
+
+    Returns
+    -------
+    np.ndarray
+        Scale with the leading shape of y_train.
+    """
+    y_train = np.asarray(y_train, dtype=np.float64)
+    if train_mask is None:
+        train_mask = ~np.isnan(y_train)
+    diffs = np.abs(y_train[..., season:] - y_train[..., :-season])
+    valid = train_mask[..., season:] & train_mask[..., :-season]
+    return _masked_mean(diffs, valid)
+
+
+def compute_batch_metrics(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    mask: Optional[np.ndarray] = None,
+    metrics: Iterable[str] = DEFAULT_BATCH_METRICS,
+    y_train: Optional[np.ndarray] = None,
+    train_mask: Optional[np.ndarray] = None,
+    season: int = 1,
+) -> Dict[str, np.ndarray]:
+    """
+    Compute metrics for every fold and series in one vectorized call.
+
+    Parameters
+    ----------
+    y_true: np.ndarray
+        True values, observations on the last axis, e.g. `(n_series, n_folds, horizon)`.
+    y_pred: np.ndarray
+        Predicted values with the same shape as y_true.
+    mask: np.ndarray, optional
+        Valid observations, defaults to the positions where both are not NaN.
+    metrics: iterable of str
+        Names of the metrics to compute, see BATCH_METRICS.
+    y_train: np.ndarray, optional
+        Training values with the same leading shape, only needed for MASE.
+    train_mask: np.ndarray, optional
+        Valid training observations.
+    season: int
+        Seasonal lag for the MASE scale.
+
+    Returns
+    -------
+    dict of str and np.ndarray
+        Each metric with the leading shape of y_true, NaN where a fold has no
+        valid observations.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    if y_true.shape != y_pred.shape:
+        raise ValueError(
+            f"y_true and y_pred shapes differ: {y_true.shape} != {y_pred.shape}."
+        )
+    valid = ~np.isnan(y_true) & ~np.isnan(y_pred)
+    mask = valid if mask is None else np.asarray(mask, dtype=bool) & valid
+
+    metrics = tuple(metrics)
+    unknown = set(metrics) - set(BATCH_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}.")
+    scale = (
+        naive_scale(y_train, train_mask, season)
+        if y_train is not None and MASE in metrics
+        else None
+    )
+    return {name: BATCH_METRICS[name](y_true, y_pred, mask, scale) for name in metrics}
+
+
+class RunningAggregation:
+    """
+    Incremental mean, min and max of the fold metrics.
+
+    Keeps a constant amount of state regardless of the number of folds. Like
+    `np.nanmean`, `np.nanmax` and `np.nanmin`, NaN values are skipped and each
+    metric is averaged over the folds where it is defined.
+    """
+
+    AGGREGATIONS = ("avg", "max", "min")
+
+    def __init__(self):
+        self.count = 0
+        self._counts: Dict[str, np.ndarray] = {}
+        self._mean: Dict[str, np.ndarray] = {}
+        self._max: Dict[str, np.ndarray] = {}
+        self._min: Dict[str, np.ndarray] = {}
+
+    def update(self, metrics: Dict[str, Any]):
+        """Add the metrics of one fold."""
+        self.count += 1
+        for name, value in metrics.items():
+            value = np.asarray(value, dtype=np.float64)
+            if name not in self._mean:
+                self._counts[name] = np.zeros(value.shape)
+                self._mean[name] = np.zeros(value.shape)
+                self._max[name] = np.full(value.shape, np.nan)
+                self._min[name] = np.full(value.shape, np.nan)
+            defined = ~np.isnan(value)
+            self._counts[name] = counts = self._counts[name] + defined
+            delta = np.where(defined, value - self._mean[name], 0.0)
+            self._mean[name] = self._mean[name] + delta / np.maximum(counts, 1)
+            self._max[name] = np.fmax(self._max[name], value)
+            self._min[name] = np.fmin(self._min[name], value)
+
+    def result(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns
+        -------
+        dict
+            For each metric, a dict with its avg, max and min.
+        """
+        return {
+            name: {
+                "avg": np.where(
+                    self._counts[name] > 0, self._mean[name], np.nan
+                ).tolist(),
+                "max": self._max[name].tolist(),
+                "min": self._min[name].tolist(),
+            }
+            for name in self._mean
+        }
@@ -0,0 +1,359 @@
+"""
+Parameter Search
+----------------
+Forecaster Task that tunes a model's parameters by backtesting them.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+import os
+import threading
+from typing import (  # pylint:disable=unused-import
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, clone
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+from soam.constants import DS_COL, Y_COL
+from soam.core import Step
+from soam.workflow.auto_forecaster import score_fold
+from soam.workflow.backtester import BacktestFold, prepare_backtest_folds
+from soam.workflow.forecaster import Forecaster
+from soam.workflow.transformer import Transformer
+
+logger = logging.getLogger(__name__)
+
+GRID = "grid"
+RANDOM = "random"
+BAYESIAN = "bayesian"
+PARAMS_COL = "params"
+SCORE_COL = "score"
+N_FOLDS_COL = "n_folds"
+PRUNED_COL = "pruned"
+
+
+def _is_numeric(values) -> bool:
+    return all(
+        isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+        for value in values
+    )
+
+
+def _params_key(params: Mapping[str, Any]) -> str:
+    """Hashable key identifying a parameter set."""
+    return repr(sorted(params.items()))
+
+
+def _parzen_log_density(x: np.ndarray, observed: np.ndarray, bandwidth: float):
+    """Log density of x under a Gaussian kernel estimator on observed."""
+    z = (x[:, np.newaxis] - observed[np.newaxis, :]) / bandwidth
+    density = np.exp(-0.5 * z ** 2).mean(axis=1) / (bandwidth * np.sqrt(2 * np.pi))
+    return np.log(density + 1e-12)
+
+
+class ParameterSearch(Step):
+    """
+    Tune the parameters of a model by backtesting them.
+
+    Supports an exhaustive grid, random sampling and a Bayesian search with a
+    tree structured Parzen estimator. The folds are preprocessed once and shared
+    by every trial. Trials run in parallel threads and each one is evaluated
+    fold by fold. A trial is stopped as soon as its accumulated error exceeds
+    the total error of the best finished trial, because its mean can no longer
+    beat it.
+    """
+
+    checkpointable = True
+
+    def __init__(  # type: ignore
+        self,
+        model: BaseEstimator,
+        param_space: Mapping[str, Any],
+        method: str = RANDOM,
+        n_trials: int = 20,
+        output_length: int = 1,
+        test_window: Optional[int] = None,
+        train_window: Optional[int] = None,
+        step_size: Optional[int] = None,
+        preprocessor: Optional[Transformer] = None,
+        metric: Union[str, Callable] = "mae",
+        early_stopping: bool = True,
+        n_jobs: Optional[int] = None,
+        n_startup_trials: int = 5,
+        n_ei_candidates: int = 24,
+        gamma: float = 0.25,
+        random_state: Optional[int] = None,
+        ds_col: str = DS_COL,
+        response_col: str = Y_COL,
+        **kwargs,
+    ):
+        """
+        Parameters
+        ----------
+        model : scikit-learn.base.BaseEstimator
+            Model whose parameters are tuned with `set_params`.
+        param_space : dict
+            Parameter names mapped to a list of values, or for random and
+            Bayesian searches to a scipy.stats distribution.
+        method : str, optional
+            "grid", "random" or "bayesian", by default "random"
+        n_trials : int, optional
+            Trials of the random and Bayesian searches, by default 20. A grid
+            search evaluates every combination.
+        output_length : int, optional
+            The length of the output to predict, by default 1
+        test_window : int, optional
+            Length of each backtest test set, by default output_length
+        train_window : int, optional
+            Length of each backtest train set, None for expanding windows.
+        step_size : int, optional
+            Distance between successive backtest test sets, by default test_window
+        preprocessor : soam.workflow.Transformer, optional
+            Transformer fitted on each backtest train set.
+        metric : str or callable, optional
+            Error whose absolute value is minimized, a BATCH_METRICS name or a
+            sklearn like metric, by default "mae"
+        early_stopping : bool, optional
+            Stop trials that can no longer beat the best one, by default True
+        n_jobs : int, optional
+            Trials evaluated in parallel, by default the executor default.
+        n_startup_trials : int, optional
+            Random trials before the Bayesian search starts modelling, by default 5
+        n_ei_candidates : int, optional
+            Samples ranked by the Bayesian search to suggest each trial,
+            by default 24
+        gamma : float, optional
+            Fraction of the trials considered good by the Bayesian search,
+            by default 0.25
+        random_state : int, optional
+            Seed of the random and Bayesian searches.
+        ds_col : str, optional
+            The date column name, by default DS_COL
+        response_col : str, optional
+            The y column name, by default Y_COL
+        """
+        super().__init__(**kwargs)
+        if method not in (GRID, RANDOM, BAYESIAN):
+            raise ValueError(f"Unknown search method {method}.")
+        self.model = model
+        self.param_space = param_space
+        self.method = method
+        self.n_trials = n_trials
+        self.output_length = output_length
+        self.test_window = test_window
+        self.train_window = train_window
+        self.step_size = step_size
+        self.preprocessor = preprocessor
+        self.metric = metric
+        self.early_stopping = early_stopping
+        self.n_jobs = n_jobs
+        self.n_startup_trials = n_startup_trials
+        self.n_ei_candidates = n_ei_candidates
+        self.gamma = gamma
+        self.random_state = random_state
+        self.ds_col = ds_col
+        self.response_col = response_col
+
+        self.trials = pd.DataFrame()
+
+    def _reset_run_state(self):
+        super()._reset_run_state()
+        self.trials = pd.DataFrame()
+
+    def run(  # type: ignore
+        self, time_series: pd.DataFrame, folds: Optional[List[BacktestFold]] = None,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame, object]:
+        """
+        Search the best parameters on the history and forecast with them.
+
+        Parameters
+        ----------
+        time_series : pd.DataFrame
+            History followed by `output_length` future dates, as for Forecaster.
+        folds : list of BacktestFold, optional
+            Precomputed folds to share with other steps, see
+            soam.workflow.backtester.prepare_backtest_folds.
+
+        Returns
+        -------
+        tuple(pandas.DataFrame, pandas.DataFrame, model)
+            0 : Predicted Values DataFrame.
+            1 : Provided Time Series data.
+            2 : Model trained with the best parameters.
+        """
+        if folds is None:
+            folds = prepare_backtest_folds(
+                time_series.iloc[: -self.output_length],
+                self.test_window or self.output_length,
+                self.train_window,
+                self.step_size,
+                self.preprocessor,
+            )
+        if not folds:
+            raise ValueError("The time series is too short to backtest.")
+
+        self.trials = self.search(folds)
+        best_params = self.trials[PARAMS_COL].iloc[0]
+        logger.info(f"Best parameters: {best_params}")
+        forecaster = Forecaster(
+            model=clone(self.model).set_params(**best_params),
+            output_length=self.output_length,
+            ds_col=self.ds_col,
+            response_col=self.response_col,
+        )
+        return forecaster.run(time_series)
+
+    def search(self, folds: List[BacktestFold]) -> pd.DataFrame:
+        """
+        Evaluate parameter sets on the folds.
+
+        Parameters
+        ----------
+        folds : list of BacktestFold
+            Preprocessed folds shared by every trial.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per trial with its parameters, mean error, number of folds
+            evaluated and whether it was stopped early, sorted from best to worst.
+        """
+        rng = np.random.default_rng(self.random_state)
+        state = {"best_total": np.inf, "lock": threading.Lock()}
+        trials: List[Dict[str, Any]] = []
+
+        # Bayesian trials are suggested in batches of as many as run at once.
+        batch_size = self.n_jobs or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            batches: List[Optional[List[Dict[str, Any]]]]
+            if self.method == GRID:
+                batches = [list(ParameterGrid(self.param_space))]
+            else:
+                batches = [None] * math.ceil(self.n_trials / batch_size)
+
+            remaining = self.n_trials
+            for batch in batches:
+                if batch is None:
+                    size = min(batch_size, remaining)
+                    batch = self._suggest(trials, size, rng)
+                    remaining -= size
+                trials.extend(
+                    executor.map(
+                        lambda params: self._evaluate(params, folds, state), batch
+                    )
+                )
+
+        rv = pd.DataFrame(
+            trials, columns=[PARAMS_COL, SCORE_COL, N_FOLDS_COL, PRUNED_COL]
+        )
+        return rv.sort_values(SCORE_COL, kind="stable").reset_index(drop=True)
+
+    def _evaluate(self, params, folds, state) -> Dict[str, Any]:
+        """Score a parameter set fold by fold, stopping once it can't win."""
+        model = clone(self.model).set_params(**params)
+        total = 0.0
+        for n_folds, fold in enumerate(folds, start=1):
+            total += score_fold(
+                model, fold, self.metric, self.ds_col, self.response_col
+            )
+            if (
+                self.early_stopping
+                and n_folds < len(folds)
+                and total > state["best_total"]
+            ):
+                logger.debug(f"Stopped {params} after {n_folds} folds.")
+                return {
+                    PARAMS_COL: params,
+                    SCORE_COL: np.inf,
+                    N_FOLDS_COL: n_folds,
+                    PRUNED_COL: True,
+                }
+        with state["lock"]:
+            state["best_total"] = min(state["best_total"], total)
+        return {
+            PARAMS_COL: params,
+            SCORE_COL: total / len(folds),
+            N_FOLDS_COL: len(folds),
+            PRUNED_COL: False,
+        }
+
+    def _suggest(self, trials, size, rng) -> List[Dict[str, Any]]:
+        """Next parameter sets of a random or Bayesian search."""
+        seed = int(rng.integers(2 ** 31))
+        seen = {_params_key(trial[PARAMS_COL]) for trial in trials}
+        finished = [
+            trial
+            for trial in trials
+            if not trial[PRUNED_COL] and np.isfinite(trial[SCORE_COL])
+        ]
+        if self.method == RANDOM or len(finished) < self.n_startup_trials:
+            return self._sample_unseen(size, seed, seen)[:size]
+
+        # Tree structured Parzen estimator: rank prior samples by how much more
+        # likely they are under the good trials than under the rest.
+        finished = sorted(finished, key=lambda trial: trial[SCORE_COL])
+        n_good = max(1, math.ceil(self.gamma * len(finished)))
+        good = [trial[PARAMS_COL] for trial in finished[:n_good]]
+        bad = [trial[PARAMS_COL] for trial in finished[n_good:]] or good
+        # Pruned trials are known to be worse than the incumbent.
+        bad += [trial[PARAMS_COL] for trial in trials if trial[PRUNED_COL]]
+        candidates = self._sample_unseen(max(self.n_ei_candidates, size), seed, seen)
+        if not candidates:
+            return []
+
+        score = np.zeros(len(candidates))
+        for name in self.param_space:
+            values = [candidate[name] for candidate in candidates]
+            good_values = [params[name] for params in good]
+            bad_values = [params[name] for params in bad]
+            if _is_numeric(values + good_values + bad_values):
+                observed = np.asarray(good_values + bad_values, dtype=float)
+                bandwidth = max(np.std(observed) * len(observed) ** -0.2, 1e-12)
+                x = np.asarray(values, dtype=float)
+                good_x = np.asarray(good_values, dtype=float)
+                bad_x = np.asarray(bad_values, dtype=float)
+                score += _parzen_log_density(
+                    x, good_x, bandwidth
+                ) - _parzen_log_density(x, bad_x, bandwidth)
+            else:
+                keys = [repr(value) for value in values]
+                good_keys = [repr(value) for value in good_values]
+                bad_keys = [repr(value) for value in bad_values]
+                score += np.log(
+                    [(good_keys.count(key) + 1) / (len(good_keys) + 1) for key in keys]
+                ) - np.log(
+                    [(bad_keys.count(key) + 1) / (len(bad_keys) + 1) for key in keys]
+                )
+        best = np.argsort(-score, kind="stable")[:size]
+        return [candidates[i] for i in best]
+
+    def _sample_unseen(self, size, seed, seen) -> List[Dict[str, Any]]:
+        """
+        Sample parameter sets that weren't evaluated yet, without repeating them.
+
+        Draws as many extra samples as parameter sets were seen, so fewer than
+        size are only returned once the space is almost exhausted.
+        """
+        with warnings.catch_warnings():
+            # Finite spaces smaller than the draw are returned whole.
+            warnings.simplefilter("ignore", UserWarning)
+            samples = ParameterSampler(
+                self.param_space, size + len(seen), random_state=seed
+            )
+            unseen: Dict[str, Dict[str, Any]] = {}
+            for params in samples:
+                key = _params_key(params)
+                if key not in seen:
+                    unseen.setdefault(key, params)
+        return list(unseen.values())
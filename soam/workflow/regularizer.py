@@ -0,0 +1,308 @@
+"""
+Regularizer
+-----------
+Reindex long format frames of many series onto regular date grids.
+"""
+import logging
+from typing import Dict, Hashable, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from soam.constants import DS_COL
+from soam.utilities.utils import FREQUENCY_SAMPLE_SIZE, infer_frequency
+from soam.workflow.transformer import BaseDataFrameTransformer
+
+logger = logging.getLogger(__name__)
+
+# pylint: disable=attribute-defined-outside-init
+
+FILL_NAN = "nan"
+FILL_ZERO = "zero"
+FILL_FFILL = "ffill"
+FILL_BFILL = "bfill"
+FILL_LINEAR = "linear"
+FILL_POLICIES = (FILL_NAN, FILL_ZERO, FILL_FFILL, FILL_BFILL, FILL_LINEAR)
+_SERIES_COL = "__series__"
+
+
+def infer_series_frequencies(
+    df: pd.DataFrame,
+    series_col: str,
+    ds_col: str = DS_COL,
+    sample_size: int = FREQUENCY_SAMPLE_SIZE,
+) -> Dict[Hashable, Optional[str]]:
+    """
+    Infer the frequency of every series from a sample of its last dates, the
+    sample can have gaps.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Long format frame, sorted by date within each series.
+    series_col : str
+        Column identifying each series.
+    ds_col : str, optional
+        Date column name, by default DS_COL
+    sample_size : int, optional
+        Trailing dates inspected per series, by default FREQUENCY_SAMPLE_SIZE
+
+    Returns
+    -------
+    dict
+        Series mapped to their pandas frequency string, None when it could not
+        be inferred.
+    """
+    sample = df.groupby(series_col, sort=False)[ds_col].tail(sample_size)
+    sample = df.loc[sample.index, [series_col, ds_col]].sort_values(
+        [series_col, ds_col], kind="stable"
+    )
+    return {
+        key: infer_frequency(dates.values, sample_size, allow_gaps=True)
+        for key, dates in sample.groupby(series_col, sort=False)[ds_col]
+    }
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of the ranges start, start + 1, ... of each length."""
+    first = np.cumsum(lengths) - lengths
+    return np.repeat(starts - first, lengths) + np.arange(lengths.sum())
+
+
+def regular_index(
+    starts: pd.Series,
+    ends: pd.Series,
+    frequencies: Mapping[Hashable, str],
+    names=(_SERIES_COL, DS_COL),
+) -> pd.MultiIndex:
+    """
+    Build the (series, date) index of every series regular date grid.
+
+    Series sharing a frequency and aligned to a common grid are expanded at
+    once with NumPy, the others get their own date range.
+
+    Parameters
+    ----------
+    starts : pd.Series
+        First date of each series, indexed by series.
+    ends : pd.Series
+        Last date of each series, indexed by series.
+    frequencies : dict
+        Frequency of each series.
+    names : tuple of str, optional
+        Names of the index levels.
+
+    Returns
+    -------
+    pd.MultiIndex
+        The grid of every series, series in the order of `starts`.
+    """
+    keys = starts.index.values
+    freq_of_key = np.array([frequencies[key] for key in keys], dtype=object)
+    key_parts, date_parts, order_parts = [], [], []
+    for frequency in pd.unique(freq_of_key):
+        members = np.flatnonzero(freq_of_key == frequency)
+        group_starts = pd.DatetimeIndex(starts.values[members])
+        group_ends = pd.DatetimeIndex(ends.values[members])
+        grid = pd.date_range(group_starts.min(), group_ends.max(), freq=frequency)
+        start_pos = grid.get_indexer(group_starts)
+        end_pos = grid.get_indexer(group_ends)
+        if (start_pos >= 0).all() and (end_pos >= 0).all():
+            lengths = end_pos - start_pos + 1
+            dates = grid[_ranges(start_pos, lengths)]
+        else:
+            ranges = [
+                pd.date_range(start, end, freq=frequency)
+                for start, end in zip(group_starts, group_ends)
+            ]
+            lengths = np.array([len(dates) for dates in ranges])
+            dates = ranges[0].append(ranges[1:])
+        key_parts.append(np.repeat(keys[members], lengths))
+        date_parts.append(dates)
+        order_parts.append(np.repeat(members, lengths))
+
+    order = np.argsort(np.concatenate(order_parts), kind="stable")
+    return pd.MultiIndex.from_arrays(
+        [
+            np.concatenate(key_parts)[order],
+            date_parts[0].append(date_parts[1:])[order],
+        ],
+        names=list(names),
+    )
+
+
+def _interpolate(values: pd.DataFrame) -> pd.DataFrame:
+    """Linear interpolation between the observations of each series."""
+    position = pd.Series(np.arange(len(values), dtype=np.float64), index=values.index)
+    rv = {}
+    for col in values:
+        column = values[col]
+        known = position.where(column.notna())
+        prev_pos = known.groupby(level=0, sort=False).ffill()
+        next_pos = known.groupby(level=0, sort=False).bfill()
+        prev_val = column.groupby(level=0, sort=False).ffill()
+        next_val = column.groupby(level=0, sort=False).bfill()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = (position - prev_pos) / (next_pos - prev_pos)
+        rv[col] = column.fillna(prev_val + weight * (next_val - prev_val))
+    return pd.DataFrame(rv, index=values.index)
+
+
+def fill_gaps(values: pd.DataFrame, policy: str) -> pd.DataFrame:
+    """
+    Fill the missing values of (series, date) indexed columns.
+
+    Parameters
+    ----------
+    values : pd.DataFrame
+        Columns indexed by series and date, sorted by date within each series.
+    policy : str
+        One of FILL_POLICIES.
+
+    Returns
+    -------
+    pd.DataFrame
+        The filled columns.
+    """
+    if policy not in FILL_POLICIES:
+        raise ValueError(f"Unknown fill policy {policy}.")
+    if policy == FILL_NAN or values.empty:
+        return values
+    if policy == FILL_ZERO:
+        return values.fillna(0)
+    if policy == FILL_LINEAR:
+        return _interpolate(values)
+    return getattr(values.groupby(level=0, sort=False), policy)()
+
+
+class TimeSeriesRegularizer(BaseDataFrameTransformer):
+    """
+    Reindex every series onto a regular date grid, fill its gaps and optionally
+    append future dates.
+
+    The frequency of each series is inferred once, when fitting, from a sample
+    of its last dates. The grids of all the series are built as one MultiIndex
+    and the frame is reindexed onto it in a single operation.
+    """
+
+    def __init__(
+        self,
+        series_col: Optional[str] = None,
+        ds_col: str = DS_COL,
+        frequency: Optional[str] = None,
+        fill: Union[str, Mapping[str, str]] = FILL_NAN,
+        periods: int = 0,
+        indicator_col: Optional[str] = None,
+        sample_size: int = FREQUENCY_SAMPLE_SIZE,
+    ):  # pylint: disable=super-init-not-called
+        """
+        Parameters
+        ----------
+        series_col : str, optional
+            Column identifying each series, None for a single series.
+        ds_col : str, optional
+            Date column name, by default DS_COL
+        frequency : str, optional
+            pandas frequency of all the series, by default inferred per series.
+        fill : str or dict, optional
+            Fill policy of the value columns, one of FILL_POLICIES, or a dict of
+            column to policy where missing columns are left with NaN,
+            by default FILL_NAN
+        periods : int, optional
+            Future dates appended to each series with NaN values, by default 0
+        indicator_col : str, optional
+            Boolean column flagging the rows added to fill gaps, not added if None.
+        sample_size : int, optional
+            Trailing dates inspected to infer each frequency,
+            by default FREQUENCY_SAMPLE_SIZE
+        """
+        self.series_col = series_col
+        self.ds_col = ds_col
+        self.frequency = frequency
+        self.fill = fill
+        self.periods = periods
+        self.indicator_col = indicator_col
+        self.sample_size = sample_size
+
+    def _with_series(self, X: pd.DataFrame):
+        if self.series_col is not None:
+            return X, self.series_col
+        return X.assign(**{_SERIES_COL: 0}), _SERIES_COL
+
+    def _infer(self, X: pd.DataFrame, series_col: str) -> Dict[Hashable, str]:
+        if self.frequency is not None:
+            return {key: self.frequency for key in pd.unique(X[series_col])}
+        frequencies = infer_series_frequencies(
+            X, series_col, self.ds_col, self.sample_size
+        )
+        unknown = [key for key, frequency in frequencies.items() if frequency is None]
+        if unknown:
+            raise ValueError(
+                f"Frequency could not be inferred for {unknown}, "
+                "please specify a frequency."
+            )
+        return {
+            key: frequency
+            for key, frequency in frequencies.items()
+            if frequency is not None
+        }
+
+    def fit(self, X, **fit_params):  # pylint:disable=unused-argument
+        """Infer the frequency of each series."""
+        X, series_col = self._with_series(X)
+        self.frequencies_ = self._infer(X, series_col)
+        return self
+
+    def transform(self, X):
+        X, series_col = self._with_series(X)
+        frequencies = dict(getattr(self, "frequencies_", {}))
+        unseen = ~X[series_col].isin(list(frequencies))
+        if unseen.any():
+            frequencies.update(self._infer(X[unseen], series_col))
+
+        indexed = X.set_index([series_col, self.ds_col])
+        if not indexed.index.is_unique:
+            raise ValueError("Series can't have repeated dates.")
+        bounds = X.groupby(series_col, sort=False)[self.ds_col].agg(["min", "max"])
+        ends = bounds["max"]
+        if self.periods:
+            ends = pd.Series(
+                [
+                    end + self.periods * to_offset(frequencies[key])
+                    for key, end in ends.items()
+                ],
+                index=ends.index,
+            )
+        index = regular_index(
+            bounds["min"], ends, frequencies, names=(series_col, self.ds_col)
+        )
+        off_grid = ~indexed.index.isin(index)
+        if off_grid.any():
+            logger.warning(f"Dropped {off_grid.sum()} rows off the regular grid.")
+
+        rv = indexed.reindex(index)
+        filled = ~index.isin(indexed.index)
+        future = np.zeros(len(index), dtype=bool)
+        if self.periods:
+            last = bounds["max"].reindex(index.get_level_values(0)).values
+            future = index.get_level_values(1).values > last
+            filled &= ~future
+
+        policies = (
+            self.fill
+            if isinstance(self.fill, Mapping)
+            else {col: self.fill for col in rv.columns}
+        )
+        for policy in set(policies.values()):
+            columns = [col for col, value in policies.items() if value == policy]
+            rv[columns] = fill_gaps(rv[columns], policy)
+        if future.any():
+            rv.loc[future, list(policies)] = np.nan
+        if self.indicator_col is not None:
+            rv[self.indicator_col] = filled
+
+        rv = rv.reset_index()
+        if self.series_col is None:
+            rv = rv.drop(columns=_SERIES_COL)
+        return rv
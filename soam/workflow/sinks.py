@@ -0,0 +1,117 @@
+"""
+Backtest result sinks.
+
+Sinks receive each backtest fold as soon as it finishes, so the Backtester
+does not need to keep the folds or their predictions in memory.
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Union
+
+import pandas as pd
+
+from soam.constants import METRICS_KEYWORD, RANGES_KEYWORD
+
+if TYPE_CHECKING:
+    from muttlib.dbconn import BaseClient
+
+FOLD_COL = "fold"
+TRAIN_START_COL = "train_start"
+TRAIN_END_COL = "train_end"
+TEST_END_COL = "test_end"
+
+
+class BacktestSink(ABC):
+    """Base class for the objects receiving the folds of a Backtester run."""
+
+    @abstractmethod
+    def write(self, fold: int, result: Dict[str, Any], predictions: pd.DataFrame):
+        """
+        Receive a finished fold.
+
+        Parameters
+        ----------
+        fold: int
+            Position of the fold in the backtest.
+        result: dict
+            The fold ranges, metrics and plot as returned by the Backtester.
+        predictions: pd.DataFrame
+            The fold predictions with the observed values.
+        """
+
+    def close(self):
+        """Called once the last fold was written."""
+
+
+class CallbackSink(BacktestSink):
+    """Forward each fold to a callable."""
+
+    def __init__(self, callback: Callable[[int, Dict[str, Any], pd.DataFrame], Any]):
+        """
+        Parameters
+        ----------
+        callback: callable
+            Called with the fold position, its result and its predictions.
+        """
+        self.callback = callback
+
+    def write(self, fold, result, predictions):
+        self.callback(fold, result, predictions)
+
+
+def _fold_frame(
+    fold: int, result: Dict[str, Any], predictions: pd.DataFrame
+) -> pd.DataFrame:
+    """Flatten a fold result and its predictions into one frame."""
+    train_start, train_end, test_end = result[RANGES_KEYWORD]
+    return predictions.assign(
+        **{
+            FOLD_COL: fold,
+            TRAIN_START_COL: train_start,
+            TRAIN_END_COL: train_end,
+            TEST_END_COL: test_end,
+        },
+        **{
+            f"{METRICS_KEYWORD}_{name}": value
+            for name, value in result[METRICS_KEYWORD].items()
+        },
+    )
+
+
+class ParquetSink(BacktestSink):
+    """Write each fold predictions and metrics to its own Parquet file."""
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Directory where a `fold_<n>.parquet` file is written per fold, read
+            them back with `pd.read_parquet(path)`.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def write(self, fold, result, predictions):
+        frame = _fold_frame(fold, result, predictions)
+        frame.to_parquet(self.path / f"{FOLD_COL}_{fold:05d}.parquet", index=False)
+
+
+class DBSink(BacktestSink):
+    """Append each fold predictions and metrics to a database table."""
+
+    def __init__(self, db_client: "BaseClient", table: str):
+        """
+        Parameters
+        ----------
+        db_client: muttlib.dbconn.BaseClient
+            Client to the database.
+        table: str
+            Table the folds are appended to.
+        """
+        self.db_client = db_client
+        self.table = table
+
+    def write(self, fold, result, predictions):
+        frame = _fold_frame(fold, result, predictions)
+        self.db_client.insert_from_frame(frame, self.table)
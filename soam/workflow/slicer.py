@@ -23,6 +23,8 @@ logger.setLevel(logging.INFO)
 
 
 class Slicer(Step):
+    checkpointable = True
+
     def __init__(
         self,
         dimensions: Union[str, List[str], None] = None,
@@ -61,10 +61,7 @@ class TimeSeriesExtractor(Step):
     build_query_kwargs: Dict[str, Any]
 
     def __init__(
-        self,
-        db: "muttlib.dbconn.BaseClient",
-        table_name: str,
-        **kwargs: Dict[str, Any],
+        self, db: "muttlib.dbconn.BaseClient", table_name: str, **kwargs: Any,
     ):
         """
         Class to handle the dataset retrieval from the PostgreSql database.
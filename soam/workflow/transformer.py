@@ -4,18 +4,29 @@ Transformer
 -----------
 """
 
+import abc
 import logging
-from typing import TYPE_CHECKING, List, Optional, Tuple  # pylint:disable=unused-import
-
+from typing import (  # pylint:disable=unused-import
+    TYPE_CHECKING,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
 import pandas as pd
 from prefect.utilities.tasks import defaults_from_attrs
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from soam.constants import Y_COL
 from soam.core import Step
 
 if TYPE_CHECKING:
     from soam.savers.savers import Saver
 
+# pylint: disable=attribute-defined-outside-init
 
 logger = logging.getLogger(__name__)
 
@@ -23,8 +34,20 @@ logger = logging.getLogger(__name__)
 class BaseDataFrameTransformer(BaseEstimator, TransformerMixin):
     """
     Provide an interface to transform pandas DataFrames.
+
+    Subclasses can declare capabilities used by TransformerPipeline, lean
+    Transformers and the backtest folds. `supports_inplace` transformers accept
+    `transform(X, inplace=True)` and `fit_transform(X, inplace=True)` and then
+    only modify X, without keeping references to it. `stateless` transformers
+    also learn nothing in `fit`.
+    `incremental` transformers implement `partial_fit(X)` to update their state
+    with rows that follow the ones they were fitted on.
     """
 
+    supports_inplace = False
+    stateless = False
+    incremental = False
+
     def fit(
         self, X: pd.DataFrame, **fit_params  # pylint:disable=unused-argument
     ) -> "BaseDataFrameTransformer":
@@ -39,7 +62,7 @@ class BaseDataFrameTransformer(BaseEstimator, TransformerMixin):
         logger.warning("Subclasses should implement this.")
         return self
 
-    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+    def transform(self, X: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
         """
         Transform method.
 
@@ -47,6 +70,9 @@ class BaseDataFrameTransformer(BaseEstimator, TransformerMixin):
         ----------
             X: pd.DataFrame
                 DataFrame to be transformed.
+            inplace: bool
+                Transform X in place, only for `supports_inplace` transformers.
+                Default is False.
 
         Raises
         ------
@@ -57,9 +83,10 @@ class BaseDataFrameTransformer(BaseEstimator, TransformerMixin):
         -------
             pd.DataFrame
         """
-        raise NotImplementedError("Subclasses should implement this.")
 
-    def fit_transform(self, X: pd.DataFrame, **fit_params) -> pd.DataFrame:
+    def fit_transform(
+        self, X: pd.DataFrame, inplace: bool = False, **fit_params
+    ) -> pd.DataFrame:
         """
         Fit Transform method.
 
@@ -67,13 +94,19 @@ class BaseDataFrameTransformer(BaseEstimator, TransformerMixin):
         ----------
             X: pd.DataFrame
                 DataFrame to be fitted and transformed.
+            inplace: bool
+                Transform X in place, only for `supports_inplace` transformers.
+                Default is False.
 
         Returns
         -------
             pd.DataFrame
                 DataFrame fitted and transformed.
         """
-        return self.fit(X, **fit_params).transform(X)
+        self.fit(X, **fit_params)
+        if inplace:
+            return self.transform(X, inplace=True)
+        return self.transform(X)
 
 
 class DummyDataFrameTransformer(BaseDataFrameTransformer):
@@ -82,6 +115,9 @@ class DummyDataFrameTransformer(BaseDataFrameTransformer):
     Returns its input without any alteration.
     """
 
+    supports_inplace = True
+    stateless = True
+
     def __init__(self):
         pass
 
@@ -117,17 +153,329 @@ class DummyDataFrameTransformer(BaseDataFrameTransformer):
         return df_X
 
 
+class StatelessDataFrameTransformer(BaseDataFrameTransformer, metaclass=abc.ABCMeta):
+    """
+    Base class of the transformers that learn nothing from the data.
+
+    Subclasses implement `transform(X, inplace=False)`.
+    """
+
+    supports_inplace = True
+    stateless = True
+
+    def fit(self, X, **fit_params):  # pylint:disable=unused-argument
+        """Nothing to learn."""
+        return self
+
+    @abc.abstractmethod
+    def transform(self, X: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """
+        Transform method.
+
+        Parameters
+        ----------
+            X: pd.DataFrame
+                DataFrame to be transformed.
+            inplace: bool
+                Whether X can be modified instead of copied. Default is False.
+
+        Returns
+        -------
+            pd.DataFrame
+        """
+
+
+class FunctionDataFrameTransformer(StatelessDataFrameTransformer):
+    """Apply a function to the DataFrame."""
+
+    def __init__(self, func, kw_args: Optional[dict] = None):
+        """
+        Parameters
+        ----------
+        func: callable
+            Receives the DataFrame, it can modify it, and returns the result.
+        kw_args: dict, optional
+            Extra keyword arguments for func.
+        """
+        self.func = func
+        self.kw_args = kw_args
+
+    def transform(self, X, inplace=False):
+        if not inplace:
+            X = X.copy()
+        return self.func(X, **(self.kw_args or {}))
+
+
+class RunningStandardScaler(BaseDataFrameTransformer):
+    """
+    Standardize columns with a mean and standard deviation that can be updated
+    with new rows, NaN are ignored.
+    """
+
+    supports_inplace = True
+    incremental = True
+
+    def __init__(self, columns: Optional[Sequence[str]] = None):
+        """
+        Parameters
+        ----------
+        columns: list of str, optional
+            Columns to scale, by default the response column.
+        """
+        self.columns = columns
+
+    def _columns(self) -> List[str]:
+        return list(self.columns or [Y_COL])
+
+    def fit(self, X, **fit_params):  # pylint:disable=unused-argument
+        """Learn the mean and standard deviation of the columns."""
+        n_columns = len(self._columns())
+        self.n_samples_seen_ = np.zeros(n_columns)
+        self.mean_ = np.zeros(n_columns)
+        self.m2_ = np.zeros(n_columns)
+        return self.partial_fit(X)
+
+    def partial_fit(self, X: pd.DataFrame) -> "RunningStandardScaler":
+        """
+        Update the statistics with new rows.
+
+        Combines the moments of the seen and new rows with Chan's parallel
+        update so only the new rows are read.
+        """
+        if not hasattr(self, "mean_"):
+            return self.fit(X)
+        values = X[self._columns()].to_numpy(dtype=np.float64)
+        count = np.sum(~np.isnan(values), axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, np.nansum(values, axis=0) / count, 0.0)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+            total = self.n_samples_seen_ + count
+            delta = mean - self.mean_
+            self.mean_ = np.where(
+                total > 0, self.mean_ + delta * count / total, self.mean_
+            )
+            self.m2_ = np.where(
+                total > 0,
+                self.m2_ + m2 + delta ** 2 * self.n_samples_seen_ * count / total,
+                self.m2_,
+            )
+        self.n_samples_seen_ = total
+        return self
+
+    @property
+    def scale_(self) -> np.ndarray:
+        """Standard deviation of each column, 1 for the constant ones."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scale = np.sqrt(self.m2_ / self.n_samples_seen_)
+        return np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+
+    def transform(self, X, inplace=False):
+        if not inplace:
+            X = X.copy()
+        columns = self._columns()
+        X[columns] = (X[columns].to_numpy(dtype=np.float64) - self.mean_) / self.scale_
+        return X
+
+    def inverse_transform(self, X, inplace=False):
+        """Undo the scaling."""
+        if not inplace:
+            X = X.copy()
+        columns = self._columns()
+        X[columns] = X[columns].to_numpy(dtype=np.float64) * self.scale_ + self.mean_
+        return X
+
+
+class RunningMinMaxScaler(BaseDataFrameTransformer):
+    """
+    Scale columns to [0, 1] with a minimum and maximum that can be updated with
+    new rows, NaN are ignored.
+    """
+
+    supports_inplace = True
+    incremental = True
+
+    def __init__(self, columns: Optional[Sequence[str]] = None):
+        """
+        Parameters
+        ----------
+        columns: list of str, optional
+            Columns to scale, by default the response column.
+        """
+        self.columns = columns
+
+    def _columns(self) -> List[str]:
+        return list(self.columns or [Y_COL])
+
+    def fit(self, X, **fit_params):  # pylint:disable=unused-argument
+        """Learn the minimum and maximum of the columns."""
+        n_columns = len(self._columns())
+        self.data_min_ = np.full(n_columns, np.nan)
+        self.data_max_ = np.full(n_columns, np.nan)
+        return self.partial_fit(X)
+
+    def partial_fit(self, X: pd.DataFrame) -> "RunningMinMaxScaler":
+        """Update the minimum and maximum with new rows."""
+        if not hasattr(self, "data_min_"):
+            return self.fit(X)
+        values = X[self._columns()].to_numpy(dtype=np.float64)
+        if len(values):
+            self.data_min_ = np.fmin(self.data_min_, np.nanmin(values, axis=0))
+            self.data_max_ = np.fmax(self.data_max_, np.nanmax(values, axis=0))
+        return self
+
+    @property
+    def data_range_(self) -> np.ndarray:
+        """Range of each column, 1 for the constant ones."""
+        data_range = self.data_max_ - self.data_min_
+        return np.where(np.isfinite(data_range) & (data_range > 0), data_range, 1.0)
+
+    def transform(self, X, inplace=False):
+        if not inplace:
+            X = X.copy()
+        columns = self._columns()
+        X[columns] = (
+            X[columns].to_numpy(dtype=np.float64) - self.data_min_
+        ) / self.data_range_
+        return X
+
+    def inverse_transform(self, X, inplace=False):
+        """Undo the scaling."""
+        if not inplace:
+            X = X.copy()
+        columns = self._columns()
+        X[columns] = (
+            X[columns].to_numpy(dtype=np.float64) * self.data_range_ + self.data_min_
+        )
+        return X
+
+
+def _apply_fused(
+    steps: List[BaseDataFrameTransformer], X: pd.DataFrame, copy: bool = True
+) -> pd.DataFrame:
+    """Apply consecutive stateless steps to a single copy of X."""
+    if copy:
+        X = X.copy()
+    for step in steps:
+        X = step.transform(X, inplace=True)
+    return X
+
+
+def _transform_stage(stage, X: pd.DataFrame, owned: bool):
+    """
+    Transform X with a pipeline stage, in place when the pipeline owns X.
+
+    Returns the transformed frame and whether the pipeline owns it.
+    """
+    if isinstance(stage, list):
+        return _apply_fused(stage, X, copy=not owned), True
+    if stage.supports_inplace:
+        return stage.transform(X, inplace=owned), True
+    rv = stage.transform(X)
+    return rv, owned or rv is not X
+
+
+class TransformerPipeline(BaseDataFrameTransformer):
+    """
+    Chain DataFrame transformers, each one fitted on the output of the previous.
+
+    Consecutive stateless steps are fused: they run on a single copy of the frame
+    and are skipped while fitting when no stateful step follows them. Once the
+    pipeline made a copy, later steps that support it transform it in place.
+    When all the stateful steps are incremental the pipeline is too, so the
+    expanding backtest folds update it with the new rows instead of refitting it.
+    """
+
+    def __init__(self, steps: Sequence[BaseDataFrameTransformer]):
+        """
+        Parameters
+        ----------
+        steps: list of BaseDataFrameTransformer
+            Transformers applied in order.
+        """
+        self.steps = steps
+
+    @property
+    def supports_inplace(self):  # type: ignore
+        return all(step.stateless or step.supports_inplace for step in self.steps)
+
+    @property
+    def stateless(self):  # type: ignore
+        return all(step.stateless for step in self.steps)
+
+    @property
+    def incremental(self):  # type: ignore
+        return all(step.stateless or step.incremental for step in self.steps)
+
+    def _stages(self) -> List[Union[BaseDataFrameTransformer, list]]:
+        """Group the consecutive stateless steps in lists."""
+        stages: List[Union[BaseDataFrameTransformer, list]] = []
+        for step in self.steps:
+            if not step.stateless:
+                stages.append(step)
+            elif stages and isinstance(stages[-1], list):
+                stages[-1].append(step)
+            else:
+                stages.append([step])
+        return stages
+
+    def _fit(
+        self, X, method: str, transform_last: bool, owned: bool = False
+    ) -> pd.DataFrame:
+        stages = self._stages()
+        stateful = [i for i, stage in enumerate(stages) if not isinstance(stage, list)]
+        last = len(stages) - 1 if transform_last else max(stateful, default=-1)
+        for i, stage in enumerate(stages[: last + 1]):
+            if not isinstance(stage, list):
+                getattr(stage, method)(X)
+            if i < last or isinstance(stage, list) or transform_last:
+                X, owned = _transform_stage(stage, X, owned)
+        return X
+
+    def fit(self, X, **fit_params):  # pylint:disable=unused-argument
+        """Fit the steps in order."""
+        self._fit(X, "fit", transform_last=False)
+        return self
+
+    def fit_transform(
+        self, X, inplace=False, **fit_params
+    ):  # pylint:disable=unused-argument
+        """Fit the steps in order and return the transformed frame."""
+        return self._fit(X, "fit", transform_last=True, owned=inplace)
+
+    def partial_fit(self, X: pd.DataFrame) -> "TransformerPipeline":
+        """
+        Update the stateful steps with new rows.
+
+        Each step receives the new rows as transformed by the updated previous
+        steps, this matches a full refit when no stateful step feeds another.
+        """
+        if not self.incremental:
+            raise ValueError("All the stateful steps must support partial_fit.")
+        self._fit(X, "partial_fit", transform_last=False)
+        return self
+
+    def transform(self, X, inplace=False):
+        owned = inplace
+        for stage in self._stages():
+            X, owned = _transform_stage(stage, X, owned)
+        return X
+
+
 class Transformer(Step):
     """
     Generates the transformer object.
     """
 
+    checkpointable = True
+
     transformer: BaseDataFrameTransformer
 
     def __init__(
         self,
         transformer: BaseDataFrameTransformer = None,
         savers: "Optional[List[Saver]]" = None,
+        lean: bool = False,
+        inplace: bool = False,
         **kwargs
     ):
         """
@@ -139,12 +487,21 @@ class Transformer(Step):
             Object that implements transformations a given dataset.
         savers : list of soam.savers.Saver, optional
             The saver to store the parameters and state changes.
+        lean : bool, optional
+            Keep no reference to the input or output frames on the task, so
+            `dataset` and `transformed_dataset` stay None, by default False.
+        inplace : bool, optional
+            In lean mode transform the input frame in place when the transformer
+            `supports_inplace`, the input must not be used afterwards,
+            by default False.
         """
         super().__init__(**kwargs)
         if savers is not None:
             for saver in savers:
                 self.state_handlers.append(saver.save_forecast)
 
+        self.lean = lean
+        self.inplace = inplace
         self.dataset = None
         self.transformed_dataset = None
 
@@ -152,6 +509,11 @@ class Transformer(Step):
             transformer = DummyDataFrameTransformer()
         self.transformer = transformer
 
+    def _reset_run_state(self):
+        super()._reset_run_state()
+        self.dataset = None
+        self.transformed_dataset = None
+
     def fit(self, dataset: pd.DataFrame) -> "Transformer":
         """
         Fit method
@@ -193,11 +555,14 @@ class Transformer(Step):
             pd.DataFrame
                 DataFrame fitted and transformed.
         """
-        return self.transformer.fit(dataset).transform(dataset)
+        return self.transformer.fit_transform(dataset)
 
-    @defaults_from_attrs('transformer')
+    @defaults_from_attrs('transformer', 'lean')
     def run(
-        self, dataset: pd.DataFrame, transformer: BaseDataFrameTransformer = None
+        self,
+        dataset: pd.DataFrame,
+        transformer: BaseDataFrameTransformer = None,
+        lean: bool = None,
     ) -> Tuple[pd.DataFrame, Optional[BaseDataFrameTransformer]]:
         """
         Fit and apply a transformation on a dataset and return the fitted
@@ -207,6 +572,8 @@ class Transformer(Step):
         ----------
         dataset : pandas.DataFrame
             Dataset with data to be processed.
+        lean : bool
+            Override the task lean mode for this run.
 
         Returns
         -------
@@ -214,7 +581,13 @@ class Transformer(Step):
             A tuple containing a pandas DataFrame with the transformed dataset
             and the fitted transformer.
         """
-        self.dataset = dataset.copy()
         self.transformer = transformer  # type: ignore
+        if lean:
+            if self.inplace and getattr(transformer, "supports_inplace", False):
+                rv = transformer.fit_transform(dataset, inplace=True)  # type: ignore
+                return rv, transformer
+            return transformer.fit_transform(dataset), transformer  # type: ignore
+
+        self.dataset = dataset.copy()
         self.transformed_dataset = self.fit_transform(dataset)
         return self.transformed_dataset, self.transformer
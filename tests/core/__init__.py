@@ -0,0 +1 @@
+"""SoaM core tests."""
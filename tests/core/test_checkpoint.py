@@ -0,0 +1,177 @@
+"""Checkpoint tests."""
+import logging
+import os
+import threading
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from soam.core import SoamFlow, Step
+from soam.core.checkpoint import CheckpointStore, fingerprint
+
+
+class Double(Step):
+    """Double the response, counting the runs."""
+
+    checkpointable = True
+
+    def __init__(self, factor=2, **kwargs):
+        super().__init__(**kwargs)
+        self.factor = factor
+        self.calls = 0
+
+    def run(self, df):  # type: ignore # pylint: disable=arguments-differ
+        self.calls += 1
+        return df.assign(y=df["y"] * self.factor)
+
+
+class Split(Step):
+    """Return a tuple of a frame and a dict."""
+
+    def run(self, df):  # type: ignore # pylint: disable=arguments-differ
+        return df.head(2), {"rows": len(df)}
+
+
+class Triple(Double):
+    """Calls the checkpointed parent run."""
+
+    def run(self, df):  # type: ignore # pylint: disable=arguments-differ
+        return super().run(df).assign(y=lambda frame: frame["y"] * 1.5)
+
+
+def _frame(n_rows=5):
+    return pd.DataFrame({"ds": pd.date_range("2021-01-01", periods=n_rows), "y": 1.0})
+
+
+def test_fingerprint():
+    """Equal frames and parameters share a key, any change alters it."""
+    df = _frame()
+    assert fingerprint(df) == fingerprint(df.copy())
+    assert fingerprint(df) != fingerprint(df.assign(y=2.0))
+    assert fingerprint(df) != fingerprint(df.iloc[::-1])
+    assert fingerprint(np.arange(3)) != fingerprint(np.arange(3.0))
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+    assert fingerprint(Double(factor=2)) != fingerprint(Double(factor=3))
+    assert fingerprint(df) != fingerprint(df.astype({"y": "float32"}))
+
+
+def test_fingerprint_unhashable():
+    """Values that can't be hashed nor pickled raise instead of a random key."""
+    with pytest.raises(ValueError):
+        fingerprint(pd.DataFrame({"y": [[1, 2], [3]]}))
+    with pytest.raises(ValueError):
+        fingerprint(threading.Lock())
+
+
+def test_store_round_trip(tmp_path):
+    """Frames, tuples and other objects come back as stored."""
+    store = CheckpointStore(tmp_path)
+    df = _frame()
+    assert store.get("missing") == (False, None)
+
+    store.put("frame", df)
+    hit, value = store.get("frame")
+    assert hit
+    pd.testing.assert_frame_equal(value, df)
+
+    store.put("tuple", (df, {"rows": 5}, None))
+    hit, value = store.get("tuple")
+    assert isinstance(value, tuple)
+    pd.testing.assert_frame_equal(value[0], df)
+    assert value[1:] == ({"rows": 5}, None)
+    assert "tuple" in store
+
+
+def test_store_eviction(tmp_path):
+    """The least recently used entries are evicted over the size limit."""
+    store = CheckpointStore(tmp_path)
+    for i, key in enumerate(["old", "used", "new"]):
+        store.put(key, np.zeros(1000))
+        os.utime(tmp_path / key / "manifest.json", (i, i))
+    store.get("old")
+    size = sum(f.stat().st_size for f in (tmp_path / "new").iterdir())
+
+    store.max_bytes = 2 * size + 100
+    store.evict()
+    assert "used" not in store
+    assert "old" in store and "new" in store
+
+
+def test_step_checkpoint(tmp_path):
+    """A re-run with the same parameters and input skips the step."""
+    store = CheckpointStore(tmp_path)
+    df = _frame()
+    step = Double(checkpoint_store=store)
+    first = step.run(df)
+    second = Double(checkpoint_store=store).run(df)
+    pd.testing.assert_frame_equal(first, second)
+    assert step.calls == 1
+
+    step.run(df.assign(y=3.0))
+    Double(factor=3, checkpoint_store=store).run(df)
+    assert step.calls == 2
+    assert len(list(tmp_path.iterdir())) == 3
+
+    split = Split(checkpoint_store=store)
+    assert split.run(df)[1] == split.run(df)[1] == {"rows": 5}
+
+
+def test_step_unhashable_input(tmp_path, caplog):
+    """Steps run without checkpointing inputs that can't be fingerprinted."""
+    store = CheckpointStore(tmp_path)
+    step = Double(checkpoint_store=store)
+    df = _frame(2).assign(tags=[["a"], ["b", "c"]])
+    with caplog.at_level(logging.WARNING):
+        assert step.run(df)["y"].eq(2.0).all()
+        step.run(df)
+    assert step.calls == 2
+    assert "Not checkpointing Double" in caplog.text
+    assert not list(tmp_path.iterdir())
+
+
+def test_run_managed_only_when_attached(tmp_path):
+    """Steps without a store nor spill run their own method."""
+    step = Double()
+    with patch.object(Step, "_managed_run") as managed_mock:
+        step.run(_frame())
+        managed_mock.assert_not_called()
+        step.checkpoint_store = CheckpointStore(tmp_path)
+        step.copy().run(_frame())
+        step.clone().run(_frame())
+        assert managed_mock.call_count == 2
+    assert "run" not in vars(step)
+
+
+def test_nested_run_checkpointed_once(tmp_path):
+    """A run calling the parent run is stored once."""
+    store = CheckpointStore(tmp_path)
+    step = Triple(checkpoint_store=store)
+    assert step.run(_frame())["y"].eq(3.0).all()
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+class Count(Step):
+    """Count the rows, not checkpointable."""
+
+    def run(self, df):  # type: ignore # pylint: disable=arguments-differ
+        return len(df)
+
+
+def test_flow_checkpoint(tmp_path):
+    """A re-run flow restores the outputs of its steps."""
+    store = CheckpointStore(tmp_path)
+    df = _frame()
+    with SoamFlow(name="checkpointed", checkpoint_store=store) as flow:
+        doubled = Double()(df)
+        counted = Count()(df)
+    assert doubled.checkpoint_store is store
+    assert counted.checkpoint_store is None
+
+    first = flow.run()
+    second = flow.run()
+    assert doubled.calls == 1
+    pd.testing.assert_frame_equal(
+        first.result[doubled].result, second.result[doubled].result
+    )
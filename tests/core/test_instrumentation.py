@@ -0,0 +1,104 @@
+"""StepProfiler tests."""
+import json
+import time
+
+import pandas as pd
+
+from soam.core import SoamFlow, Step
+from soam.core.instrumentation import StepProfiler, count_rows
+
+
+class Extract(Step):
+    """Return a frame."""
+
+    def run(self, n_rows):  # type: ignore # pylint: disable=arguments-differ
+        return pd.DataFrame({"y": range(n_rows)})
+
+
+class Slow(Step):
+    """Return the head of its input after a while."""
+
+    def run(self, df, n_rows):  # type: ignore # pylint: disable=arguments-differ
+        time.sleep(0.05)
+        return df.head(n_rows), None
+
+
+class Fast(Step):
+    """Return its input."""
+
+    def run(self, df):  # type: ignore # pylint: disable=arguments-differ
+        return df
+
+
+class Allocate(Step):
+    """Allocate and release a buffer of the given size."""
+
+    def run(self, n_bytes):  # type: ignore # pylint: disable=arguments-differ
+        return len(bytearray(n_bytes))
+
+
+class Increment(Step):
+    """Add one to its input."""
+
+    def run(self, x):  # type: ignore # pylint: disable=arguments-differ
+        return x + 1
+
+
+def test_count_rows():
+    """Rows of the frames nested in a result."""
+    df = pd.DataFrame({"y": [1, 2]})
+    assert count_rows(df) == 2
+    assert count_rows((df, {"other": df}, None)) == 4
+    assert count_rows("not a frame") is None
+
+
+def test_profiler_records_and_exports_a_flow(tmp_path):
+    """Every task run is recorded, exported and reported."""
+    profiler = StepProfiler(
+        jsonl_path=tmp_path / "runs.jsonl",
+        prometheus_path=tmp_path / "soam.prom",
+        trace_memory=True,
+        profile_dir=tmp_path / "profiles",
+    )
+    with SoamFlow(name="profiled", profiler=profiler) as flow:
+        extracted = Extract(name="extract")(10)
+        Slow(name="slow")(extracted, 3)
+        Fast(name="fast")(extracted)
+    state = flow.run()
+
+    assert state.is_successful()
+    records = {record["task"]: record for record in profiler.records}
+    assert set(records) == {"extract", "slow", "fast"}
+    assert records["extract"]["rows_out"] == 10
+    assert records["slow"]["rows_in"] == 10
+    assert records["slow"]["rows_out"] == 3
+    assert records["slow"]["wall_seconds"] >= 0.05
+    assert all(record["peak_memory_bytes"] is not None for record in records.values())
+    assert len(list((tmp_path / "profiles").glob("*.prof"))) == 3
+
+    lines = (tmp_path / "runs.jsonl").read_text().splitlines()
+    assert sorted(json.loads(line)["task"] for line in lines) == [
+        "extract",
+        "fast",
+        "slow",
+    ]
+    prometheus = (tmp_path / "soam.prom").read_text()
+    assert "# TYPE soam_step_wall_seconds gauge" in prometheus
+    assert 'soam_step_rows_out{flow_run_id="' in prometheus
+    assert 'task="slow",slug="slow-1"} 3' in prometheus
+
+    path = [step["task"] for step in profiler.critical_path(flow)]
+    assert path == ["extract", "slow"]
+    assert profiler.report(flow).startswith("Critical path of profiled")
+
+
+def test_profiler_peak_memory_is_per_task():
+    """The peak of a task doesn't include the allocations of previous ones."""
+    profiler = StepProfiler(trace_memory=True)
+    with SoamFlow(name="memory", profiler=profiler) as flow:
+        Increment(name="small")(Allocate(name="big")(20_000_000))
+    assert flow.run().is_successful()
+
+    peaks = {record["task"]: record["peak_memory_bytes"] for record in profiler.records}
+    assert peaks["big"] >= 20_000_000
+    assert peaks["small"] < 1_000_000
@@ -0,0 +1,76 @@
+"""Parallel SoamFlow tests."""
+import pandas as pd
+import pytest
+
+from soam.constants import FLOW_FILE_NAME
+from soam.core import SoamFlow, Step
+from soam.core.checkpoint import CheckpointStore
+from soam.core.instrumentation import StepProfiler
+from soam.savers.csv_saver import CSVSaver
+
+N_SERIES = 8
+
+
+class Series(Step):
+    """Return one frame per series."""
+
+    checkpointable = True
+
+    def run(self, n_series):  # type: ignore # pylint: disable=arguments-differ
+        return [
+            pd.DataFrame({"ds": pd.date_range("2021-01-01", periods=30), "y": i})
+            for i in range(n_series)
+        ]
+
+
+class Total(Step):
+    """Sum the response of a series."""
+
+    checkpointable = True
+
+    def run(self, df):  # type: ignore # pylint: disable=arguments-differ
+        return df["y"].sum()
+
+
+def _run_flow(tmp_path, **flow_kwargs):
+    saver = CSVSaver(tmp_path / "runs", lock_timeout=30)
+    with SoamFlow(name="mapped", saver=saver, **flow_kwargs) as flow:
+        series = Series()(N_SERIES)
+        totals = Total().map(series)
+    state = flow.run()
+    assert state.is_successful()
+    flow_file = next((tmp_path / "runs").glob(f"mapped_*/{FLOW_FILE_NAME}"))
+    return state.result[totals].result, pd.read_csv(flow_file)
+
+
+@pytest.mark.parametrize("scheduler", ["threads", "processes"])
+def test_parallel_flow(tmp_path, scheduler):
+    """Mapped tasks run in parallel and every task run is saved."""
+    totals, runs = _run_flow(tmp_path, n_workers=4, scheduler=scheduler)
+    assert totals == [30 * i for i in range(N_SERIES)]
+    # The flow row, the Series run, the mapped parent and its children.
+    assert len(runs) == N_SERIES + 3
+    assert pd.notna(runs["start_datetime"].iloc[0])
+
+
+def test_parallel_checkpoint(tmp_path):
+    """Parallel runs share the checkpoint store."""
+    store = CheckpointStore(tmp_path / "checkpoints")
+    totals, _ = _run_flow(tmp_path, n_workers=4, checkpoint_store=store)
+    assert len(list(store.path.iterdir())) == N_SERIES + 1
+    assert _run_flow(tmp_path, n_workers=4, checkpoint_store=store)[0] == totals
+
+
+def test_unknown_scheduler():
+    """Only threads and processes are supported."""
+    with pytest.raises(ValueError):
+        SoamFlow(name="flow", n_workers=2, scheduler="cluster")
+
+
+def test_profiler_needs_threads():
+    """Profiles of process workers would be lost."""
+    with pytest.raises(ValueError, match="threads"):
+        SoamFlow(
+            name="flow", n_workers=2, scheduler="processes", profiler=StepProfiler()
+        )
+    SoamFlow(name="flow", n_workers=2, profiler=StepProfiler())
@@ -0,0 +1,131 @@
+"""ArrowSpill tests."""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import prefect
+from prefect.engine.state import Success
+import pytest
+
+from soam.core import SoamFlow, Step
+from soam.core.spill import ArrowHandle, ArrowSpill, load_handles
+from soam.savers.csv_saver import CSVSaver
+
+pytest.importorskip("pyarrow")
+
+
+class Extract(Step):
+    """Return a frame."""
+
+    def run(self, n_rows):  # type: ignore # pylint: disable=arguments-differ
+        return pd.DataFrame(
+            {"y": np.arange(n_rows, dtype=float)},
+            index=pd.RangeIndex(n_rows, name="row"),
+        )
+
+
+class Summarize(Step):
+    """Return the input, its sum and whether it arrived as a frame."""
+
+    def run(self, df):  # type: ignore # pylint: disable=arguments-differ
+        return df, {"total": df["y"].sum(), "frame": isinstance(df, pd.DataFrame)}
+
+
+def test_spill_round_trip(tmp_path):
+    """Large frames are replaced by handles that load them back."""
+    spill = ArrowSpill(tmp_path, threshold_bytes=1000)
+    small = pd.DataFrame({"y": [1.0, 2.0]})
+    large = pd.DataFrame({"y": np.arange(1000.0), "name": "series"})
+
+    value = spill.spill((small, [large], {"frame": large}, None))
+    assert value[0] is small
+    assert isinstance(value[1][0], ArrowHandle)
+    assert len(value[1][0]) == 1000
+    assert value[3] is None
+
+    loaded = load_handles(value)
+    pd.testing.assert_frame_equal(loaded[1][0], large)
+    pd.testing.assert_frame_equal(loaded[2]["frame"], large)
+
+    spill.cleanup()
+    assert not any(tmp_path.iterdir())
+    with pytest.raises(ValueError):
+        value[1][0].load()
+
+
+def test_flow_spill(tmp_path):
+    """Steps receive frames, the terminal results are loaded and files removed."""
+    spill = ArrowSpill(tmp_path, threshold_bytes=1000)
+    with SoamFlow(name="spilled", spill=spill) as flow:
+        extracted = Extract()(1000)
+        summary = Summarize()(extracted)
+
+    state = flow.run()
+    assert state.is_successful()
+    df, stats = state.result[summary].result
+    assert isinstance(df, pd.DataFrame)
+    assert stats == {"total": sum(range(1000)), "frame": True}
+    assert isinstance(state.result[extracted].result, ArrowHandle)
+    assert not any(tmp_path.iterdir())
+
+
+def test_flow_spill_kept(tmp_path):
+    """Without cleanup the handles stay valid until cleanup is called."""
+    spill = ArrowSpill(tmp_path, threshold_bytes=1000, cleanup=False)
+    with SoamFlow(name="spilled", spill=spill) as flow:
+        extracted = Extract()(1000)
+
+    handle = flow.run().result[extracted].result
+    assert handle.load()["y"].sum() == sum(range(1000))
+    spill.cleanup()
+    assert not any(tmp_path.iterdir())
+
+
+def test_loaded_frames_are_writable(tmp_path):
+    """Steps can modify the frames they receive in place."""
+    spill = ArrowSpill(tmp_path, threshold_bytes=1000)
+    handle = spill.spill(pd.DataFrame({"y": np.arange(1000.0)}))
+    df = handle.load()
+    df.loc[0, "y"] = -1.0
+    df["y"] *= 2
+    assert df["y"].iloc[0] == -2.0
+    spill.cleanup()
+
+
+def test_read_only_frames_are_not_copied(tmp_path):
+    """Read only spills load numeric columns backed by the mapped file."""
+    spill = ArrowSpill(tmp_path, threshold_bytes=1000, read_only=True)
+    large = pd.DataFrame(
+        {"ds": pd.date_range("2021-01-01", periods=1000), "y": np.arange(1000.0)}
+    )
+    df = spill.spill(large).load()
+    pd.testing.assert_frame_equal(df, large)
+    assert not df["y"].values.flags.writeable
+    with pytest.raises(ValueError, match="read-only"):
+        df.loc[0, "y"] = -1.0
+    assert df.assign(y=df["y"] * 2)["y"].iloc[1] == 2.0
+    spill.cleanup()
+
+
+def test_save_spilled_forecast(tmp_path):
+    """Savers load the spilled predictions of a forecast."""
+    spill = ArrowSpill(tmp_path / "spill", threshold_bytes=1000)
+    predictions = pd.DataFrame(
+        {"ds": pd.date_range("2021-01-01", periods=100), "yhat": np.arange(100.0)}
+    )
+    result = spill.spill((predictions, None, None))
+    assert isinstance(result[0], ArrowHandle)
+
+    saver = CSVSaver(tmp_path / "runs")
+    with prefect.context(
+        flow_name="spilled",
+        date=datetime(2021, 1, 1),
+        flow_run_id="flow",
+        task_run_id="run",
+        task_slug="forecaster",
+    ):
+        saver.save_forecast(None, None, Success(result=result))
+        saved = pd.read_csv(next(saver.flow_path.glob("*_forecasts.csv")))
+    assert saved["yhat"].tolist() == predictions["yhat"].tolist()
+    assert (saved["task_run_id"] == "run").all()
+    spill.cleanup()
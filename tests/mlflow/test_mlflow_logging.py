@@ -1,8 +1,16 @@
+import logging
 from unittest.mock import patch
 
 import mlflow
+from mlflow.tracking import MlflowClient
+import pandas as pd
 
-from soam.core import SoamFlow
+from soam.core import SoamFlow, Step
+from soam.core.tracking import (
+    MAX_PARAMS_TAGS_PER_BATCH,
+    PARENT_RUN_TAG,
+    MlflowBatchTracker,
+)
 from soam.workflow import Slicer
 from tests.helpers import sample_data_df  # pylint: disable=unused-import
 
@@ -28,3 +36,121 @@ def test_simple_flow(sample_data_df, tmpdir):  # pylint: disable=redefined-outer
         assert slicer_logs['params.dimensions'] == str(dimensions)
         assert slicer_logs['params.metrics'] == str(metrics)
         assert slicer_logs['params.ds_col'] == str(ds_col)
+
+
+def test_batch_tracker(tmpdir):
+    """Runs are nested and their params grouped beyond one batch."""
+    tracking_uri = "file://" + str(tmpdir) + "/mlruns"
+    tracker = MlflowBatchTracker(tracking_uri)
+    parent = tracker.start_run("parent")
+    child = tracker.start_run("child", parent=parent)
+    params = {f"param_{i}": i for i in range(MAX_PARAMS_TAGS_PER_BATCH + 50)}
+    tracker.log_params(child, params)
+    tracker.log_metrics(child, {"mae": 0.5})
+    tracker.end_run(child, "FAILED")
+    tracker.end_run(parent)
+    tracker.close()
+
+    client = MlflowClient(tracking_uri)
+    child_run = client.get_run(child.run_id)
+    assert child_run.data.tags[PARENT_RUN_TAG] == parent.run_id
+    assert child_run.data.params == {key: str(value) for key, value in params.items()}
+    assert child_run.data.metrics == {"mae": 0.5}
+    assert child_run.info.status == "FAILED"
+    assert client.get_run(parent.run_id).info.status == "FINISHED"
+
+
+def test_tracking_params_cached():
+    """Flattened params are computed once and refreshed by set_params."""
+    slicer = Slicer(ds_col="ds", dimensions=["y"], metrics=["metric"])
+    params = slicer.get_tracking_params()
+    assert params["ds_col"] == "ds"
+    assert slicer.get_tracking_params() is params
+    slicer.set_params(ds_col="date")
+    assert slicer.get_tracking_params()["ds_col"] == "date"
+
+
+class LogMetric(Step):
+    """Log a metric with the MLflow fluent API."""
+
+    def run(self, value):  # type: ignore # pylint: disable=arguments-differ
+        mlflow.log_metric("value", value)
+        return value
+
+
+def test_step_run_is_fluent_active_run(tmpdir):
+    """Steps log with mlflow to their own run, created in the active experiment."""
+    tmp_path = "file://" + str(tmpdir) + "/mlruns"
+    with patch("soam.core.runner.TRACKING_URI", tmp_path), patch(
+        "soam.core.runner.TRACKING_IS_ACTIVE", True
+    ), patch("soam.core.step.TRACKING_IS_ACTIVE", True):
+        with SoamFlow(name="flow") as flow:
+            _ = LogMetric()(2.0)
+        experiment_id = mlflow.create_experiment("soam")
+        mlflow.set_experiment("soam")
+        try:
+            assert flow.run().is_successful()
+        finally:
+            fluent = mlflow.tracking.fluent
+            fluent._active_experiment_id = None  # pylint: disable=protected-access
+        assert mlflow.active_run() is None
+        log_df = mlflow.search_runs([experiment_id])
+        assert sorted(log_df["tags.mlflow.runName"]) == ["LogMetric", "flow_run"]
+        runs = log_df.set_index("tags.mlflow.runName")
+        assert runs.loc["LogMetric", "metrics.value"] == 2.0
+        assert runs.loc["LogMetric", "tags.mlflow.parentRunId"] == (
+            runs.loc["flow_run", "run_id"]
+        )
+        assert pd.isna(runs.loc["flow_run", "metrics.value"])
+        assert (log_df["status"] == "FINISHED").all()
+
+
+def test_batch_tracker_isolates_failures(tmpdir, caplog):
+    """A failing run is ended, other runs are logged and dropped calls warned."""
+    tracking_uri = "file://" + str(tmpdir) + "/mlruns"
+    log_batch = MlflowClient.log_batch
+
+    def failing_log_batch(self, run_id, **kwargs):
+        if run_id == broken.run_id:
+            raise ValueError("rejected")
+        return log_batch(self, run_id, **kwargs)
+
+    # Patched before any call is queued, the thread may send them at any time.
+    with patch.object(MlflowClient, "log_batch", failing_log_batch), patch(
+        "soam.core.tracking.RETRY_WAIT", 0
+    ), caplog.at_level(logging.WARNING):
+        tracker = MlflowBatchTracker(tracking_uri, max_queue_wait=1)
+        broken = tracker.start_run("broken")
+        healthy = tracker.start_run("healthy")
+        tracker.log_params(broken, {"param": "x" * 10})
+        tracker.log_params(healthy, {"param": 1})
+        tracker.end_run(broken)
+        tracker.end_run(healthy)
+        tracker.flush()
+        with patch.object(MlflowClient, "create_run", side_effect=ValueError):
+            orphan = tracker.start_run("orphan")
+            tracker.flush()
+        tracker.log_metrics(orphan, {"mae": 0.5})
+        tracker.close()
+
+    client = MlflowClient(tracking_uri)
+    assert client.get_run(broken.run_id).info.status == "FINISHED"
+    assert client.get_run(healthy.run_id).data.params == {"param": "1"}
+    assert orphan.run_id is None
+    assert "tracking of run broken failed" in caplog.text
+    assert "run orphan, which was never created" in caplog.text
+
+
+def test_parallel_step_runs_are_not_activated(tmpdir):
+    """Steps in parallel threads don't share the fluent active run stack."""
+    tmp_path = "file://" + str(tmpdir) + "/mlruns"
+    with patch("soam.core.runner.TRACKING_URI", tmp_path), patch(
+        "soam.core.runner.TRACKING_IS_ACTIVE", True
+    ), patch("soam.core.step.TRACKING_IS_ACTIVE", True):
+        with SoamFlow(name="flow", n_workers=4) as flow:
+            _ = LogMetric().map([1.0, 2.0, 3.0, 4.0])
+        assert flow.run().is_successful()
+        assert mlflow.active_run() is None
+        log_df = mlflow.search_runs(["0"])
+        assert (log_df["tags.mlflow.runName"] == "LogMetric").sum() == 4
+        assert (log_df["status"] == "FINISHED").all()
@@ -0,0 +1,114 @@
+"""Baseline models tests."""
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import pytest
+from scipy.stats import norm
+
+from soam.constants import DS_COL, Y_COL, YHAT_COL, YHAT_LOWER_COL, YHAT_UPPER_COL
+from soam.models.baseline import (
+    DriftModel,
+    MovingAverageModel,
+    NaiveModel,
+    SeasonalNaiveModel,
+    batch_forecast,
+)
+from soam.utilities.utils import add_future_dates
+from soam.workflow import Forecaster
+from soam.workflow.anomalies import ConfidenceIntervalAnomaly
+from tests.helpers import sample_data_df  # pylint: disable=unused-import
+
+PANEL = np.array([[1.0, 2.0, 4.0, 7.0], [np.nan, 5.0, np.nan, 3.0]])
+
+
+def test_naive_panel():
+    """Naive repeats the last value with a growing interval."""
+    yhat, lower, upper = NaiveModel().fit_panel(PANEL).predict_panel(3)
+    np.testing.assert_allclose(yhat, [[7.0] * 3, [3.0] * 3])
+    sigma = np.sqrt((1 + 4 + 9) / 3)
+    np.testing.assert_allclose(
+        upper[0] - yhat[0], 1.2815515655 * sigma * np.sqrt([1, 2, 3])
+    )
+    np.testing.assert_allclose(yhat - lower, upper - yhat)
+
+
+def test_seasonal_naive_panel():
+    """Seasonal naive repeats the last season."""
+    values = np.array([[1.0, 10.0, 2.0, 20.0, 3.0, 30.0]])
+    model = SeasonalNaiveModel(season_length=2).fit_panel(values)
+    yhat, lower, upper = model.predict_panel(5)
+    np.testing.assert_allclose(yhat, [[3.0, 30.0, 3.0, 30.0, 3.0]])
+    width = upper - lower
+    np.testing.assert_allclose(width[0, 2:4], width[0, :2] * np.sqrt(2))
+
+    with pytest.raises(ValueError, match="season"):
+        SeasonalNaiveModel(season_length=7).fit_panel(values)
+
+
+def test_moving_average_panel():
+    """Moving average forecasts the window mean, scaled by one step residuals."""
+    model = MovingAverageModel(window=2, interval_width=0.8)
+    yhat, _, upper = model.fit_panel(PANEL).predict_panel(2)
+    np.testing.assert_allclose(yhat, [[5.5, 5.5], [4.0, 4.0]])
+    # Residuals of 4 and 7 against the means of the two values before them.
+    sigma = np.array([np.sqrt((2.5 ** 2 + 4.0 ** 2) / 2), np.sqrt(2.0)])
+    np.testing.assert_allclose(
+        upper - yhat, norm.ppf(0.9) * np.repeat(sigma[:, np.newaxis], 2, axis=1)
+    )
+
+
+def test_drift_panel():
+    """Drift extrapolates from the first observed value."""
+    yhat, _, _ = DriftModel().fit_panel(PANEL).predict_panel(2)
+    np.testing.assert_allclose(yhat, [[9.0, 11.0], [2.0, 1.0]])
+
+
+def test_baseline_in_forecaster_feeds_anomaly_detection(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """Baselines plug into the Forecaster and their intervals flag anomalies."""
+    data = add_future_dates(sample_data_df, 12)
+    forecaster = Forecaster(
+        model=SeasonalNaiveModel(season_length=12), output_length=12
+    )
+    predictions, _, _ = forecaster.run(data)
+
+    assert list(predictions.columns) == [
+        DS_COL,
+        YHAT_COL,
+        YHAT_LOWER_COL,
+        YHAT_UPPER_COL,
+    ]
+    np.testing.assert_allclose(
+        predictions[YHAT_COL].values, sample_data_df[Y_COL].values[-12:]
+    )
+
+    actuals = predictions[[DS_COL]].assign(y=predictions[YHAT_COL])
+    actuals.loc[0, "y"] = predictions.loc[0, YHAT_UPPER_COL] * 2
+    anomalies = ConfidenceIntervalAnomaly(metric="y").run(predictions, actuals)
+    assert anomalies["outlier_upper_y"].sum() == 1
+
+
+def test_batch_forecast_matches_single_series(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """Forecasting a panel equals forecasting each series."""
+    panel_df = pd.concat(
+        [
+            sample_data_df.assign(series="a"),
+            sample_data_df.assign(series="b", y=sample_data_df[Y_COL] * 2),
+        ]
+    )
+    rv = batch_forecast(panel_df, DriftModel(), horizon=3)
+
+    assert len(rv) == 6
+    single = DriftModel().fit(None, sample_data_df[Y_COL])
+    expected = single.predict(
+        add_future_dates(sample_data_df, 3).tail(3).reset_index(drop=True)
+    )
+    assert_frame_equal(
+        rv[rv.series == "a"].drop(columns="series").reset_index(drop=True), expected,
+    )
+    np.testing.assert_allclose(
+        rv[rv.series == "b"][YHAT_COL].values, expected[YHAT_COL].values * 2
+    )
@@ -0,0 +1,183 @@
+"""Panel Holt-Winters tests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from soam.constants import DS_COL, YHAT_COL
+from soam.models.holt_winters import SkHoltWinters
+from soam.utilities.utils import add_future_dates
+from soam.workflow import Forecaster
+from tests.helpers import sample_data_df  # pylint: disable=unused-import
+
+
+def reference_additive(y, alpha, beta, gamma, level, slope, season):
+    """Plain loop additive Holt-Winters returning the final states and SSE."""
+    season = list(season)
+    period = len(season)
+    sse = 0.0
+    for t, value in enumerate(y):
+        s = season[t % period]
+        base = level + slope
+        sse += (value - base - s) ** 2
+        new_level = alpha * (value - s) + (1 - alpha) * base
+        slope = beta * (new_level - level) + (1 - beta) * slope
+        season[t % period] = gamma * (value - base) + (1 - gamma) * s
+        level = new_level
+    return level, slope, season, sse
+
+
+def seasonal_panel(n_series=5, n_obs=60, period=4, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_obs + 8)
+    pattern = rng.normal(size=(n_series, period))
+    values = (
+        10
+        + rng.uniform(0.1, 0.5, size=(n_series, 1)) * t
+        + pattern[:, t % period]
+        + rng.normal(scale=0.05, size=(n_series, len(t)))
+    )
+    return values[:, :n_obs], values[:, n_obs:]
+
+
+def test_fixed_parameters_match_reference():
+    """The vectorized recursion matches a plain loop."""
+    train, _ = seasonal_panel(n_series=2)
+    params = {
+        "smoothing_level": 0.3,
+        "smoothing_trend": 0.1,
+        "smoothing_seasonal": 0.2,
+    }
+    model = SkHoltWinters(
+        trend="add", seasonal="add", seasonal_periods=4, fit_params=params
+    ).fit_panel(train)
+
+    for row, state_level in zip(train, model.state_.level):
+        first, second = row[:4].mean(), row[4:8].mean()
+        level, slope, season, sse = reference_additive(
+            row, 0.3, 0.1, 0.2, first, (second - first) / 4, row[:4] - first
+        )
+        assert state_level == pytest.approx(level)
+    assert model.state_.sse[-1] == pytest.approx(sse)
+    np.testing.assert_allclose(model.state_.season[-1], season)
+    expected = (
+        level
+        + slope * np.arange(1, 4)
+        + np.array(season)[(len(row) + np.arange(3)) % 4]
+    )
+    np.testing.assert_allclose(model.predict_panel(3)[-1], expected)
+
+
+def test_optimized_panel_forecasts_and_matches_single_fits():
+    """The batched search forecasts well and fits each series independently."""
+    train, test = seasonal_panel()
+    model = SkHoltWinters(trend="add", seasonal="add", seasonal_periods=4)
+    panel_forecast = model.fit_panel(train).predict_panel(8)
+
+    np.testing.assert_allclose(panel_forecast, test, rtol=0.05)
+    single = SkHoltWinters(trend="add", seasonal="add", seasonal_periods=4)
+    np.testing.assert_allclose(
+        single.fit_panel(train[2]).predict_panel(8)[0], panel_forecast[2]
+    )
+    assert set(model.state_.params) == {
+        "smoothing_level",
+        "smoothing_trend",
+        "smoothing_seasonal",
+    }
+
+
+def test_multiplicative_damped():
+    """Multiplicative components with a damped trend fit positive data."""
+    train, _ = seasonal_panel()
+    train = np.exp(train / 10)
+    model = SkHoltWinters(
+        trend="mul", damped_trend=True, seasonal="mul", seasonal_periods=4
+    )
+    forecast = model.fit_panel(train).predict_panel(4)
+    assert np.isfinite(forecast).all()
+    damping = model.state_.params["damping_trend"]
+    assert ((damping >= 0.8) & (damping <= 0.995)).all()
+
+    with pytest.raises(ValueError, match="positive"):
+        model.fit_panel(-train)
+
+
+def test_matches_statsmodels_wrapper():
+    """Fixed statsmodels 0.11 parameters forecast as SkExponentialSmoothing."""
+    exponential = pytest.importorskip("soam.models.exponential")
+    train, _ = seasonal_panel(n_series=1)
+    dates = pd.date_range("2021-01-01", periods=train.shape[1] + 8, freq="D")
+    X = pd.DataFrame({DS_COL: dates})
+    y = pd.Series(np.concatenate([train[0], np.zeros(8)]))
+    fit_params = {
+        "smoothing_level": 0.3,
+        "smoothing_slope": 0.1,
+        "smoothing_seasonal": 0.2,
+        "damping_slope": 0.9,
+        "initial_level": 10.0,
+        "initial_slope": 0.3,
+        "optimized": False,
+    }
+    spec = dict(trend="add", damped=True, seasonal="add", seasonal_periods=4)
+
+    reference = exponential.SkExponentialSmoothing(**spec, fit_params=fit_params)
+    expected = reference.fit_transform(X, y, output_length=8)
+    model = SkHoltWinters(**spec, fit_params=fit_params)
+    predictions = model.fit_transform(X, y, output_length=8)
+
+    results = reference.model_fit
+    assert model.state_.sse[0] == pytest.approx(results.sse)
+    assert model.state_.level[0] == pytest.approx(results.level[-1])
+    assert model.state_.trend[0] == pytest.approx(results.slope[-1])
+    # statsmodels 0.11 forecasts from step seasonal_periods onwards with the
+    # seasonal states of a period before, fixed in statsmodels 0.12.
+    pd.testing.assert_frame_equal(predictions.head(3), expected.head(3))
+
+
+def test_statsmodels_parameter_names():
+    """Old and new parameter names are equivalent, unknown ones raise."""
+    train, _ = seasonal_panel(n_series=2)
+    old = SkHoltWinters(
+        trend="add",
+        damped=True,
+        fit_params={"smoothing_slope": 0.2, "damping_slope": 0.9},
+    ).fit_panel(train)
+    new = SkHoltWinters(
+        trend="add",
+        damped_trend=True,
+        fit_params={"smoothing_trend": 0.2, "damping_trend": 0.9},
+    ).fit_panel(train)
+    np.testing.assert_allclose(old.predict_panel(4), new.predict_panel(4))
+    assert (old.state_.params["smoothing_trend"] == 0.2).all()
+
+    with pytest.raises(ValueError, match="smoothing_slop"):
+        SkHoltWinters(fit_params={"smoothing_slop": 0.2}).fit_panel(train)
+    with pytest.raises(ValueError, match="optimized"):
+        SkHoltWinters(fit_params={"optimized": False}).fit_panel(train)
+
+
+def test_invalid_specs():
+    """Unsupported options raise."""
+    values = np.arange(1.0, 20.0)
+    with pytest.raises(ValueError, match="seasonal_periods"):
+        SkHoltWinters(seasonal="add").fit_panel(values)
+    with pytest.raises(ValueError, match="Box-Cox"):
+        SkHoltWinters(use_boxcox=True).fit_panel(values)
+    with pytest.raises(ValueError, match="trend"):
+        SkHoltWinters(trend="exp").fit_panel(values)
+
+
+def test_forecaster_holt_winters(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """SkHoltWinters plugs into the Forecaster."""
+    data = add_future_dates(sample_data_df, 12)
+    forecaster = Forecaster(
+        model=SkHoltWinters(trend="add", seasonal="mul", seasonal_periods=12),
+        output_length=12,
+    )
+    predictions, _, _ = forecaster.run(data)
+    assert list(predictions.columns) == [DS_COL, YHAT_COL]
+    assert len(predictions) == 12
+    pd.testing.assert_series_equal(
+        predictions[DS_COL], data[DS_COL].tail(12).reset_index(drop=True)
+    )
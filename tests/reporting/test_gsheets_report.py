@@ -1,12 +1,21 @@
 """Google Sheets Report test."""
+from concurrent.futures import ThreadPoolExecutor
 from json.decoder import JSONDecodeError
 import logging
-from unittest.mock import patch
+import time
+from unittest.mock import MagicMock, patch
 
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+import numpy as np
 import pandas as pd
 import pytest
 
-from soam.reporting.gsheets_report import GSheetsReportTask
+from soam.reporting.gsheets_report import (
+    GSheetsBatchWriter,
+    GSheetsReportTask,
+    clear_client_cache,
+)
 
 
 def test_init_fails_if_config_path_is_not_file():
@@ -36,3 +45,296 @@ def test_run_empty_dataframe_warning(tmp_path, caplog):
         reporter.run(df, spreadsheet)
         cli_mock.return_value.insert_from_frame.assert_called_once_with(df, spreadsheet)
         assert "empty dataframe" in caplog.text.lower()
+
+
+class FakeWorksheet:
+    """Local stand-in for a gspread Worksheet recording clears and freezes."""
+
+    def __init__(self, title):
+        self.title = title
+        self.calls = []
+
+    def clear(self):
+        self.calls.append("clear")
+
+    def freeze(self, rows=None, cols=None):  # pylint: disable=unused-argument
+        self.calls.append(("freeze", rows))
+
+
+class FakeSpreadsheet:
+    """Local stand-in for a gspread Spreadsheet recording batchUpdates."""
+
+    def __init__(self, failures=0):
+        self.bodies = []
+        self.failures = failures
+        self.worksheets = {"Sheet1": FakeWorksheet("Sheet1")}
+
+    def get_worksheet(self, index):
+        return list(self.worksheets.values())[index]
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols):  # pylint: disable=unused-argument
+        self.worksheets[title] = FakeWorksheet(title)
+        return self.worksheets[title]
+
+    def values_batch_update(self, body):
+        if self.failures:
+            self.failures -= 1
+            response = MagicMock(status_code=429)
+            response.json.return_value = {"error": {"code": 429}}
+            raise APIError(response)
+        self.bodies.append(body)
+        return {
+            "totalUpdatedCells": sum(len(r) for d in body["data"] for r in d["values"])
+        }
+
+
+class FakeClient:
+    """Local stand-in for a gspread client."""
+
+    def __init__(self, **spreadsheets):
+        self.spreadsheets = spreadsheets
+
+    def open_by_key(self, key):
+        if key not in self.spreadsheets:
+            response = MagicMock(status_code=404)
+            response.json.return_value = {"error": {"code": 404}}
+            raise APIError(response)
+        return self.spreadsheets[key]
+
+    def open(self, title):
+        if title not in self.spreadsheets:
+            raise SpreadsheetNotFound(title)
+        return self.spreadsheets[title]
+
+    def create(self, title):
+        self.spreadsheets[title] = FakeSpreadsheet()
+        return self.spreadsheets[title]
+
+
+def test_batch_writer_groups_and_chunks():
+    """Writes to one spreadsheet are grouped and split by the cell limit."""
+    first, second = FakeSpreadsheet(), FakeSpreadsheet()
+    writer = GSheetsBatchWriter(
+        FakeClient(first=first, second=second), max_cells_per_request=10
+    )
+    big = pd.DataFrame({"a": range(8), "b": range(8)})
+    small = pd.DataFrame({"ds": pd.to_datetime(["2021-01-01"]), "y": [np.nan]})
+    writer.add(big, "first")
+    writer.add(small, "first", sheet="other", start=(3, 2))
+    writer.add(small, "second")
+    assert writer.pending_cells == 18 + 4 + 4
+
+    responses = writer.flush()
+
+    assert len(responses) == 4
+    assert writer.pending_cells == 0
+    ranges = [[d["range"] for d in body["data"]] for body in first.bodies]
+    assert ranges == [["'Sheet1'!A1"], ["'Sheet1'!A6"], ["'other'!B3"]]
+    assert all(
+        sum(len(r) for d in body["data"] for r in d["values"]) <= 10
+        for body in first.bodies
+    )
+    assert first.bodies[0]["data"][0]["values"][0] == ["a", "b"]
+    assert set(first.worksheets) == {"Sheet1", "other"}
+    assert first.worksheets["Sheet1"].calls == []
+    assert second.bodies[0]["data"][0]["values"] == [
+        ["ds", "y"],
+        ["2021-01-01 00:00:00", ""],
+    ]
+
+
+def test_batch_writer_backs_off_on_quota_errors():
+    """Quota errors are retried after waiting."""
+    spreadsheet = FakeSpreadsheet(failures=2)
+    writer = GSheetsBatchWriter(FakeClient(sheet=spreadsheet), backoff=0.5)
+    writer.add(pd.DataFrame({"a": [1]}), "sheet")
+    with patch("soam.reporting.gsheets_report.time.sleep") as sleep_mock:
+        writer.flush()
+    assert [c.args[0] for c in sleep_mock.call_args_list] == [0.5, 1.0]
+    assert len(spreadsheet.bodies) == 1
+
+
+def test_tasks_share_client_and_chunk_large_frames(tmp_path):
+    """Tasks with the same config share a client and large frames are chunked."""
+    test_file = tmp_path / "gsheets_config.json"
+    test_file.write_text("{}")
+    spreadsheet = FakeSpreadsheet()
+    with patch("soam.reporting.gsheets_report.GSheetsClient") as cli_mock, patch(
+        "soam.reporting.gsheets_report.get_gspread_client",
+        return_value=FakeClient(sheet=spreadsheet),
+    ):
+        first = GSheetsReportTask(test_file, max_cells_per_request=4)
+        second = GSheetsReportTask(test_file, max_cells_per_request=4)
+        assert first.client is second.client
+        assert cli_mock.call_count == 1
+
+        first.run(pd.DataFrame({"a": range(6)}), "sheet")
+        cli_mock.return_value.insert_from_frame.assert_not_called()
+        assert len(spreadsheet.bodies) == 2
+    clear_client_cache()
+
+
+@pytest.mark.parametrize("size", [2, 6])
+def test_small_and_large_frames_write_alike(tmp_path, size):
+    """Both paths take the insert_from_frame args and replace the worksheet."""
+    test_file = tmp_path / "gsheets_config.json"
+    test_file.write_text("{}")
+    spreadsheet = FakeSpreadsheet()
+    df = pd.DataFrame({"y": [1.0] + [np.nan] * (size - 1)}).rename_axis("i")
+    insert_kwargs = dict(
+        index=True, first_cell_loc="B2", worksheet="report", null_fill_value="-",
+    )
+    with patch("soam.reporting.gsheets_report.GSheetsClient") as cli_mock, patch(
+        "soam.reporting.gsheets_report.get_gspread_client",
+        return_value=FakeClient(sheet=spreadsheet),
+    ):
+        task = GSheetsReportTask(test_file, max_cells_per_request=4)
+        task.run(df, "sheet", **insert_kwargs)
+    clear_client_cache()
+
+    insert = cli_mock.return_value.insert_from_frame
+    if df.size <= 4:
+        insert.assert_called_once_with(df, "sheet", **insert_kwargs)
+        return
+    insert.assert_not_called()
+    worksheet = spreadsheet.worksheets["report"]
+    assert worksheet.calls == ["clear", ("freeze", 2)]
+    data = [d for body in spreadsheet.bodies for d in body["data"]]
+    assert data[0]["range"] == "'report'!B2"
+    rows = [row for d in data for row in d["values"]]
+    assert rows == [["i", "y"], [0, 1.0]] + [[i, "-"] for i in range(1, size)]
+
+
+def test_batch_writer_creates_spreadsheets_and_quotes_titles():
+    """Missing spreadsheets are created, titles are escaped and ints are indexes."""
+    client = FakeClient()
+    writer = GSheetsBatchWriter(client)
+    df = pd.DataFrame({"a": [1]})
+    writer.add(df, "new", sheet="it's")
+    writer.add(df, "new", sheet=0, start=(1, 3))
+    writer.flush()
+
+    created = client.spreadsheets["new"]
+    ranges = [d["range"] for body in created.bodies for d in body["data"]]
+    assert ranges == ["'it''s'!A1", "'Sheet1'!C1"]
+    assert set(created.worksheets) == {"Sheet1", "it's"}
+
+
+def test_extra_df_to_sheet_args_are_not_chunked(tmp_path):
+    """Args only df_to_sheet understands go to insert_from_frame or raise."""
+    test_file = tmp_path / "gsheets_config.json"
+    test_file.write_text("{}")
+    df = pd.DataFrame({"a": range(6)})
+    with patch("soam.reporting.gsheets_report.GSheetsClient") as cli_mock:
+        task = GSheetsReportTask(test_file, max_cells_per_request=4)
+        task.run(df, "sheet", add_filter=True)
+        cli_mock.return_value.insert_from_frame.assert_called_once_with(
+            df, "sheet", add_filter=True
+        )
+        queued = GSheetsReportTask(test_file, writer=GSheetsBatchWriter(FakeClient()))
+        with pytest.raises(ValueError, match="add_filter"):
+            queued.run(df, "sheet", add_filter=True)
+    clear_client_cache()
+
+
+class RecordingSpread:
+    """
+    Local stand-in for gspread_pandas Spread, as muttlib builds it, writing
+    df_to_sheet frames into a grid of cells.
+    """
+
+    instances: list = []
+
+    def __init__(self, spread, creds=None, **kwargs):  # pylint: disable=unused-argument
+        self.creds = creds
+        self.cells = {}
+        RecordingSpread.instances.append(self)
+
+    def df_to_sheet(
+        self, df, index, headers, start, fill_value, **kwargs
+    ):  # pylint: disable=unused-argument
+        if index:
+            df = df.reset_index()
+        row, col = a1_to_rowcol(start) if isinstance(start, str) else start
+        rows = df.astype(object).where(df.notna(), fill_value).values.tolist()
+        if headers:
+            rows.insert(0, list(df.columns))
+        for i, values in enumerate(rows):
+            for j, value in enumerate(values):
+                self.cells[(kwargs["sheet"], row + i, col + j)] = str(value)
+
+
+def _written_cells(spreadsheet):
+    cells = {}
+    for body in spreadsheet.bodies:
+        for data in body["data"]:
+            sheet, start = data["range"].split("!")
+            row, col = a1_to_rowcol(start)
+            for i, values in enumerate(data["values"]):
+                for j, value in enumerate(values):
+                    cells[(sheet.strip("'"), row + i, col + j)] = str(value)
+    return cells
+
+
+def test_direct_and_chunked_paths_write_the_same_cells(tmp_path):
+    """A frame written directly or in chunks lands on the same cells as one user."""
+    test_file = tmp_path / "gsheets_config.json"
+    test_file.write_text("{}")
+    creds = object()
+    gsheets_kwargs = {"user": "reports", "auth_creds": creds}
+    spreadsheet = FakeSpreadsheet()
+    df = pd.DataFrame({"y": [1.5, np.nan, 3.0]}, index=pd.Index([4, 5, 6], name="i"))
+    insert_kwargs = dict(index=True, first_cell_loc="B2", worksheet="report")
+    RecordingSpread.instances = []
+    with patch("muttlib.gsheetsconn.Spread", RecordingSpread), patch(
+        "soam.reporting.gsheets_report.Client",
+        return_value=FakeClient(sheet=spreadsheet),
+    ) as gspread_mock:
+        direct = GSheetsReportTask(test_file, gsheets_kwargs=gsheets_kwargs)
+        chunked = GSheetsReportTask(
+            test_file, gsheets_kwargs=gsheets_kwargs, max_cells_per_request=2
+        )
+        direct.run(df, "sheet", **insert_kwargs)
+        chunked.run(df, "sheet", **insert_kwargs)
+    clear_client_cache()
+
+    assert len(RecordingSpread.instances) == 1
+    spread = RecordingSpread.instances[0]
+    assert spread.creds is creds
+    gspread_mock.assert_called_once_with(creds=creds)
+    assert len(spreadsheet.bodies) > 1
+    assert _written_cells(spreadsheet) == spread.cells
+
+
+def test_writers_sharing_a_client_send_in_turn():
+    """Flushes from many threads through one client don't interleave."""
+    spreadsheet = FakeSpreadsheet()
+    in_flight, overlaps = [], []
+    batch_update = spreadsheet.values_batch_update
+
+    def values_batch_update(body):
+        in_flight.append(None)
+        overlaps.append(len(in_flight) > 1)
+        time.sleep(0.01)
+        in_flight.pop()
+        return batch_update(body)
+
+    spreadsheet.values_batch_update = values_batch_update
+    client = FakeClient(sheet=spreadsheet)
+    shared = GSheetsBatchWriter(client)
+
+    def write(i):
+        own = GSheetsBatchWriter(client)
+        for writer in (shared, own):
+            writer.add(pd.DataFrame({"a": [i]}), "sheet", sheet=f"s{i}")
+            writer.flush()
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(write, range(4)))
+    assert len(overlaps) >= 4 and not any(overlaps)
+    assert set(spreadsheet.worksheets) == {"Sheet1", "s0", "s1", "s2", "s3"}
@@ -0,0 +1,130 @@
+"""Mail Report test."""
+from concurrent.futures import ThreadPoolExecutor
+import smtplib
+import time
+from unittest.mock import call, patch
+
+import pytest
+
+from soam.reporting.mail_report import MailDigestReportTask, MailReport, SMTPSession
+
+SMTP_CREDENTIALS = {
+    "user_address": "user@test.com",
+    "password": "secret",
+    "mail_from": "soam@test.com",
+    "host": "localhost",
+    "port": 1025,
+}
+
+
+@pytest.fixture(name="plots")
+def fixture_plots(tmp_path):
+    plots = {}
+    for metric_name in ["metric_1", "metric_2", "metric_3"]:
+        plot_path = tmp_path / f"{metric_name}.png"
+        plot_path.write_bytes(b"\x89PNG\r\n\x1a\n")
+        plots[metric_name] = plot_path
+    return plots
+
+
+def test_session_is_reused_among_reports(plots):
+    """Test that many reports share one connection and login."""
+    with patch("soam.reporting.mail_report.smtplib.SMTP") as smtp_mock, patch(
+        "soam.reporting.mail_report.get_smtp_cred", return_value=SMTP_CREDENTIALS
+    ):
+        with SMTPSession(SMTP_CREDENTIALS) as session:
+            for metric_name, plot_path in plots.items():
+                MailReport(["to@test.com"], metric_name, smtp_session=session).send(
+                    "2021-01-01", plot_path
+                )
+        smtp_mock.assert_called_once_with("localhost", 1025)
+        server = smtp_mock.return_value
+        server.login.assert_called_once_with("user@test.com", "secret")
+        assert server.sendmail.call_count == len(plots)
+        server.quit.assert_called_once()
+
+
+def test_session_reconnects_on_disconnection(plots):
+    """Test that a dropped connection is reopened and the mail is resent."""
+    with patch("soam.reporting.mail_report.smtplib.SMTP") as smtp_mock, patch(
+        "soam.reporting.mail_report.get_smtp_cred", return_value=SMTP_CREDENTIALS
+    ):
+        server = smtp_mock.return_value
+        server.sendmail.side_effect = [smtplib.SMTPServerDisconnected(), {}]
+        with SMTPSession(SMTP_CREDENTIALS) as session:
+            MailReport(["to@test.com"], "metric_1", smtp_session=session).send(
+                "2021-01-01", plots["metric_1"]
+            )
+        assert smtp_mock.call_args_list == [call("localhost", 1025)] * 2
+        assert server.sendmail.call_count == 2
+        # The dropped connection socket is closed.
+        server.close.assert_called_once()
+
+
+def test_session_is_shared_among_threads(plots):
+    """Test that threads sharing a session open one connection and send in turn."""
+    in_flight, overlaps = [], []
+
+    def sendmail(*_):
+        in_flight.append(None)
+        overlaps.append(len(in_flight) > 1)
+        time.sleep(0.01)
+        in_flight.pop()
+
+    with patch("soam.reporting.mail_report.smtplib.SMTP") as smtp_mock, patch(
+        "soam.reporting.mail_report.get_smtp_cred", return_value=SMTP_CREDENTIALS
+    ):
+        smtp_mock.return_value.sendmail.side_effect = sendmail
+        session = SMTPSession(SMTP_CREDENTIALS)
+        reports = [
+            MailReport(["to@test.com"], metric_name, smtp_session=session)
+            for metric_name in plots
+        ]
+        with ThreadPoolExecutor(len(reports)) as executor:
+            for future in [
+                executor.submit(report.send, "2021-01-01", plots[report.metric_name])
+                for report in reports
+            ]:
+                future.result()
+        session.close()
+    smtp_mock.assert_called_once_with("localhost", 1025)
+    assert len(overlaps) == len(plots) and not any(overlaps)
+
+
+def test_session_gives_up_after_max_retries(plots):
+    """Test that persistent failures are raised."""
+    with patch("soam.reporting.mail_report.smtplib.SMTP") as smtp_mock, patch(
+        "soam.reporting.mail_report.get_smtp_cred", return_value=SMTP_CREDENTIALS
+    ):
+        smtp_mock.return_value.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+        session = SMTPSession(SMTP_CREDENTIALS, max_retries=1)
+        report = MailReport(["to@test.com"], "metric_1", smtp_session=session)
+        with pytest.raises(smtplib.SMTPServerDisconnected):
+            report.send("2021-01-01", plots["metric_1"])
+        assert smtp_mock.return_value.sendmail.call_count == 2
+
+
+def test_session_closes_connection_on_login_failure():
+    """Test that a connection whose login fails is closed."""
+    with patch("soam.reporting.mail_report.smtplib.SMTP") as smtp_mock:
+        server = smtp_mock.return_value
+        server.login.side_effect = smtplib.SMTPAuthenticationError(535, b"denied")
+        session = SMTPSession(SMTP_CREDENTIALS)
+        with pytest.raises(smtplib.SMTPAuthenticationError):
+            session.connect()
+        server.close.assert_called_once()
+        assert session.server is None
+
+
+def test_digest_sends_all_plots_in_one_mail(plots):
+    """Test that the digest attaches every metric plot to a single message."""
+    with patch("soam.reporting.mail_report.smtplib.SMTP") as smtp_mock, patch(
+        "soam.reporting.mail_report.get_smtp_cred", return_value=SMTP_CREDENTIALS
+    ):
+        task = MailDigestReportTask(["to@test.com"])
+        task.run("2021-01-01", plots)
+        server = smtp_mock.return_value
+        server.sendmail.assert_called_once()
+        _, _, message = server.sendmail.call_args[0]
+        assert "Forecast report for 3 metrics" in message
+        assert message.count("Content-Type: image/png") == len(plots)
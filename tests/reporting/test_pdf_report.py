@@ -1,9 +1,11 @@
 """PDF Report test."""
+from unittest.mock import patch
+
 from dateutil.parser import parse
 import pdftotext
 import pytest
 
-from soam.reporting.pdf_report import PDFReportTask
+from soam.reporting.pdf_report import PDFReport, PDFReportTask
 
 
 @pytest.fixture(name='one_cell_notebook_template')
@@ -90,3 +92,64 @@ def test_run_one_cell_notebook(one_cell_notebook_template, tmp_path):
         pdf = pdftotext.PDF(f)
     assert len(pdf) == 1
     assert remove_extra_lines_from_first_page(pdf[0]).strip() == "'Example'"
+
+
+@pytest.mark.parametrize('source', [[]])
+def test_export_many_notebooks(one_cell_notebook_template, tmp_path):
+    """Test that a batch generates one PDF per parameter set."""
+    base_file_name = 'batch_notebook'
+    test_file = tmp_path / f"{base_file_name}.ipynb"
+    test_file.write_text(one_cell_notebook_template)
+    reporter = PDFReport(tmp_path)
+    results = reporter.export_notebooks_to_pdf(test_file, [{}, {}, {}], max_workers=2)
+    assert len(results) == 3
+    assert len({result.pdf_path for result in results}) == 3
+    for result in results:
+        assert base_file_name in result.pdf_path
+        assert set(result.timings) == {"convert", "execute", "export", "total"}
+        with open(result.pdf_path, 'rb') as f:
+            assert len(pdftotext.PDF(f)) == 1
+
+
+def test_export_many_notebooks_converts_once(tmp_path):
+    """Test that the jupytext conversion is shared by the whole batch."""
+    test_file = tmp_path / "script_report.py"
+    test_file.write_text("print('report')")
+    with patch("soam.reporting.pdf_report.jupytext") as jupytext_mock, patch(
+        "soam.reporting.pdf_report.pm"
+    ) as pm_mock, patch("soam.reporting.pdf_report.PDFExporter") as exporter_mock:
+        exporter_mock.return_value.from_filename.return_value = (b"pdf", {})
+        reporter = PDFReport(tmp_path / "out")
+        (tmp_path / "out").mkdir()
+        jupytext_mock.write.side_effect = lambda nb, path: path.write_text("{}")
+        results = reporter.export_notebooks_to_pdf(
+            test_file, [{"country": country} for country in ["AR", "BR", "UY"]]
+        )
+        jupytext_mock.read.assert_called_once_with(test_file)
+        assert pm_mock.execute_notebook.call_count == 3
+        assert sorted(
+            call.kwargs["parameters"]["country"]
+            for call in pm_mock.execute_notebook.call_args_list
+        ) == ["AR", "BR", "UY"]
+        assert len(results) == 3
+
+
+def test_reports_with_the_same_name_are_converted_apart(tmp_path):
+    """Test that conversions are cached by the path of the report."""
+    first, second = tmp_path / "a" / "report.py", tmp_path / "b" / "report.py"
+    for report_file in (first, second):
+        report_file.parent.mkdir()
+        report_file.write_text(f"print('{report_file.parent.name}')")
+    (tmp_path / "out").mkdir()
+    with patch("soam.reporting.pdf_report.jupytext") as jupytext_mock:
+        jupytext_mock.read.side_effect = lambda path: path.read_text()
+        jupytext_mock.write.side_effect = lambda nb, path: path.write_text(nb)
+        reporter = PDFReport(tmp_path / "out")
+        # pylint: disable=protected-access
+        first_nb = reporter._get_converted_notebook(first)
+        second_nb = reporter._get_converted_notebook(second)
+        assert reporter._get_converted_notebook(first) == first_nb
+    assert first_nb != second_nb
+    assert first_nb.read_text() == "print('a')"
+    assert second_nb.read_text() == "print('b')"
+    assert jupytext_mock.read.call_count == 2
@@ -1,20 +1,28 @@
 """Slack report test."""
 
 from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from io import BytesIO
+import json
 from pathlib import Path, PosixPath
+import threading
 from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs
 
 from jinja2 import Template
 import pandas as pd
 import pytest
+import slack
+from slack.errors import SlackApiError
 
 from soam.reporting.slack_report import (
     SlackAnomalyReportTask,
     SlackMessage,
+    _format_numbers,
     send_anomaly_report,
     send_multiple_slack_messages,
     send_slack_message,
+    send_slack_messages_concurrently,
 )
 
 SLACK_MSG_TEMPLATE = """
@@ -174,6 +182,12 @@ def test_send_multiple_messages_to_channel_in_thread_single():
     client_mock.chat_postMessage.assert_not_called()
 
 
+def test_format_numbers():
+    values = pd.Series([1.234, -999.994, 1000, 123456.7, -2.5e9, 7e15, float("nan")])
+    expected = ["1.23", "-999.99", "1.00k", "123.46k", "-2.50G", "7.00P", "nan"]
+    assert _format_numbers(values).tolist() == expected
+
+
 def test_send_anomaly_report():
     client_mock = MagicMock()
     plot_file = BytesIO(b"abcdef")
@@ -224,7 +238,7 @@ def test_send_no_anomaly_report():
 
 def test_slack_anomaly_report_task():
     with patch("soam.reporting.slack_report.send_anomaly_report") as send_report_mock:
-        task = SlackAnomalyReportTask()
+        task = SlackAnomalyReportTask(rate=2.0)
         client_mock = MagicMock()
         plot_file = BytesIO(b"abcdef")
         anomaly_df = pd.DataFrame(
@@ -238,5 +252,140 @@ def test_slack_anomaly_report_task():
         test_channel = "test"
         task.run(client_mock, test_channel, plot_file, metric_name, anomaly_df, "date")
         send_report_mock.assert_called_once_with(
-            client_mock, test_channel, plot_file, metric_name, anomaly_df, "date"
+            client_mock,
+            test_channel,
+            plot_file,
+            metric_name,
+            anomaly_df,
+            "date",
+            rate=2.0,
+            max_retries=3,
         )
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    """Answer chat.postMessage requests, rate limiting the first one."""
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        if "json" in self.headers.get("Content-Type", ""):
+            params = json.loads(body)
+        else:
+            params = {k: v[0] for k, v in parse_qs(body).items()}
+        server = self.server
+        with server.lock:
+            if not server.rate_limited:
+                server.rate_limited = True
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"ok": false, "error": "ratelimited"}')
+                return
+            server.received.append(params)
+            ts = str(len(server.received))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps({"ok": True, "ts": ts}).encode())
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture
+def fake_slack_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSlackHandler)
+    server.lock = threading.Lock()
+    server.rate_limited = False
+    server.received = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_send_slack_messages_concurrently(
+    fake_slack_server,
+):  # pylint: disable=redefined-outer-name
+    host, port = fake_slack_server.server_address
+    client = slack.WebClient("test-token", base_url=f"http://{host}:{port}/api/")
+    threads = [
+        [SlackMessage(f"thread {i} message {j}") for j in range(3)] for i in range(4)
+    ]
+    single = SlackMessage("single message")
+
+    reports = send_slack_messages_concurrently(
+        client, "test", [*threads, single], max_workers=4
+    )
+
+    assert len(reports) == 13
+    assert [(r.element, r.position) for r in reports] == [
+        *[(i, j) for i in range(4) for j in range(3)],
+        (4, 0),
+    ]
+    assert sum(r.retries for r in reports) == 1
+    assert all(r.latency >= 0 for r in reports)
+    texts = [params["text"] for params in fake_slack_server.received]
+    assert len(texts) == 13
+    for i in range(4):
+        thread_texts = [t for t in texts if t.startswith(f"thread {i} ")]
+        assert thread_texts == [f"thread {i} message {j}" for j in range(3)]
+        parent_ts = reports[i * 3].response["ts"]
+        replies = [
+            params
+            for params in fake_slack_server.received
+            if params["text"].startswith(f"thread {i} message")
+            and params.get("thread_ts")
+        ]
+        assert {params["thread_ts"] for params in replies} == {parent_ts}
+
+
+def test_retried_uploads_send_the_whole_buffer():
+    uploads = []
+
+    def files_upload(file, **kwargs):  # pylint: disable=unused-argument
+        uploads.append(file.read())
+        if len(uploads) == 1:
+            response = MagicMock(status_code=429, headers={"Retry-After": "0"})
+            raise SlackApiError("ratelimited", response)
+        return {"ok": True, "ts": "1"}
+
+    client = MagicMock(files_upload=files_upload)
+    msg = SlackMessage("report", attachment=BytesIO(b"file contents"))
+
+    reports = send_slack_messages_concurrently(client, "test", [msg])
+
+    assert [report.retries for report in reports] == [1]
+    assert uploads == [b"file contents", b"file contents"]
+
+
+def test_failed_messages_are_reported():
+    error = SlackApiError("channel_not_found", MagicMock(status_code=404))
+
+    def chat_post_message(text, **kwargs):  # pylint: disable=unused-argument
+        if text.startswith("fail"):
+            raise error
+        return {"ok": True, "ts": text}
+
+    client = MagicMock(chat_postMessage=chat_post_message)
+    messages = [
+        [SlackMessage("fail parent"), SlackMessage("reply")],
+        [SlackMessage("parent"), SlackMessage("fail reply"), SlackMessage("reply")],
+        SlackMessage("single"),
+    ]
+
+    reports = send_slack_messages_concurrently(client, "test", messages)
+
+    assert [(r.element, r.position, r.error) for r in reports] == [
+        (0, 0, error),
+        (0, 1, error),
+        (1, 0, None),
+        (1, 1, error),
+        (1, 2, None),
+        (2, 0, None),
+    ]
+    assert reports[4].response == {"ok": True, "ts": "reply"}
+    with pytest.raises(SlackApiError):
+        send_multiple_slack_messages(client, "test", messages)
@@ -2,14 +2,21 @@
 import os
 from os import listdir
 from pathlib import Path
+import threading
 from typing import List, Tuple
 import unittest
+from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
 import pytest
 
-from soam.utilities.utils import add_future_dates, split_backtesting_ranges
+from soam.utilities.utils import (
+    SuppressStdOutStdErr,
+    add_future_dates,
+    infer_frequency,
+    split_backtesting_ranges,
+)
 
 ROOT_TEST_DIRECTORY = Path(__file__).parent / "resources" / "test_utils"
 VALIDATION_PREFIX = "validation_"
@@ -237,5 +244,75 @@ def test_add_future_dates():
     pd.testing.assert_frame_equal(expected_df, new_df)
 
 
+def test_add_future_dates_ignores_irregular_history():
+    """Dates before the inferred sample don't have to be regular."""
+    dates = pd.DatetimeIndex(["2000-01-01", "2000-03-07"]).append(
+        pd.date_range("2001-01-01", periods=40, freq="D")
+    )
+    df = pd.DataFrame({"ds": dates, "y": np.arange(len(dates), dtype=float)})
+    new_df = add_future_dates(df, periods=2)
+    assert list(new_df["ds"].iloc[-2:]) == list(
+        pd.date_range("2001-02-10", periods=2, freq="D")
+    )
+
+
+def test_infer_frequency_from_last_dates():
+    """Only the trailing sample has to be regular."""
+    dates = pd.DatetimeIndex(["2000-01-01", "2000-03-07"]).append(
+        pd.date_range("2001-01-01", periods=40, freq="D")
+    )
+    assert pd.infer_freq(dates) is None
+    assert infer_frequency(dates) == "D"
+    assert infer_frequency(dates.delete(-5)) is None
+    assert infer_frequency(dates.delete(-5), allow_gaps=True) == "D"
+    assert infer_frequency(dates[:2]) is None
+
+
+def test_suppress_stdout_stderr_is_shared_across_threads(capfd):
+    """Output is restored only when the last thread leaves its block."""
+    inside = threading.Barrier(4)
+    leave = threading.Event()
+
+    def fit():
+        with SuppressStdOutStdErr():
+            with SuppressStdOutStdErr():
+                inside.wait()
+                leave.wait()
+                os.write(1, b"suppressed\n")
+
+    with patch("soam.utilities.utils.os.dup2", wraps=os.dup2) as dup2_mock:
+        threads = [threading.Thread(target=fit) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        inside.wait()
+        assert SuppressStdOutStdErr.is_active()
+        os.write(2, b"also suppressed\n")
+        leave.set()
+        for thread in threads:
+            thread.join()
+
+    assert not SuppressStdOutStdErr.is_active()
+    assert dup2_mock.call_count == 4
+    os.write(1, b"visible\n")
+    out, err = capfd.readouterr()
+    assert out == "visible\n"
+    assert err == ""
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_suppress_stdout_stderr_resets_in_forked_children(capfd):
+    """Children forked inside a block start with the output restored."""
+    with SuppressStdOutStdErr():
+        pid = os.fork()
+        if pid == 0:
+            ok = not SuppressStdOutStdErr.is_active()
+            os.write(1, b"child\n")
+            os._exit(0 if ok else 1)  # pylint: disable=protected-access
+        _, status = os.waitpid(pid, 0)
+        assert SuppressStdOutStdErr.is_active()
+    assert os.WEXITSTATUS(status) == 0
+    assert capfd.readouterr().out == "child\n"
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,20 @@
 """Anomalies module tests."""
+from unittest.mock import MagicMock, patch
+import uuid
 
 import numpy as np
 import pandas as pd
+from sklearn.base import BaseEstimator
 from pandas.testing import assert_frame_equal
 import pytest
+from sqlalchemy import create_engine
 
-from soam.workflow.anomalies import ConfidenceIntervalAnomaly
+from soam.data_models import Base, ForecastValues
+from soam.workflow.anomalies import (
+    AnomalyBackfill,
+    ConfidenceIntervalAnomaly,
+    StoredForecastAnomaly,
+)
 from tests.helpers import sample_data_df  # pylint:disable=unused-import
 
 # pylint:disable=redefined-outer-name
@@ -90,3 +99,171 @@ def test_metric_not_present(sample_data_df, prediction):
     detector = ConfidenceIntervalAnomaly(metric="gmv")
     with pytest.raises(ValueError):
         detector.run(time_series=sample_data_df, prediction=prediction)
+
+
+class MeanIntervalModel(BaseEstimator):
+    """Predict the train mean with a fixed width interval and count the fits."""
+
+    def __init__(self, width=10000):
+        self.width = width
+        self.n_fits = 0
+
+    def fit(self, X, y):  # pylint:disable=unused-argument
+        self.n_fits += 1
+        self.mean_ = y.mean()
+        return self
+
+    def predict(self, X):
+        return pd.DataFrame(
+            {
+                "ds": X["ds"].values,
+                "yhat": self.mean_,
+                "yhat_lower": self.mean_ - self.width,
+                "yhat_upper": self.mean_ + self.width,
+            }
+        )
+
+
+def test_anomaly_backfill_fits_once_per_interval(sample_data_df):
+    """Test that the backfill reuses each fit for a whole block of points."""
+    model = MeanIntervalModel()
+    detector = AnomalyBackfill(
+        model=model, metric="y", backfill_window=10, refit_interval=4
+    )
+    anomaly_df = detector.run(sample_data_df)
+
+    assert model.n_fits == 3
+    assert len(anomaly_df) == 10
+    assert anomaly_df["ds"].tolist() == sample_data_df["ds"].iloc[-10:].tolist()
+    assert {
+        "yhat_lower_y",
+        "yhat_upper_y",
+        "outlier_lower_y",
+        "outlier_upper_y",
+    } <= set(anomaly_df.columns)
+
+
+def test_anomaly_backfill_matches_single_step_detection(sample_data_df):
+    """Test that each block is flagged like a regular forecast + detection run."""
+    window = 3
+    detector = AnomalyBackfill(
+        model=MeanIntervalModel(), metric="y", backfill_window=window, refit_interval=3
+    )
+    anomaly_df = detector.run(sample_data_df)
+
+    model = MeanIntervalModel().fit(
+        sample_data_df.iloc[:-window], sample_data_df["y"].iloc[:-window]
+    )
+    prediction = model.predict(sample_data_df.iloc[-window:])
+    expected_df = ConfidenceIntervalAnomaly(metric="y").run(
+        prediction=prediction, time_series=sample_data_df
+    )
+    assert_frame_equal(anomaly_df, expected_df)
+
+
+class UpdatableMeanIntervalModel(MeanIntervalModel):
+    """Update the mean with new actuals without counting a fit."""
+
+    def fit(self, X, y):
+        self.y_ = y
+        return super().fit(X, y)
+
+    def update(self, X, y):  # pylint:disable=unused-argument
+        self.y_ = pd.concat([self.y_, y])
+        self.mean_ = self.y_.mean()
+        return self
+
+
+def test_anomaly_backfill_updates_models_one_step(sample_data_df):
+    """Models with update predict every point one step ahead without refitting."""
+    model = UpdatableMeanIntervalModel()
+    detector = AnomalyBackfill(
+        model=model, metric="y", backfill_window=10, refit_interval=4
+    )
+    anomaly_df = detector.run(sample_data_df)
+
+    assert model.n_fits == 3
+    y = sample_data_df["y"]
+    expected = [y.iloc[:point].mean() for point in range(len(y) - 10, len(y))]
+    np.testing.assert_allclose(anomaly_df["yhat"], expected)
+
+
+def test_anomaly_backfill_missing_interval_cols(sample_data_df):
+    """Test that predictions without intervals raise an appropiate exception."""
+
+    class NoIntervalModel(MeanIntervalModel):
+        def predict(self, X):
+            return super().predict(X)[["ds", "yhat"]]
+
+    detector = AnomalyBackfill(model=NoIntervalModel(), metric="y", backfill_window=5)
+    with pytest.raises(ValueError):
+        detector.run(sample_data_df)
+
+
+@pytest.fixture
+def forecasts_db_client(prediction):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    old_run_id, new_run_id = uuid.uuid4().hex, uuid.uuid4().hex
+    stale = prediction.assign(yhat_lower=0, yhat_upper=1, task_run_id=old_run_id)
+    latest = prediction.assign(task_run_id=new_run_id)
+    for forecast in (stale, latest):
+        forecast.rename(columns={"ds": "forecast_date"}).to_sql(
+            ForecastValues.__tablename__, engine, if_exists="append", index=False
+        )
+    db_client = MagicMock()
+    db_client.get_engine.return_value = engine
+    db_client.task_run_ids = [old_run_id, new_run_id]
+    return db_client
+
+
+def test_stored_forecast_anomaly(
+    forecasts_db_client, sample_data_df, expected_anomaly_df
+):
+    """Test that the latest stored intervals are used to flag the values."""
+    detector = StoredForecastAnomaly(
+        forecasts_db_client, metric="y", task_run_ids=forecasts_db_client.task_run_ids
+    )
+    anomaly_df = detector.run(sample_data_df.iloc[-3:])
+    assert_frame_equal(anomaly_df, expected_anomaly_df, check_dtype=False)
+
+
+def test_stored_forecast_anomaly_skips_dates_without_forecast(
+    forecasts_db_client, sample_data_df
+):
+    """Test that values without a stored forecast are not flagged."""
+    detector = StoredForecastAnomaly(
+        forecasts_db_client, metric="y", task_run_ids=forecasts_db_client.task_run_ids
+    )
+    anomaly_df = detector.run(sample_data_df.iloc[-5:])
+    assert len(anomaly_df) == 3
+
+
+def test_stored_forecast_anomaly_caches_windows(forecasts_db_client, sample_data_df):
+    """Test that batches in the same window query the database once."""
+    detector = StoredForecastAnomaly(
+        forecasts_db_client, metric="y", task_run_ids=forecasts_db_client.task_run_ids
+    )
+    with patch(
+        "soam.workflow.anomalies.pd.read_sql", wraps=pd.read_sql
+    ) as read_sql_mock:
+        detector.run(sample_data_df.iloc[-3:])
+        detector.run(sample_data_df.iloc[-3:])
+        read_sql_mock.assert_called_once()
+        detector.clear_cache()
+        detector.run(sample_data_df.iloc[-3:])
+        assert read_sql_mock.call_count == 2
+
+
+def test_stored_forecast_anomaly_scoped_to_task_runs(
+    forecasts_db_client, sample_data_df
+):
+    """Test that only the forecasts of the given task runs are used."""
+    with pytest.raises(ValueError):
+        StoredForecastAnomaly(forecasts_db_client, metric="y", task_run_ids=[])
+    stale_run_id = forecasts_db_client.task_run_ids[0]
+    detector = StoredForecastAnomaly(
+        forecasts_db_client, metric="y", task_run_ids=[stale_run_id]
+    )
+    anomaly_df = detector.run(sample_data_df.iloc[-3:])
+    assert (anomaly_df["yhat_upper_y"] == 1).all()
@@ -0,0 +1,100 @@
+"""AutoForecaster tests."""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from soam.models.baseline import (
+    DriftModel,
+    MovingAverageModel,
+    NaiveModel,
+    SeasonalNaiveModel,
+)
+from soam.utilities.utils import add_future_dates
+from soam.workflow.auto_forecaster import AutoForecaster, score_fold
+from soam.workflow.backtester import prepare_backtest_folds
+from tests.helpers import sample_data_df  # pylint: disable=unused-import
+
+
+class BrokenModel(NaiveModel):
+    """A candidate that always fails."""
+
+    def fit(self, X, y):
+        raise RuntimeError("broken")
+
+
+def test_auto_forecaster_prunes_with_successive_halving(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """Losers are dropped early and the winner forecasts."""
+    candidates = {
+        "naive": NaiveModel(),
+        "seasonal": SeasonalNaiveModel(season_length=12),
+        "average": MovingAverageModel(window=3),
+        "drift": DriftModel(),
+        "broken": BrokenModel(),
+    }
+    auto = AutoForecaster(
+        candidates, output_length=3, train_window=12, step_size=3, n_jobs=2
+    )
+    data = add_future_dates(sample_data_df, 3)
+    n_folds = len(
+        prepare_backtest_folds(
+            sample_data_df, test_window=3, train_window=12, step_size=3
+        )
+    )
+
+    with patch(
+        "soam.workflow.auto_forecaster.score_fold", wraps=score_fold
+    ) as score_mock:
+        predictions, _, model = auto.run(data)
+
+    assert score_mock.call_count < len(candidates) * n_folds
+    leaderboard = auto.leaderboard
+    assert list(leaderboard.candidate)[-1] == "broken"
+    assert np.isinf(leaderboard.score.iloc[-1])
+    assert leaderboard.n_folds.iloc[0] > leaderboard.n_folds.iloc[-1]
+    best = leaderboard.candidate.iloc[0]
+    assert isinstance(model, type(candidates[best]))
+    assert model is not candidates[best]
+    assert len(predictions) == 3
+
+
+class MisusedModel(NaiveModel):
+    """A candidate with a programming error."""
+
+    def fit(self, X, y):
+        return super().fit(X)  # pylint: disable=no-value-for-parameter
+
+
+class OffsetModel(NaiveModel):
+    """A naive forecast shifted by a constant."""
+
+    def __init__(self, offset=0.0):
+        super().__init__()
+        self.offset = offset
+
+    def predict(self, X):
+        prediction = super().predict(X)
+        prediction["yhat"] += self.offset
+        return prediction
+
+
+def test_score_fold_ranks_signed_metrics_by_magnitude(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """A large negative bias scores worse than a small positive one."""
+    fold = prepare_backtest_folds(sample_data_df, test_window=3)[-1]
+    under = score_fold(OffsetModel(offset=-1e6), fold, metric="bias")
+    over = score_fold(OffsetModel(offset=1.0), fold, metric="bias")
+    assert under > over >= 0
+
+
+def test_score_fold_only_catches_fit_failures(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """Model failures score inf, programming errors propagate."""
+    fold = prepare_backtest_folds(sample_data_df, test_window=3)[-1]
+    assert np.isinf(score_fold(BrokenModel(), fold))
+    with pytest.raises(TypeError):
+        score_fold(MisusedModel(), fold)
@@ -1,9 +1,12 @@
 """Backtester"""
 from copy import deepcopy
 import unittest
+from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 import pytest
+from sklearn.base import BaseEstimator
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sklearn.preprocessing import StandardScaler
 
@@ -24,7 +27,15 @@ from soam.workflow import (
     Transformer,
     compute_metrics,
 )
-from soam.workflow.backtester import METRICS_KEYWORD, PLOT_KEYWORD, RANGES_KEYWORD
+from soam.workflow.backtester import (
+    METRICS_KEYWORD,
+    PLOT_KEYWORD,
+    RANGES_KEYWORD,
+    iter_backtest_folds,
+    prepare_backtest_folds,
+)
+from soam.workflow.sinks import CallbackSink, ParquetSink
+from soam.workflow.transformer import RunningStandardScaler
 from tests.helpers import sample_data_df  # pylint: disable=unused-import
 
 
@@ -492,3 +503,157 @@ def test_integration_backtester_multi_fold_custom_plot_aggregation_default_metri
         }
     ]
     assert_backtest_all_folds_result_aggregated(rvs, expected_values)
+
+
+class MeanModel(BaseEstimator):
+    """Predict the train mean."""
+
+    def fit(self, X, y):  # pylint:disable=unused-argument
+        self.mean_ = y.mean()
+        return self
+
+    def predict(self, X):
+        return pd.DataFrame({DS_COL: X[DS_COL].values, "yhat": self.mean_})
+
+
+def test_backtester_streams_folds_to_sink(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """Folds are sent to the sink and aggregated incrementally."""
+    metrics = {"mae": mean_absolute_error, "rmse": "rmse", "mase": "mase"}
+    backtester = Backtester(
+        forecaster=Forecaster(model=MeanModel(), output_length=5),
+        test_window=5,
+        train_window=20,
+        metrics=metrics,
+    )
+    folds_rv = backtester.run(sample_data_df)
+
+    received = []
+    streamed_rv = backtester.run(
+        sample_data_df,
+        sink=lambda fold, rv, predictions: received.append((fold, rv, predictions)),
+    )
+
+    assert [fold for fold, _, _ in received] == list(range(len(folds_rv)))
+    for (_, rv, predictions), fold_rv in zip(received, folds_rv):
+        assert rv[RANGES_KEYWORD] == fold_rv[RANGES_KEYWORD]
+        assert rv[METRICS_KEYWORD] == pytest.approx(fold_rv[METRICS_KEYWORD])
+        assert list(predictions.columns) == [DS_COL, "yhat", Y_COL]
+        assert len(predictions) == 5
+
+    (aggregated,) = streamed_rv
+    assert aggregated[RANGES_KEYWORD] == (
+        folds_rv[0][RANGES_KEYWORD][0],
+        folds_rv[-1][RANGES_KEYWORD][-1],
+    )
+    for name in metrics:
+        values = [fold_rv[METRICS_KEYWORD][name] for fold_rv in folds_rv]
+        assert aggregated[METRICS_KEYWORD][name] == pytest.approx(
+            {"avg": np.mean(values), "max": max(values), "min": min(values)}
+        )
+    assert aggregated[PLOT_KEYWORD] is None
+
+
+def test_backtester_aggregations_skip_nan_metrics(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """With or without a sink a NaN fold metric is skipped alike."""
+
+    def nan_on_second_fold():
+        calls = []
+
+        def metric(y_true, y_pred):
+            calls.append(None)
+            return np.nan if len(calls) == 2 else mean_absolute_error(y_true, y_pred)
+
+        return metric
+
+    def backtest(**kwargs):
+        return Backtester(
+            forecaster=Forecaster(model=MeanModel(), output_length=5),
+            test_window=5,
+            train_window=20,
+            metrics={"mae": nan_on_second_fold(), "all_nan": lambda *_: np.nan},
+            aggregation=True,
+        ).run(sample_data_df, **kwargs)
+
+    (aggregated,) = backtest()
+    (streamed,) = backtest(sink=lambda *args: None)
+
+    assert streamed[METRICS_KEYWORD]["mae"] == pytest.approx(
+        aggregated[METRICS_KEYWORD]["mae"]
+    )
+    assert not np.isnan(aggregated[METRICS_KEYWORD]["mae"]["avg"])
+    for rv in (aggregated, streamed):
+        assert all(np.isnan(v) for v in rv[METRICS_KEYWORD]["all_nan"].values())
+
+
+def test_backtester_sink_rejects_custom_metric_aggregation(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """Custom aggregations need every fold so they can't be streamed."""
+    backtester = Backtester(
+        forecaster=Forecaster(model=MeanModel(), output_length=5),
+        test_window=5,
+        train_window=20,
+        metrics={"mae": "mae"},
+        aggregation={METRICS_KEYWORD: {"sum": sum}},
+        sink=CallbackSink(lambda *args: None),
+    )
+    with pytest.raises(ValueError, match="sink"):
+        backtester.run(sample_data_df)
+
+
+def test_parquet_sink_writes_one_file_per_fold(
+    tmp_path, sample_data_df
+):  # pylint: disable=redefined-outer-name
+    """The ParquetSink keeps every fold prediction on disk."""
+    pytest.importorskip("pyarrow")
+    backtester = Backtester(
+        forecaster=Forecaster(model=MeanModel(), output_length=5),
+        test_window=5,
+        train_window=20,
+        metrics={"mae": "mae"},
+        sink=ParquetSink(tmp_path / "folds"),
+    )
+    backtester.run(sample_data_df)
+
+    files = sorted((tmp_path / "folds").iterdir())
+    assert files[0].name == "fold_00000.parquet"
+    folds = pd.read_parquet(tmp_path / "folds")
+    assert len(folds) == 5 * len(files)
+    assert {"fold", "train_start", "metrics_mae", Y_COL, "yhat"} <= set(folds.columns)
+
+
+def test_expanding_folds_update_incremental_preprocessors(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """Incremental preprocessors read only the new rows of each fold."""
+    preprocessor = Transformer(RunningStandardScaler())
+    with patch.object(
+        RunningStandardScaler,
+        "partial_fit",
+        autospec=True,
+        side_effect=RunningStandardScaler.partial_fit,
+    ) as partial_fit_mock:
+        folds = []
+        for fold in iter_backtest_folds(
+            sample_data_df, test_window=3, step_size=4, preprocessor=preprocessor
+        ):
+            n_train = len(fold.train) - fold.horizon
+            y = sample_data_df[Y_COL].values[:n_train]
+            np.testing.assert_allclose(fold.fitted_preprocessor.mean_, [y.mean()])
+            np.testing.assert_allclose(
+                fold.train[Y_COL].values[:n_train], (y - y.mean()) / y.std()
+            )
+            folds.append(fold)
+
+    new_rows = [len(call.args[1]) for call in partial_fit_mock.call_args_list]
+    assert new_rows == [4] * len(new_rows)
+    assert len(new_rows) == len(folds)
+    # Each fold keeps the state it was preprocessed with.
+    for fold in folds:
+        n_train = len(fold.train) - fold.horizon
+        y = sample_data_df[Y_COL].values[:n_train]
+        np.testing.assert_allclose(fold.fitted_preprocessor.mean_, [y.mean()])
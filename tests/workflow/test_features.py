@@ -0,0 +1,69 @@
+"""LagFeatures tests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from soam.constants import DS_COL, Y_COL
+from soam.utilities.utils import add_future_dates
+from soam.workflow.features import LagFeatures
+from tests.helpers import sample_data_df  # pylint: disable=unused-import
+
+
+def test_lag_features_match_pandas_per_series():
+    """Features of interleaved series match grouped shift and rolling."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2021-01-01", periods=20, freq="D")
+    panel = pd.DataFrame(
+        {
+            "series": np.repeat(["a", "b"], 20),
+            DS_COL: np.tile(dates, 2),
+            Y_COL: rng.normal(size=40),
+        }
+    ).sample(frac=1, random_state=0)
+    features = LagFeatures(
+        lags=[2, 5],
+        windows=[3],
+        window_stats=["mean", "std", "min", "max"],
+        calendar=["dayofweek"],
+        horizon=2,
+        series_col="series",
+    )
+    result = features.transform(panel)
+
+    assert result.index.equals(panel.index)
+    assert set(features.feature_names()) <= set(result.columns)
+    grouped = panel.sort_values(DS_COL).groupby("series")[Y_COL]
+    for lag in (2, 5):
+        expected = grouped.shift(lag).reindex(panel.index)
+        np.testing.assert_allclose(result[f"y_lag_{lag}"], expected)
+    for stat in ("mean", "std", "min", "max"):
+        expected = grouped.transform(
+            lambda y, stat=stat: getattr(y.shift(2).rolling(3), stat)()
+        ).reindex(panel.index)
+        np.testing.assert_allclose(result[f"y_rolling_{stat}_3"], expected)
+    np.testing.assert_array_equal(result["ds_dayofweek"], panel[DS_COL].dt.dayofweek)
+    assert Y_COL in panel and "y_lag_2" not in panel
+
+
+def test_lag_features_fill_the_horizon(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """The future rows only use observed values."""
+    data = add_future_dates(sample_data_df, 3)
+    result = LagFeatures(lags=[3], windows=[4], horizon=3).transform(data)
+
+    future = result.tail(3)
+    np.testing.assert_allclose(future["y_lag_3"], sample_data_df[Y_COL].tail(3))
+    assert future["y_rolling_mean_4"].notna().all()
+
+
+def test_lag_features_reject_short_lags():
+    """A lag shorter than the horizon is unknown in the future."""
+    with pytest.raises(ValueError):
+        LagFeatures(lags=[1], horizon=2)
+
+
+def test_lag_features_reject_empty_windows():
+    """A window needs at least one observation."""
+    with pytest.raises(ValueError):
+        LagFeatures(windows=[3], min_periods=0)
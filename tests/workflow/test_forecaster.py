@@ -1,6 +1,9 @@
 """Forecaster tester."""
+from unittest.mock import patch
+
 import numpy as np
 import pandas as pd
+from sklearn.base import BaseEstimator
 
 from soam.models.prophet import SkProphet
 from soam.utilities.utils import add_future_dates
@@ -72,3 +75,56 @@ def test_forecaster_custom_response_col(
         )
     )
     pd.testing.assert_frame_equal(expected_predictions, predictions)
+
+
+class LastValueModel(BaseEstimator):
+    """Predict the last train value and remember what it was fitted on."""
+
+    def fit(self, X, y):
+        self.X_ = X
+        self.last_ = y.iloc[-1]
+        return self
+
+    def predict(self, X):
+        return pd.DataFrame({"ds": X["ds"].values, "yhat": self.last_})
+
+
+def test_forecaster_lean(sample_data_df):  # pylint: disable=redefined-outer-name
+    """Lean mode predicts the same without sorting or keeping frames."""
+    data = add_future_dates(sample_data_df, 5)
+    data["regressor"] = np.arange(len(data), dtype=float)
+    expected, _, _ = Forecaster(model=LastValueModel(), output_length=5).run(data)
+
+    fc = Forecaster(model=LastValueModel(), output_length=5, lean=True)
+    with patch.object(
+        pd.DataFrame, "sort_values", side_effect=AssertionError("sorted")
+    ):
+        predictions, time_series, model = fc.run(data)
+
+    pd.testing.assert_frame_equal(expected, predictions)
+    assert time_series is data
+    assert list(model.X_.columns) == ["ds", "regressor"]
+    assert fc.time_series.empty and fc.prediction.empty
+
+    shuffled_data = data.sample(frac=1, random_state=0)
+    shuffled, _, _ = fc.run(shuffled_data)
+    pd.testing.assert_frame_equal(expected, shuffled)
+    assert list(model.X_.columns) == ["ds", "regressor"]
+    assert "y" in shuffled_data.columns
+
+
+def test_forecaster_clone(sample_data_df):  # pylint: disable=redefined-outer-name
+    """The clone gets an unfitted model and no data from previous runs."""
+    fc = Forecaster(model=LastValueModel(), output_length=5)
+    fc.run(add_future_dates(sample_data_df, 5))
+
+    clone = fc.clone()
+
+    assert clone is not fc
+    assert isinstance(clone.model, LastValueModel)
+    assert clone.model is not fc.model
+    assert not hasattr(clone.model, "last_")
+    assert clone.time_series.empty and clone.prediction.empty
+    assert not fc.time_series.empty
+    assert clone.output_length == fc.output_length
+    assert clone.state_handlers is not fc.state_handlers
@@ -0,0 +1,113 @@
+"""Vectorized metrics tests."""
+import numpy as np
+import pytest
+from sklearn.metrics import (
+    mean_absolute_error,
+    mean_absolute_percentage_error,
+    mean_squared_error,
+)
+
+from soam.workflow.backtester import compute_folds_metrics
+from soam.workflow.metrics import (
+    RunningAggregation,
+    compute_batch_metrics,
+    naive_scale,
+    stack_ragged,
+)
+
+
+def test_stack_ragged_pads_and_masks():
+    """Ragged folds are padded with NaN and masked."""
+    values, mask = stack_ragged([[1, 2, 3], [4], [5, np.nan]])
+    np.testing.assert_array_equal(
+        mask, [[True, True, True], [True, False, False], [True, False, False]]
+    )
+    assert values[0].tolist() == [1, 2, 3]
+    assert np.isnan(values[1, 1:]).all()
+
+    values, mask = stack_ragged([[1], [2, 3], [4], [5]], shape=(2, 2), width=3)
+    assert values.shape == mask.shape == (2, 2, 3)
+
+
+def test_compute_batch_metrics_matches_sklearn():
+    """Each fold matches the per fold sklearn computation."""
+    folds_y = [[3, -0.5, 2, 7], [1, 2, 3]]
+    folds_yhat = [[2.5, 0.0, 2, 8], [1.5, 2, 2]]
+    y, mask = stack_ragged(folds_y)
+    yhat, _ = stack_ragged(folds_yhat, width=y.shape[-1])
+
+    rv = compute_batch_metrics(
+        y, yhat, mask, metrics=["mae", "mse", "rmse", "mape", "smape", "bias"]
+    )
+
+    for fold, (y_true, y_pred) in enumerate(zip(folds_y, folds_yhat)):
+        assert rv["mae"][fold] == pytest.approx(mean_absolute_error(y_true, y_pred))
+        assert rv["mse"][fold] == pytest.approx(mean_squared_error(y_true, y_pred))
+        assert rv["rmse"][fold] == pytest.approx(
+            np.sqrt(mean_squared_error(y_true, y_pred))
+        )
+        assert rv["mape"][fold] == pytest.approx(
+            mean_absolute_percentage_error(y_true, y_pred)
+        )
+        assert rv["bias"][fold] == pytest.approx(np.mean(np.subtract(y_pred, y_true)))
+    assert rv["smape"][1] == pytest.approx((2 * 0.5 / 2.5 + 2 * 1 / 5) / 3)
+
+
+def test_compute_batch_metrics_panel_mase():
+    """MASE is scaled per series and fold by the naive in-sample error."""
+    y_train = np.array([[[1.0, 2.0, 4.0]], [[10.0, 10.0, 10.0]]])
+    y = np.array([[[5.0, 6.0]], [[10.0, 12.0]]])
+    yhat = np.array([[[4.0, 4.0]], [[10.0, 11.0]]])
+
+    rv = compute_batch_metrics(y, yhat, metrics=["mase"], y_train=y_train)
+
+    assert rv["mase"].shape == (2, 1)
+    np.testing.assert_allclose(naive_scale(y_train), [[1.5], [0.0]])
+    assert rv["mase"][0, 0] == pytest.approx(1.5 / 1.5)
+    assert np.isinf(rv["mase"][1, 0])
+
+
+def test_compute_batch_metrics_errors():
+    """Unknown metrics and MASE without training values raise."""
+    with pytest.raises(ValueError, match="Unknown"):
+        compute_batch_metrics([1.0], [1.0], metrics=["r2"])
+    with pytest.raises(ValueError, match="MASE"):
+        compute_batch_metrics([1.0], [1.0], metrics=["mase"])
+
+
+def test_compute_folds_metrics_uses_named_metrics_only():
+    """Callables are left to compute_metrics, names are computed in batch."""
+    rv = compute_folds_metrics(
+        [[1.0, 2.0], [3.0]],
+        [[1.0, 4.0], [2.0]],
+        [[0.0, 1.0], [1.0, 3.0]],
+        {"mae": mean_absolute_error, "MASE": "mase", "err": "mae"},
+    )
+    assert set(rv) == {"MASE", "err"}
+    np.testing.assert_allclose(rv["err"], [1.0, 1.0])
+    np.testing.assert_allclose(rv["MASE"], [1.0, 0.5])
+
+
+def test_running_aggregation_matches_batch():
+    """The running mean, min and max match the batch aggregations."""
+    values = [3.0, 1.0, 4.0, 1.5]
+    running = RunningAggregation()
+    for value in values:
+        running.update({"mae": value, "panel": [value, -value]})
+    rv = running.result()
+    assert rv["mae"] == pytest.approx({"avg": np.mean(values), "max": 4.0, "min": 1.0})
+    assert rv["panel"]["avg"] == pytest.approx([np.mean(values), -np.mean(values)])
+    assert rv["panel"]["min"] == [1.0, -4.0]
+
+
+def test_running_aggregation_skips_nan_per_metric():
+    """Each metric is averaged over the folds where it is defined."""
+    folds = [{"mae": 1.0}, {"mae": np.nan, "mase": 2.0}, {"mae": 3.0, "mase": 4.0}]
+    running = RunningAggregation()
+    for metrics in folds:
+        running.update(metrics)
+    rv = running.result()
+    assert rv["mae"] == pytest.approx({"avg": 2.0, "max": 3.0, "min": 1.0})
+    assert rv["mase"] == pytest.approx({"avg": 3.0, "max": 4.0, "min": 2.0})
+    running.update({"smape": np.nan})
+    assert np.isnan(running.result()["smape"]["avg"])
@@ -0,0 +1,91 @@
+"""ParameterSearch tests."""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from scipy.stats import randint
+
+from soam.models.baseline import MovingAverageModel
+from soam.utilities.utils import add_future_dates
+from soam.workflow.backtester import prepare_backtest_folds
+from soam.workflow.parameter_search import ParameterSearch
+from tests.helpers import sample_data_df  # pylint: disable=unused-import
+
+
+def test_parameter_search_stops_losing_trials(
+    sample_data_df,
+):  # pylint: disable=redefined-outer-name
+    """A trial stops once its accumulated error exceeds the incumbent total."""
+    folds = prepare_backtest_folds(sample_data_df, test_window=3, step_size=3)
+    search = ParameterSearch(
+        MovingAverageModel(), {"window": [1, 100]}, method="grid", n_jobs=1
+    )
+
+    with patch(
+        "soam.workflow.parameter_search.score_fold",
+        side_effect=lambda model, *args: float(model.window),
+    ) as score_mock:
+        trials = search.search(folds)
+
+    assert score_mock.call_count == len(folds) + 1
+    assert trials.params.tolist() == [{"window": 1}, {"window": 100}]
+    assert trials.score.iloc[0] == 1.0
+    assert trials.pruned.tolist() == [False, True]
+    assert trials.n_folds.tolist() == [len(folds), 1]
+
+
+@pytest.mark.parametrize("method", ["random", "bayesian"])
+def test_parameter_search_forecasts_with_best_params(
+    sample_data_df, method
+):  # pylint: disable=redefined-outer-name
+    """The best parameters are refitted on the whole history."""
+    search = ParameterSearch(
+        MovingAverageModel(),
+        {"window": randint(1, 13), "interval_width": [0.8, 0.9]},
+        method=method,
+        n_trials=8,
+        output_length=3,
+        train_window=12,
+        step_size=3,
+        n_jobs=2,
+        n_startup_trials=4,
+        random_state=42,
+    )
+    predictions, _, model = search.run(add_future_dates(sample_data_df, 3))
+
+    assert len(search.trials) == 8
+    assert np.isfinite(search.trials.score.iloc[0])
+    assert model.window == search.trials.params.iloc[0]["window"]
+    assert len(predictions) == 3
+
+
+def test_parameter_search_unknown_method():
+    """Only grid, random and Bayesian searches exist."""
+    with pytest.raises(ValueError):
+        ParameterSearch(MovingAverageModel(), {"window": [1]}, method="genetic")
+
+
+@pytest.mark.parametrize("method", ["random", "bayesian"])
+def test_parameter_search_never_repeats_trials(
+    sample_data_df, method
+):  # pylint: disable=redefined-outer-name
+    """Evaluated parameter sets aren't suggested again."""
+    folds = prepare_backtest_folds(sample_data_df, test_window=3, step_size=3)
+    search = ParameterSearch(
+        MovingAverageModel(),
+        {"window": randint(1, 7)},
+        method=method,
+        n_trials=10,
+        n_jobs=2,
+        n_startup_trials=2,
+        random_state=0,
+    )
+
+    with patch(
+        "soam.workflow.parameter_search.score_fold",
+        side_effect=lambda model, *args: float(model.window),
+    ):
+        trials = search.search(folds)
+
+    windows = [params["window"] for params in trials.params]
+    assert len(set(windows)) == len(windows) <= 6
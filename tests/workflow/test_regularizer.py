@@ -0,0 +1,75 @@
+"""TimeSeriesRegularizer tests."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from soam.constants import DS_COL, Y_COL
+from soam.workflow.regularizer import TimeSeriesRegularizer, infer_series_frequencies
+
+
+def _panel():
+    return pd.DataFrame(
+        {
+            "series": ["a"] * 4 + ["b"] * 4 + ["c"] * 4,
+            DS_COL: pd.to_datetime(
+                ["2021-01-01", "2021-01-02", "2021-01-04", "2021-01-05"]
+                + ["2021-01-03", "2021-01-04", "2021-01-06", "2021-01-07"]
+                + ["2021-01-01", "2021-02-01", "2021-03-01", "2021-05-01"]
+            ),
+            Y_COL: [1.0, 2.0, 4.0, 5.0, 10.0, 20.0, 40.0, 50.0, 1.0, 2.0, 3.0, 5.0],
+        }
+    )
+
+
+def test_infer_series_frequencies_with_gaps():
+    """Each series frequency is inferred despite its gaps."""
+    assert infer_series_frequencies(_panel(), "series") == {
+        "a": "D",
+        "b": "D",
+        "c": "MS",
+    }
+
+
+def test_regularizer_fills_gaps_and_appends_future_dates():
+    """Every series is reindexed on its grid, interpolated and extended."""
+    regularizer = TimeSeriesRegularizer(
+        series_col="series", fill="linear", periods=2, indicator_col="filled"
+    )
+    regular = regularizer.fit_transform(_panel())
+
+    expected = {
+        "a": ("2021-01-01", "D", [1, 2, 3, 4, 5], 2),
+        "b": ("2021-01-03", "D", [10, 20, 30, 40, 50], 2),
+        "c": ("2021-01-01", "MS", [1, 2, 3, 4, 5], 3),
+    }
+    assert list(pd.unique(regular.series)) == ["a", "b", "c"]
+    for key, (start, freq, values, gap) in expected.items():
+        dates = pd.date_range(start, periods=7, freq=freq)
+        series = regular[regular.series == key]
+        pd.testing.assert_index_equal(
+            pd.DatetimeIndex(series[DS_COL].values), dates, check_names=False
+        )
+        np.testing.assert_allclose(series[Y_COL].values[:5], values)
+        assert series[Y_COL].iloc[5:].isna().all()
+        assert np.flatnonzero(series.filled).tolist() == [gap]
+
+
+def test_regularizer_single_series_ffill():
+    """Without a series column the frame is a single series."""
+    data = pd.DataFrame(
+        {
+            DS_COL: pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-04"]),
+            Y_COL: [1.0, 2.0, 4.0],
+        }
+    )
+    regular = TimeSeriesRegularizer(fill="ffill").fit_transform(data)
+
+    assert regular.columns.tolist() == [DS_COL, Y_COL]
+    assert regular[Y_COL].tolist() == [1.0, 2.0, 2.0, 4.0]
+
+
+def test_regularizer_rejects_repeated_dates():
+    """A series can't have two values for the same date."""
+    data = pd.concat([_panel(), _panel().head(1)])
+    with pytest.raises(ValueError):
+        TimeSeriesRegularizer(series_col="series", frequency="D").fit_transform(data)
@@ -1,10 +1,19 @@
 """Transformer tester."""
 from unittest import TestCase
+import tracemalloc
 
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
 
 from soam.workflow import BaseDataFrameTransformer, Transformer
+from soam.workflow.transformer import (
+    FunctionDataFrameTransformer,
+    RunningMinMaxScaler,
+    RunningStandardScaler,
+    StatelessDataFrameTransformer,
+    TransformerPipeline,
+)
 
 
 class SimpleProcessor(BaseDataFrameTransformer):
@@ -43,3 +52,177 @@ class TransformerTestCase(TestCase):
         pd.testing.assert_frame_equal(
             preproc.transform(test_data_X2), expected_output_2
         )
+
+    def test_clone(self):
+        """The clone wraps an unfitted transformer."""
+        preproc = Transformer(SimpleProcessor())
+        preproc.run(pd.DataFrame({'a': [1, 2, 3]}))
+
+        clone = preproc.clone()
+
+        self.assertIsNot(clone.transformer, preproc.transformer)
+        self.assertFalse(hasattr(clone.transformer.preproc, "mean_"))
+        self.assertIsNone(clone.dataset)
+        self.assertIsNotNone(preproc.dataset)
+
+
+class RecordingStep(StatelessDataFrameTransformer):
+    """Stateless step that records the frames it receives."""
+
+    def __init__(self, func=None):
+        self.func = func
+        self.calls = []
+
+    def transform(self, X, inplace=False):
+        self.calls.append((X, inplace))
+        if not inplace:
+            X = X.copy()
+        return self.func(X) if self.func else X
+
+
+def _add_one(df_X):
+    df_X['a'] = df_X['a'] + 1
+    return df_X
+
+
+def _double(df_X):
+    df_X['a'] = df_X['a'] * 2
+    return df_X
+
+
+class LeanTransformerTestCase(TestCase):
+    """Creates the lean Transformer Test Case Object."""
+
+    def test_lean_run_keeps_no_frames(self):
+        """Lean runs store nothing and transform in place when allowed."""
+        data = pd.DataFrame({'y': [1.0, 2.0, 3.0]})
+        preproc = Transformer(RunningStandardScaler(), lean=True, inplace=True)
+
+        transformed, fitted = preproc.run(data)
+
+        self.assertIs(transformed, data)
+        self.assertIs(fitted, preproc.transformer)
+        self.assertIsNone(preproc.dataset)
+        self.assertIsNone(preproc.transformed_dataset)
+        np.testing.assert_allclose(data['y'].values, [-1.2247448714, 0.0, 1.2247448714])
+
+    def test_inplace_needs_support(self):
+        """Transformers that don't declare it are not run in place."""
+        data = pd.DataFrame({'a': [1.0, 2.0, 3.0]})
+        preproc = Transformer(
+            TransformerPipeline([SimpleProcessor()]), lean=True, inplace=True
+        )
+        self.assertFalse(preproc.transformer.supports_inplace)
+        preproc.run(data)
+        self.assertIsNone(preproc.dataset)
+
+    def test_lean_run_retains_less_memory(self):
+        """The frames kept on the task are accounted by tracemalloc."""
+        size = 8 * 200_000
+        retained = {}
+        for lean in (False, True):
+            data = pd.DataFrame({'y': np.arange(200_000, dtype=float)})
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            preproc = Transformer(RunningStandardScaler(), lean=lean, inplace=lean)
+            transformed, _ = preproc.run(data)
+            retained[lean] = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            del transformed, preproc, data
+        # Default mode keeps a copy of the input and a new output frame.
+        self.assertGreater(retained[False] - retained[True], size)
+
+
+class TransformerPipelineTestCase(TestCase):
+    """Creates the TransformerPipeline Test Case Object."""
+
+    def test_running_scalers_match_full_fit(self):
+        """Partial fits on consecutive chunks match a fit on all the rows."""
+        values = np.array([3.0, 1.0, np.nan, 7.0, 2.0, 9.0, 4.0])
+        data = pd.DataFrame({'y': values})
+        observed = values[~np.isnan(values)].reshape(-1, 1)
+
+        for running, reference in [
+            (RunningStandardScaler(), StandardScaler()),
+            (RunningMinMaxScaler(), MinMaxScaler()),
+        ]:
+            running.fit(data.iloc[:2]).partial_fit(data.iloc[2:5])
+            running.partial_fit(data.iloc[5:])
+            reference.fit(observed)
+
+            transformed = running.transform(data)
+            np.testing.assert_allclose(
+                transformed['y'].dropna().values,
+                reference.transform(observed).ravel(),
+            )
+            self.assertTrue(np.isnan(data['y'].iloc[2]))
+            np.testing.assert_allclose(
+                running.inverse_transform(transformed)['y'].values, values
+            )
+
+    def test_function_transformer(self):
+        """Applies the function to a copy by default."""
+        data = pd.DataFrame({'a': [1.0]})
+        transformed = FunctionDataFrameTransformer(_add_one).fit_transform(data)
+        self.assertEqual(transformed['a'].iloc[0], 2.0)
+        self.assertEqual(data['a'].iloc[0], 1.0)
+
+    def test_stateless_transform_is_abstract(self):
+        """Stateless transformers must implement transform."""
+
+        class Incomplete(StatelessDataFrameTransformer):
+            """Transformer lacking transform."""
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_stateless_steps_are_fused(self):
+        """Consecutive stateless steps share a copy and run once per pass."""
+        data = pd.DataFrame({'a': [1.0, 2.0, 3.0]})
+        first, second, last = (
+            RecordingStep(_add_one),
+            RecordingStep(_double),
+            RecordingStep(),
+        )
+        pipeline = TransformerPipeline(
+            [first, second, RunningStandardScaler(columns=['a']), last]
+        )
+        self.assertFalse(pipeline.stateless)
+        self.assertTrue(pipeline.incremental)
+
+        pipeline.fit(data)
+        (first_frame, first_inplace), = first.calls
+        (second_frame, second_inplace), = second.calls
+        self.assertIsNot(first_frame, data)
+        self.assertIs(first_frame, second_frame)
+        self.assertTrue(first_inplace and second_inplace)
+        # Nothing after the last stateful step runs while fitting.
+        self.assertEqual(last.calls, [])
+        np.testing.assert_allclose(pipeline.steps[2].mean_, [6.0])
+
+        transformed = pipeline.transform(data)
+        pd.testing.assert_frame_equal(data, pd.DataFrame({'a': [1.0, 2.0, 3.0]}))
+        expected = (np.array([4.0, 6.0, 8.0]) - 6) / np.sqrt(8 / 3)
+        np.testing.assert_allclose(transformed['a'].values, expected)
+        self.assertEqual(len(last.calls), 1)
+
+    def test_lean_run_transforms_pipelines_once(self):
+        """Lean runs go through fit_transform, so every stage runs once."""
+        data = pd.DataFrame({'a': [1.0, 2.0, 3.0]})
+        first = RecordingStep(_add_one)
+        pipeline = TransformerPipeline([first, RunningStandardScaler(columns=['a'])])
+        for inplace in (False, True):
+            first.calls.clear()
+            transformer = Transformer(pipeline, lean=True, inplace=inplace)
+            transformed, _ = transformer.run(data.copy())
+            self.assertEqual(len(first.calls), 1)
+            np.testing.assert_allclose(
+                transformed['a'].values, [-np.sqrt(1.5), 0.0, np.sqrt(1.5)]
+            )
+
+    def test_partial_fit_needs_incremental_steps(self):
+        """Stateful steps without partial_fit can't be updated."""
+        pipeline = TransformerPipeline([SimpleProcessor()])
+        self.assertFalse(pipeline.incremental)
+        with self.assertRaises(ValueError):
+            pipeline.partial_fit(pd.DataFrame({'a': [1.0]}))